@@ -0,0 +1,141 @@
+"""Mixed read/write throughput under concurrency, per SQLite profile.
+
+Usage::
+
+    python benchmarks/concurrency.py --size 100000 --readers 8 --writers 2 --duration 10
+
+For every profile in ``--profiles`` (default: ``default`` and
+``production``, see :mod:`librarymanager.sqlite_profile`) a fresh copy of the
+generated catalog is served to ``--readers`` threads requesting listing,
+API and detail pages and ``--writers`` threads creating and editing items,
+all through the Flask test client, for ``--duration`` seconds. The JSON
+report gives requests per second, p50/p95 latency and the number of failed
+requests (typically ``database is locked``) per profile.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+if __package__ in (None, ''):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.run import build_catalog, make_app  # noqa: E402
+from librarymanager.extensions import db  # noqa: E402
+from librarymanager.models import Item  # noqa: E402
+
+
+def _summary(timings: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'per_second': round(len(timings) / duration, 1),
+        'p50_ms': round(statistics.median(timings), 3) if timings else None,
+        'p95_ms': round(timings[int(len(timings) * 0.95)], 3) if timings else None,
+        'errors': errors,
+    }
+
+
+def run_profile(catalog: Path, profile: str, readers: int, writers: int, duration: float) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as work:
+        db_path = os.path.join(work, 'bench.sqlite3')
+        shutil.copyfile(catalog, db_path)
+        app = make_app(db_path, SQLITE_PROFILE=profile)
+        app.logger.setLevel(logging.CRITICAL)
+        with app.app_context():
+            ids = [row[0] for row in db.session.query(Item.id).filter(Item.type == 'book').order_by(Item.id).limit(2000)]
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+            db.session.remove()
+
+        deadline = time.perf_counter() + duration
+        results = {'read': ([], [0]), 'write': ([], [0])}
+        lock = threading.Lock()
+
+        def worker(kind: str, seed: int):
+            rng = random.Random(seed)
+            client = app.test_client()
+            timings, errors = [], 0
+            n = 0
+            while time.perf_counter() < deadline:
+                n += 1
+                item_id = rng.choice(ids)
+                start = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        url = rng.choice(('/api/items?limit=50', f'/items/{item_id}', '/items/type/book?sort=title', f'/api/items/{item_id}'))
+                        resp = client.get(url)
+                    elif n % 2:
+                        resp = client.post('/api/items', json={'type': 'book', 'title': f'Concurrent {seed}-{n}', 'language': 'en', 'authors': [f'Writer {seed}']})
+                    else:
+                        resp = client.post(f'/items/{item_id}/edit', data={'title': f'Edited {seed}-{n}', 'authors': f'Writer {seed}', 'genres': 'Edited'})
+                    resp.get_data()
+                    ok = resp.status_code < 500
+                except Exception:
+                    ok = False
+                if ok:
+                    timings.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+            with lock:
+                results[kind][0].extend(timings)
+                results[kind][1][0] += errors
+
+        threads = [threading.Thread(target=worker, args=('read', i)) for i in range(readers)]
+        threads += [threading.Thread(target=worker, args=('write', 1000 + i)) for i in range(writers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            db.engine.dispose()
+    return {
+        'journal_mode': journal_mode,
+        'reads': _summary(results['read'][0], results['read'][1][0], elapsed),
+        'writes': _summary(results['write'][0], results['write'][1][0], elapsed),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--profiles', default='default,production')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'librarymanager-bench'))
+    parser.add_argument('--output', help='write the JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    catalog = Path(args.data_dir) / f'catalog-{args.size}-{args.seed}.sqlite3'
+    build_catalog(catalog, args.size, args.seed, lambda *a: print(*a, file=sys.stderr))
+    report = {'meta': {'size': args.size, 'readers': args.readers, 'writers': args.writers, 'duration': args.duration},
+              'results': {}}
+    for profile in args.profiles.split(','):
+        result = run_profile(catalog, profile, args.readers, args.writers, args.duration)
+        report['results'][profile] = result
+        print(f"{profile:12} ({result['journal_mode']}): "
+              f"reads {result['reads']['per_second']}/s p95 {result['reads']['p95_ms']} ms, {result['reads']['errors']} errors; "
+              f"writes {result['writes']['per_second']}/s p95 {result['writes']['p95_ms']} ms, {result['writes']['errors']} errors",
+              file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Measure the cold start of each application factory.
+
+Usage::
+
+    python benchmarks/importtime.py --output startup-new.json
+    python benchmarks/importtime.py --baseline startup-old.json --threshold 0.25
+
+Every factory (see :mod:`librarymanager`) is started ``--repeat`` times in
+a fresh interpreter, which imports the package and builds the app, and once
+more under ``python -X importtime``. The JSON result holds, per factory, the
+median time to import and create the app, the total import time reported
+by ``-X importtime`` (which inflates it), the number of modules imported
+and the top-level packages with the most import time of their own.
+
+With ``--baseline`` the run exits with status 1 when a factory's median
+startup is more than ``--threshold`` slower than in the baseline, or when it
+imports more modules (a new eager import, usually a dependency that could
+be imported where it is used).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+
+FACTORIES = {
+    'full': 'create_app',
+    'api': 'create_api_app',
+    'html': 'create_html_app',
+    'cli': 'create_cli_app',
+}
+
+# child process: time the import and the factory call, print it and the
+# modules loaded (the -X importtime report goes to stderr)
+_CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import librarymanager
+librarymanager.{factory}()
+print(json.dumps({{'startup_ms': (time.perf_counter() - started) * 1000, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """``(module, self us, cumulative us)`` per line of a ``-X importtime`` report."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if not self_us.isdigit():
+            continue  # the header line
+        rows.append((name, int(self_us), int(cumulative)))
+    return rows
+
+
+def measure(factory: str, importtime: bool = False, python: str = sys.executable) -> Dict[str, Any]:
+    """Start ``factory`` once in a fresh interpreter, optionally under
+    ``-X importtime`` (adds ``import_ms`` and ``packages``)."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC, os.environ.get('PYTHONPATH')])))
+    cmd = [python] + (['-X', 'importtime'] if importtime else []) + ['-c', _CHILD.format(factory=factory)]
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if importtime:
+        rows = parse_importtime(proc.stderr)
+        own = Counter()
+        for name, self_us, _ in rows:
+            own[name.split('.')[0]] += self_us
+        result['import_ms'] = sum(self_us for _, self_us, _ in rows) / 1000
+        result['packages'] = {name: round(us / 1000, 2) for name, us in own.most_common(10)}
+    return result
+
+
+def run_factories(names: List[str], repeat: int, log=print) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name in names:
+        measure(FACTORIES[name])  # warm the .pyc files
+        runs = [measure(FACTORIES[name]) for _ in range(repeat)]
+        report = measure(FACTORIES[name], importtime=True)
+        results[name] = {
+            'startup_ms': round(statistics.median(r['startup_ms'] for r in runs), 2),
+            'import_ms': round(report['import_ms'], 2),
+            'modules': len(report['modules']),
+            'packages': report['packages'],
+        }
+        log(f"{name}: {results[name]['startup_ms']} ms, {results[name]['modules']} modules")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Return a message per factory that regressed against ``baseline``."""
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if new['startup_ms'] > old['startup_ms'] * (1 + threshold):
+            regressions.append(f"{name}: startup {old['startup_ms']} -> {new['startup_ms']} ms "
+                               f"(+{(new['startup_ms'] / old['startup_ms'] - 1) * 100:.0f}%)")
+        if new['modules'] > old['modules']:
+            regressions.append(f"{name}: {old['modules']} -> {new['modules']} modules imported")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--factory', action='append', choices=sorted(FACTORIES), help='measure only this factory (repeatable)')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per factory')
+    parser.add_argument('--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed median slowdown, as a fraction')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    log = (lambda *a: None) if args.quiet else (lambda *a: print(*a, file=sys.stderr))
+
+    results = run_factories(args.factory or list(FACTORIES), args.repeat, log)
+    report = {
+        'meta': {
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'timestamp': int(time.time()),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline['results'], args.threshold)
+        for msg in regressions:
+            log(f'REGRESSION {msg}')
+        if regressions:
+            return 1
+        log(f'No regressions against {args.baseline} (threshold {args.threshold:.0%}).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Load test the JSON API with many concurrent, mostly idle clients.
+
+Usage::
+
+    # against servers you started yourself
+    python benchmarks/loadtest.py --target http://127.0.0.1:5000 --connections 1000
+
+    # start the WSGI (threaded werkzeug) and ASGI (uvicorn) servers on a copy
+    # of the generated catalog and compare them
+    python benchmarks/loadtest.py --serve both --size 10000 --connections 1000 --duration 15
+
+Every virtual client keeps one HTTP/1.1 keep-alive connection open and
+alternates between requesting an API page or item and idling for
+``--think`` seconds, which is how dashboards and sync agents behave. A
+thread-per-connection server can only serve as many of them as it has
+threads; an event-loop server holds all of them. The report (JSON) gives
+per-server throughput, latency percentiles, connection errors and how many
+clients managed to connect at all.
+
+The ASGI side needs ``uvicorn`` in addition to ``librarymanager[async]``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    else:
+        body = await reader.read()
+    if headers.get('connection', '').lower() == 'close':
+        raise EOFError(status)  # caller reconnects
+    return status, body
+
+
+async def _client(host: str, port: int, paths: List[str], deadline: float, think: float, rng: random.Random,
+                  stats: Dict[str, Any]) -> None:
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=10)
+                stats['connected'] += 1
+            path = rng.choice(paths)
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode())
+            await writer.drain()
+            try:
+                status, _ = await asyncio.wait_for(_read_response(reader), timeout=30)
+            except EOFError as e:
+                status = e.args[0]
+                writer.close()
+                writer = None
+            stats['latencies'].append((time.perf_counter() - start) * 1000)
+            if status >= 500:
+                stats['errors'] += 1
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            stats['errors'] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(think * (0.5 + rng.random()))
+    if writer is not None:
+        writer.close()
+
+
+async def _load(target: str, connections: int, duration: float, think: float, item_ids: List[int]) -> Dict[str, Any]:
+    parts = urlsplit(target)
+    host, port = parts.hostname, parts.port or 80
+    paths = ['/api/items?limit=20', '/api/items?limit=20&sort=title'] + [f'/api/items/{i}' for i in item_ids[:200]]
+    stats: Dict[str, Any] = {'latencies': [], 'errors': 0, 'connected': 0}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, paths, deadline, think, random.Random(i), stats) for i in range(connections)))
+    elapsed = time.perf_counter() - started
+    lat = sorted(stats['latencies'])
+
+    def pct(p):
+        return round(lat[min(len(lat) - 1, int(len(lat) * p))], 2) if lat else None
+
+    return {
+        'requests': len(lat),
+        'per_second': round(len(lat) / elapsed, 1),
+        'p50_ms': round(statistics.median(lat), 2) if lat else None,
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'errors': stats['errors'],
+        'connections_opened': stats['connected'],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def _serve(kind: str, db_path: str, port: int) -> None:
+    """Run a server in this process (used through a subprocess)."""
+    sys.path.insert(0, str(ROOT / 'src'))
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('SQLITE_PROFILE', 'production')
+    if kind == 'wsgi':
+        from werkzeug.serving import run_simple
+        from librarymanager import create_app
+        run_simple('127.0.0.1', port, create_app(), threaded=True)
+    else:
+        import uvicorn
+        from librarymanager import create_asgi_app
+        uvicorn.run(create_asgi_app(), host='127.0.0.1', port=port, log_level='warning')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', help='base URL of a running server')
+    parser.add_argument('--serve', choices=('wsgi', 'asgi', 'both'), help='start the server(s) on a generated catalog')
+    parser.add_argument('--size', type=int, default=10_000, help='catalog size for --serve')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--think', type=float, default=1.0, help='mean idle seconds between requests per client')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'librarymanager-bench'))
+    parser.add_argument('--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--_serve-kind', dest='serve_kind', help=argparse.SUPPRESS)
+    parser.add_argument('--_db', dest='serve_db', help=argparse.SUPPRESS)
+    parser.add_argument('--_port', dest='serve_port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_kind:
+        _serve(args.serve_kind, args.serve_db, args.serve_port)
+        return 0
+    if not args.target and not args.serve:
+        parser.error('give --target or --serve')
+
+    report: Dict[str, Any] = {'meta': {'connections': args.connections, 'duration': args.duration, 'think': args.think},
+                              'results': {}}
+    if args.target:
+        report['results'][args.target] = asyncio.run(_load(args.target, args.connections, args.duration, args.think, list(range(1, 201))))
+    else:
+        sys.path.insert(0, str(ROOT))
+        from benchmarks.run import build_catalog
+        catalog = Path(args.data_dir) / f'catalog-{args.size}-0.sqlite3'
+        build_catalog(catalog, args.size, 0, lambda *a: print(*a, file=sys.stderr))
+        item_ids = random.Random(0).sample(range(1, args.size + 1), min(200, args.size))
+        for kind in (('wsgi', 'asgi') if args.serve == 'both' else (args.serve,)):
+            with tempfile.TemporaryDirectory() as work:
+                db_path = os.path.join(work, 'loadtest.sqlite3')
+                shutil.copyfile(catalog, db_path)
+                port = _free_port()
+                proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), '--_serve-kind', kind,
+                                         '--_db', db_path, '--_port', str(port)], cwd=ROOT)
+                try:
+                    _wait_for_port(port)
+                    result = asyncio.run(_load(f'http://127.0.0.1:{port}', args.connections, args.duration, args.think, item_ids))
+                finally:
+                    proc.terminate()
+                    proc.wait(timeout=10)
+            report['results'][kind] = result
+            print(f"{kind}: {result['per_second']} req/s, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                  f"{result['errors']} errors", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Time the hot request paths against a generated catalog.
+
+Usage::
+
+    python benchmarks/run.py --size 100000 --output bench-new.json
+    python benchmarks/run.py --size 100000 --baseline bench-old.json --threshold 0.25
+
+The catalog is built once per ``(size, seed)`` with
+:func:`librarymanager.seed.generate_records` and cached in ``--data-dir``;
+each run works on a copy, so the write benchmarks never change it. Every
+case is requested ``--repeat`` times through the Flask test client (no
+network), after ``--warmup`` unmeasured requests.
+
+The JSON result holds, per case, the min/median/p95/mean latency in
+milliseconds and the number of SQL statements per request. With
+``--baseline`` the run exits with status 1 when a case's median is more
+than ``--threshold`` slower than in the baseline, or when it issues more
+SQL statements (which usually means an N+1 regression).
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from sqlalchemy import event, select  # noqa: E402
+
+from librarymanager import create_app  # noqa: E402
+from librarymanager.config import Config  # noqa: E402
+from librarymanager.extensions import db  # noqa: E402
+from librarymanager.importer import import_records  # noqa: E402
+from librarymanager.models import Item  # noqa: E402
+from librarymanager.seed import generate_records  # noqa: E402
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+_NEXT_LINK_RE = re.compile(r'<a href="([^"]+)" rel="next">')
+
+Case = Tuple[str, str, str, Callable[[], Dict[str, Any]]]
+
+
+def make_app(db_path: str, **settings):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        PAGE_CACHE_TYPE = None
+        METRICS_ENABLED = False
+        SLOW_REQUEST_MS = 0
+
+    for key, value in settings.items():
+        setattr(BenchConfig, key, value)
+    return create_app(BenchConfig)
+
+
+def build_catalog(path: Path, size: int, seed: int, log=print) -> None:
+    """Generate the catalog at ``path`` unless it already exists."""
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    if tmp.exists():
+        tmp.unlink()
+    app = make_app(str(tmp))
+    with app.app_context():
+        db.create_all()
+
+        def progress(stats):
+            if stats['imported'] % 100_000 < 5000:
+                log(f"  {stats['imported']} items ({stats['items_per_second']} items/s)")
+
+        log(f'Generating {size} items (seed {seed}) into {path}...')
+        import_records(generate_records(size, seed), chunk_size=5000, progress=progress)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        db.engine.dispose()
+    os.replace(tmp, path)
+
+
+def _cases(app, client) -> List[Case]:
+    """``(name, method, url, request kwargs factory)`` for every hot path."""
+    with app.app_context():
+        count = db.session.execute(select(db.func.count(Item.id))).scalar()
+        mid_id = db.session.execute(select(Item.id).order_by(Item.id).offset(count // 2).limit(1)).scalar()
+        mid_type = db.session.get(Item, mid_id).type
+
+    cases: List[Case] = []
+    for sort in ('id', 'title'):
+        for order in ('asc', 'desc'):
+            url = f'/items/type/book?sort={sort}&order={order}'
+            cases.append((f'items_by_type/{sort}/{order}', 'GET', url, dict))
+            m = _NEXT_LINK_RE.search(client.get(url).get_data(as_text=True))
+            if m:
+                cases.append((f'items_by_type/{sort}/{order}/next', 'GET', m.group(1).replace('&amp;', '&'), dict))
+    for sort in ('id', 'title'):
+        url = f'/api/items?limit=100&sort={sort}'
+        cases.append((f'list_items/{sort}', 'GET', url, dict))
+        cursor = client.get(url).get_json()['next_cursor']
+        if cursor:
+            cases.append((f'list_items/{sort}/next', 'GET', f'{url}&cursor={cursor}', dict))
+    cases.append(('list_items/id/1000', 'GET', '/api/items?limit=1000', dict))
+    cases.append(('list_items/id/1000/fields', 'GET', '/api/items?limit=1000&fields=id,type,title', dict))
+    cases.append(('item_facets', 'GET', '/api/items/facets?type=book', dict))
+    cases.append(('items_by_type/language', 'GET', '/items/type/book?language=en', dict))
+    cases.append(('item_detail', 'GET', f'/items/{mid_id}', dict))
+    cases.append(('api_item', 'GET', f'/api/items/{mid_id}', dict))
+
+    counter = iter(range(10 ** 9))
+
+    def new_item():
+        n = next(counter)
+        return {'json': {'type': 'book', 'title': f'Benchmark Book {n}', 'language': 'en',
+                         'authors': ['Bench Author', f'Bench Author {n % 10}'], 'genres': ['Benchmark']}}
+
+    def edit_item():
+        n = next(counter)
+        form = {'title': f'Edited {n}', 'description': 'edited by the benchmark', 'authors': 'Bench Author', 'genres': 'Benchmark'}
+        return {'data': form}
+
+    cases.append(('create_item', 'POST', '/api/items', new_item))
+    if mid_type == 'book':
+        cases.append(('edit_item', 'POST', f'/items/{mid_id}/edit', edit_item))
+    else:
+        with app.app_context():
+            book_id = db.session.execute(select(Item.id).where(Item.type == 'book').order_by(Item.id).offset(count // 4).limit(1)).scalar()
+        cases.append(('edit_item', 'POST', f'/items/{book_id}/edit', edit_item))
+    return cases
+
+
+def run_cases(app, repeat: int, warmup: int, only: Optional[List[str]] = None, log=print) -> Dict[str, Dict[str, Any]]:
+    client = app.test_client()
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    results = {}
+    for name, method, url, kwargs in _cases(app, client):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        timings = []
+        queries = 0
+        with app.app_context():
+            engine = db.engine
+        for i in range(warmup + repeat):
+            statements[0] = 0
+            event.listen(engine, 'before_cursor_execute', count_statement)
+            try:
+                start = time.perf_counter()
+                resp = client.open(url, method=method, **kwargs())
+                resp.get_data()
+                elapsed = time.perf_counter() - start
+            finally:
+                event.remove(engine, 'before_cursor_execute', count_statement)
+            if resp.status_code >= 400:
+                raise RuntimeError(f'{name}: {method} {url} returned {resp.status_code}')
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries = max(queries, statements[0])
+        timings.sort()
+        results[name] = {
+            'url': url,
+            'method': method,
+            'min_ms': round(timings[0], 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': queries,
+        }
+        log(f"{name:32} median {results[name]['median_ms']:9.3f} ms  p95 {results[name]['p95_ms']:9.3f} ms  {queries:3} queries")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Return a message per case that regressed against ``baseline``."""
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if new['median_ms'] > old['median_ms'] * (1 + threshold):
+            regressions.append(f"{name}: median {old['median_ms']} -> {new['median_ms']} ms "
+                               f"(+{(new['median_ms'] / old['median_ms'] - 1) * 100:.0f}%)")
+        if new['queries'] > old['queries']:
+            regressions.append(f"{name}: {old['queries']} -> {new['queries']} SQL statements")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=SIZES[0], help=f'catalog size (suggested: {", ".join(map(str, SIZES))})')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20, help='measured requests per case')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured requests per case')
+    parser.add_argument('--only', action='append', help='run only cases whose name starts with this (repeatable)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'librarymanager-bench'))
+    parser.add_argument('--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed median slowdown, as a fraction')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    log = (lambda *a: None) if args.quiet else (lambda *a: print(*a, file=sys.stderr))
+
+    catalog = Path(args.data_dir) / f'catalog-{args.size}-{args.seed}.sqlite3'
+    build_catalog(catalog, args.size, args.seed, log)
+    with tempfile.TemporaryDirectory() as work:
+        db_path = os.path.join(work, 'bench.sqlite3')
+        shutil.copyfile(catalog, db_path)
+        app = make_app(db_path)
+        results = run_cases(app, args.repeat, args.warmup, args.only, log)
+        with app.app_context():
+            db.engine.dispose()
+
+    report = {
+        'meta': {
+            'size': args.size,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': int(time.time()),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline['meta'].get('size') != args.size:
+            log(f"warning: baseline was measured on {baseline['meta'].get('size')} items, this run on {args.size}")
+        regressions = compare(results, baseline['results'], args.threshold)
+        for msg in regressions:
+            log(f'REGRESSION {msg}')
+        if regressions:
+            return 1
+        log(f'No regressions against {args.baseline} (threshold {args.threshold:.0%}).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,31 @@
+"""Application factories.
+
+:func:`create_app` builds the full application. A process that only serves
+part of it can ask for a subset of ``COMPONENTS`` -- or use
+:func:`create_api_app`, :func:`create_html_app` or :func:`create_cli_app`
+-- and skips importing and registering the rest:
+
+``html``
+    the server-rendered pages (``main`` and ``auth`` blueprints, Flask-Login)
+``api``
+    the JSON API under ``/api``
+``cli``
+    the ``flask`` commands; ``flask db`` imports Flask-Migrate (and Alembic)
+    only when it is run
+
+Everything a write depends on (the session hooks that keep the counters,
+facets, summaries, search index and versions current, the job queue) is
+installed in every mode, so any of these apps may write to the catalog.
+``python benchmarks/importtime.py`` reports the import time of each factory.
+"""
 from flask import Flask
 from .config import Config
-from .extensions import db, migrate, login_manager
+from .extensions import db
+
+COMPONENTS = ('html', 'api', 'cli')
 
-def create_app(config_object: str | object = None):
+
+def create_app(config_object: str | object = None, components=COMPONENTS):
     app = Flask(__name__, instance_relative_config=True)
     if config_object is None:
         app.config.from_object(Config)
@@ -14,21 +37,76 @@ def create_app(config_object: str | object = None):
     os.makedirs(app.instance_path, exist_ok=True)
 
     # init extensions
+    from . import sqlite_profile, templating
+    templating.init_app(app)
+    sqlite_profile.configure(app)
     db.init_app(app)
-    migrate.init_app(app, db)
-    login_manager.init_app(app)
+    sqlite_profile.init_app(app)
+    from . import routing
+    routing.init_app(app)
+
+    # importing these registers their session hooks; images also registers
+    # the fetch_image job and its flush hooks
+    from . import counters, facets, resolver, search, summaries, versioning  # noqa: F401
+    from . import pagecache, metrics, images, thumbnails
+    pagecache.init_app(app)
+    metrics.init_app(app)
+    thumbnails.init_app(app)
 
-    # register blueprints
-    from .routes.main import main_bp
-    from .routes.api import api_bp
-    from .routes.auth import auth_bp
-    from . import cli as cli_module
+    app.extensions['components'] = set()
+    register_components(app, components)
+    return app
 
-    app.register_blueprint(main_bp)
-    app.register_blueprint(api_bp, url_prefix='/api')
-    app.register_blueprint(auth_bp)
 
-    # register CLI commands
-    cli_module.init_app(app)
+def register_components(app: Flask, components) -> None:
+    """Register the blueprints (and commands) of ``components`` not yet
+    registered on ``app``; possible until it handles its first request."""
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f'Unknown components: {", ".join(sorted(unknown))}')
+    registered = app.extensions['components']
+    missing = [c for c in COMPONENTS if c in components and c not in registered]
+    if not missing:
+        return
+    if {'html', 'api'} & set(missing) and not {'html', 'api'} & registered:
+        # item images are shown by the pages and linked from the API
+        from .routes.thumbnails import thumbnails_bp
+        app.register_blueprint(thumbnails_bp)
+        if app.config.get('METRICS_ENABLED'):
+            from .routes.debug import debug_bp
+            app.register_blueprint(debug_bp)
+    if 'html' in missing:
+        from .extensions import login_manager
+        from .routes.main import main_bp
+        from .routes.auth import auth_bp
+        login_manager.init_app(app)
+        app.register_blueprint(main_bp)
+        app.register_blueprint(auth_bp)
+    if 'api' in missing:
+        from .routes.api import api_bp
+        app.register_blueprint(api_bp, url_prefix='/api')
+    if 'cli' in missing:
+        from . import cli as cli_module
+        cli_module.init_app(app)
+    registered.update(missing)
 
-    return app
+
+def create_api_app(config_object: str | object = None):
+    """Only the JSON API (e.g. ``gunicorn 'librarymanager:create_api_app()'``)."""
+    return create_app(config_object, ('api',))
+
+
+def create_html_app(config_object: str | object = None):
+    """Only the server-rendered pages."""
+    return create_app(config_object, ('html',))
+
+
+def create_cli_app(config_object: str | object = None):
+    """Only the ``flask`` commands (``flask --app librarymanager:create_cli_app ...``)."""
+    return create_app(config_object, ('cli',))
+
+
+def create_asgi_app(config_object: str | object = None):
+    """Create the asynchronous JSON API (see ``librarymanager.asgi``)."""
+    from .asgi import create_asgi_app as factory
+    return factory(config_object)
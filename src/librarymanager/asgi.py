@@ -0,0 +1,302 @@
+"""Asynchronous (ASGI) variant of the JSON item API.
+
+``create_asgi_app()`` (re-exported from the package next to ``create_app``)
+returns a plain ASGI application serving::
+
+    GET  /api/items          keyset pages, or the whole catalog streamed
+    GET  /api/items/<id>
+    POST /api/items
+
+with the same parameters, ETags and JSON shapes as the Flask blueprint. It
+is meant to run under an ASGI server (``uvicorn --factory
+librarymanager:create_asgi_app``) so that thousands of slow or idle API
+clients cost a coroutine each instead of a worker thread.
+
+Database access goes through SQLAlchemy's asyncio extension with the
+optional ``aiosqlite`` driver (``pip install librarymanager[async]``). The
+query and serialization code of the WSGI API is reused as is: each handler
+runs its synchronous part through ``AsyncSession.run_sync`` inside a Flask
+app context, on a session class that inherits every session event of
+``db.session`` (change tracking, catalog versions, name caches), so writes
+made here invalidate caches and feed ``/api/items/changes`` exactly like
+writes made through Flask.
+
+Unlike the WSGI stream, the full-catalog stream is fetched in keyset
+batches of ``API_STREAM_BATCH_SIZE``, so no cursor stays open while a slow
+client drains the response.
+"""
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from flask import Flask
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from . import sqlite_profile
+from .extensions import db
+from .facets import parse_filters
+from .models import Item
+from .routes.api import _create_item, _fetch_page, _keyset, _type_arg
+from .serializers import dumps, get_serializer, parse_fields
+from .versioning import catalog_etag, current_version, item_etag, parse_item_etag
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+# sync drivers and their asyncio counterparts
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the API handlers need."""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        self.args = dict(parse_qsl(self.query_string, keep_blank_values=True))
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.body = body
+
+    def if_none_match(self) -> List[str]:
+        """Entity tags of ``If-None-Match`` (weak ones included, unquoted)."""
+        values = []
+        for tag in self.headers.get('if-none-match', '').split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag:
+                values.append(tag.strip('"'))
+        return values
+
+    def wants_ndjson(self) -> bool:
+        fmt = self.args.get('format')
+        if fmt is not None:
+            return fmt == 'ndjson'
+        accept = self.headers.get('accept', '')
+        return 'application/x-ndjson' in accept and 'application/json' not in accept
+
+
+def _etag_headers(etag: str) -> List[Tuple[bytes, bytes]]:
+    return [(b'etag', f'"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+
+
+def _session_class():
+    """A subclass of ``db.session``'s class, so it inherits its session
+    events, bound to the async engine instead of the app's engines."""
+    base = db.session.session_factory.class_
+
+    class AsyncApiSession(base):
+        def __init__(self, **kwargs):
+            super().__init__(db, **kwargs)
+
+        def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+            return bind or self.bind
+
+    return AsyncApiSession
+
+
+class AsyncApi:
+    """ASGI application for the item API, see the module docstring."""
+
+    def __init__(self, flask_app: Flask, engine):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.sessions = async_sessionmaker(engine, class_=AsyncSession, sync_session_class=_session_class(), expire_on_commit=False)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+        request = Request(scope, body)
+        with self.flask_app.app_context():
+            await self._dispatch(request, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _dispatch(self, request: Request, send: Send) -> None:
+        path = request.path.rstrip('/')
+        if path == '/api/items':
+            if request.method == 'GET':
+                return await self.list_items(request, send)
+            if request.method == 'POST':
+                return await self.create_item(request, send)
+            return await self._json(send, 405, {'error': 'method not allowed'})
+        if path.startswith('/api/items/') and path[len('/api/items/'):].isdigit():
+            if request.method == 'GET':
+                return await self.get_item(request, send, int(path[len('/api/items/'):]))
+            return await self._json(send, 405, {'error': 'method not allowed'})
+        await self._json(send, 404, {'error': 'not found'})
+
+    # -- responses
+
+    async def _start(self, send: Send, status: int, content_type: Optional[str], headers=()) -> None:
+        all_headers = list(headers)
+        if content_type:
+            all_headers.append((b'content-type', content_type.encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': all_headers})
+
+    async def _json(self, send: Send, status: int, data: Any, headers=()) -> None:
+        body = dumps(data) + b'\n'
+        await self._start(send, status, 'application/json', list(headers) + [(b'content-length', str(len(body)).encode())])
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _not_modified(self, send: Send, etag: str) -> None:
+        await self._start(send, 304, None, _etag_headers(etag))
+        await send({'type': 'http.response.body', 'body': b''})
+
+    # -- handlers
+
+    async def list_items(self, request: Request, send: Send) -> None:
+        config = self.flask_app.config
+        sort = request.args.get('sort', 'id')
+        order = request.args.get('order', 'asc')
+        filters = parse_filters(request.args)
+        try:
+            typ = _type_arg(request.args)
+            _keyset(sort, order, typ)
+            serializer = get_serializer(parse_fields(request.args.get('fields')))
+        except ValueError as e:
+            return await self._json(send, 400, {'error': str(e)})
+        cursor = request.args.get('cursor')
+        ndjson = request.wants_ndjson()
+        fmt = 'ndjson' if ndjson else request.args.get('format')
+        paged = 'limit' in request.args or bool(cursor)
+        batch = config.get('API_STREAM_BATCH_SIZE', 500)
+        if paged and not ndjson:
+            try:
+                limit = int(request.args.get('limit', config.get('API_PAGE_SIZE', 100)))
+            except ValueError:
+                return await self._json(send, 400, {'error': 'invalid limit'})
+            limit = max(1, min(limit, config.get('API_MAX_PAGE_SIZE', 1000)))
+
+        async with self.sessions() as session:
+            etag = catalog_etag(await session.run_sync(current_version), f'{fmt}?{request.query_string}')
+            if etag in request.if_none_match():
+                return await self._not_modified(send, etag)
+
+            def fetch(s, cursor: Optional[str], limit: int):
+                return _fetch_page(serializer, sort, order, cursor, limit, session=s, typ=typ, filters=filters)
+
+            try:
+                if paged and not ndjson:
+                    items, next_cursor = await session.run_sync(fetch, cursor, limit)
+                    return await self._json(send, 200, {'items': items, 'next_cursor': next_cursor}, _etag_headers(etag))
+                first, next_cursor = await session.run_sync(fetch, cursor, batch)
+            except ValueError as e:
+                return await self._json(send, 400, {'error': str(e)})
+
+            await self._start(send, 200, 'application/x-ndjson' if ndjson else 'application/json', _etag_headers(etag))
+            items, sep = first, b''
+            if not ndjson:
+                await send({'type': 'http.response.body', 'body': b'[', 'more_body': True})
+            while True:
+                if ndjson:
+                    chunk = b''.join(dumps(it) + b'\n' for it in items)
+                elif items:
+                    chunk = sep + b','.join(dumps(it) for it in items)
+                    sep = b','
+                else:
+                    chunk = b''
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if not next_cursor:
+                    break
+                items, next_cursor = await session.run_sync(fetch, next_cursor, batch)
+            await send({'type': 'http.response.body', 'body': b'' if ndjson else b']'})
+
+    async def get_item(self, request: Request, send: Send, item_id: int) -> None:
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return await self._json(send, 400, {'error': str(e)})
+        serializer = get_serializer(fields)
+        async with self.sessions() as session:
+            def load(s):
+                for value in request.if_none_match():
+                    version = parse_item_etag(value, item_id, fields)
+                    if version is not None and version == current_version(s):
+                        return value, None
+                version = s.query(Item.version).filter(Item.id == item_id).scalar()
+                if version is None:
+                    return None, None
+                etag = item_etag(item_id, version, fields)
+                if etag in request.if_none_match():
+                    return etag, None
+                rows = s.execute(serializer.select().where(Item.id == item_id)).all()
+                if not rows:
+                    return None, None
+                return item_etag(item_id, rows[0][serializer.version_index], fields), serializer.serialize_rows(rows, s)[0]
+
+            etag, data = await session.run_sync(load)
+        if etag is None:
+            return await self._json(send, 404, {'error': 'not found'})
+        if data is None:
+            return await self._not_modified(send, etag)
+        await self._json(send, 200, data, _etag_headers(etag))
+
+    async def create_item(self, request: Request, send: Send) -> None:
+        try:
+            data = json.loads(request.body or b'{}') or {}
+        except ValueError:
+            return await self._json(send, 400, {'error': 'invalid JSON body'})
+        async with self.sessions() as session:
+            try:
+                result = await session.run_sync(lambda s: _create_item(data, s))
+            except (ValueError, TypeError) as e:
+                return await self._json(send, 400, {'error': str(e)})
+        await self._json(send, 201, result)
+
+
+def async_database_url(app: Flask):
+    """The ``ASYNC_DATABASE_URI`` setting, or the app's database URL with
+    its driver swapped for the asyncio one (``sqlite`` -> ``aiosqlite``)."""
+    if app.config.get('ASYNC_DATABASE_URI'):
+        return app.config['ASYNC_DATABASE_URI']
+    with app.app_context():
+        url = db.engine.url
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        raise ValueError(f'No asyncio driver known for {url.drivername!r}; set ASYNC_DATABASE_URI')
+    return url.set(drivername=driver)
+
+
+def create_asgi_app(config_object=None, flask_app: Optional[Flask] = None) -> AsyncApi:
+    """Create the ASGI item API.
+
+    The Flask app (an API-only app created with ``config_object`` unless
+    given) provides the configuration and app context the shared code
+    expects.
+    """
+    from . import create_api_app
+
+    app = flask_app or create_api_app(config_object)
+    url = async_database_url(app)
+    try:
+        engine = create_async_engine(url, **(app.config.get('ASYNC_ENGINE_OPTIONS') or {}))
+    except ImportError as e:
+        raise RuntimeError(f'The async API needs an asyncio database driver ({e.name}); '
+                           'install it with `pip install librarymanager[async]`') from e
+    sqlite_profile.attach(app, engine.sync_engine)
+    return AsyncApi(app, engine)
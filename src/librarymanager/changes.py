@@ -0,0 +1,74 @@
+"""Track the items a transaction touches and announce them after commit.
+
+ORM changes are picked up automatically in ``after_flush``. Writers that
+bypass the unit of work (Core inserts in the bulk importer, association
+rows written by the resolver) call :func:`record_change` themselves.
+
+When the transaction commits, the accumulated change set is sent through
+the :data:`items_committed` signal as ``{item_id: (type, op)}`` with ``op``
+one of ``'insert'``, ``'update'`` or ``'delete'``; a rollback discards it.
+Receivers (caches, derived tables) therefore only ever see durable changes.
+"""
+from typing import Dict, Tuple
+
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from .extensions import db
+from .models import Item
+
+_signals = Namespace()
+
+#: sent after a commit that touched items: ``sender`` is the Flask app (or
+#: ``None`` outside an app context), ``changes`` the change set
+items_committed = _signals.signal('items-committed')
+
+_KEY = 'item_changes'
+
+ChangeSet = Dict[int, Tuple[str, str]]
+
+
+def _merge(previous: str, op: str) -> str:
+    # an insert stays an insert until deleted; a delete always wins
+    if op == 'delete' or previous == 'delete':
+        return 'delete'
+    if previous == 'insert':
+        return 'insert'
+    return op
+
+
+def record_change(session, item_id: int, item_type: str, op: str = 'update') -> None:
+    """Note that ``item_id`` changed in the session's current transaction."""
+    changes: ChangeSet = session.info.setdefault(_KEY, {})
+    previous = changes.get(item_id)
+    changes[item_id] = (item_type, _merge(previous[1], op) if previous else op)
+
+
+def pending_changes(session) -> ChangeSet:
+    """Changes recorded so far in the session's open transaction."""
+    return dict(session.info.get(_KEY, {}))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    for op, objs in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objs:
+            if not isinstance(obj, Item):
+                continue
+            if op == 'update' and not session.is_modified(obj):
+                continue
+            record_change(session, obj.id, obj.type, op)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _announce(session):
+    changes = session.info.pop(_KEY, None)
+    if changes:
+        sender = current_app._get_current_object() if has_app_context() else None
+        items_committed.send(sender, changes=changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_KEY, None)
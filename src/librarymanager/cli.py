@@ -12,7 +12,46 @@ def _models_hash(models_path: Path) -> str:
     return h.hexdigest()
 
 
+class LazyGroup(click.Group):
+    """A command group whose real implementation is imported on first use.
+
+    ``load`` returns the actual :class:`click.Group`. Only ``help`` is known
+    up front (for ``flask --help``); when the group is invoked, parsing,
+    options and subcommands are handed to the loaded group, so nothing is
+    imported in processes that never run it.
+    """
+
+    def __init__(self, name: str, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+        self._group = None
+
+    def _target(self) -> click.Group:
+        if self._group is None:
+            self._group = self._load()
+        return self._group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self._target().make_context(info_name, args, parent=parent, **extra)
+
+    def list_commands(self, ctx):
+        return self._target().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._target().get_command(ctx, name)
+
+
+def _migrate_group(app) -> click.Group:
+    from . import extensions
+
+    # Migrate.init_app registers its own `db` group in place of the lazy one
+    extensions.migrate.init_app(app, extensions.db)
+    return app.cli.commands['db']
+
+
 def init_app(app):
+    app.cli.add_command(LazyGroup('db', lambda: _migrate_group(app), help='Perform database migrations.'))
+
     @app.cli.command('recreate-db')
     @click.option('--force', is_flag=True, help='Always destroy and recreate the database')
     @click.option('--seed', is_flag=True, help='Seed the database with example data')
@@ -73,33 +112,216 @@ def init_app(app):
         with app.app_context():
             click.echo('Recreating database schema (db.create_all)...')
             db.create_all()
+            # cached author/genre ids refer to the destroyed database
+            from .resolver import clear_name_caches
+            clear_name_caches()
 
             if seed:
                 click.echo('Seeding example data...')
-                # lightweight seed: add one of each type (authors/genres)
-                from .models import Author, Genre, Book, CD, DVD, BoardGame
+                from .seed import seed_examples
+                seed_examples()
+
+        # save current hash
+        hash_file.write_text(current_hash)
+        click.echo('Database recreated and model hash updated.')
 
-                a1 = Author(name='Sample Author')
-                g1 = Genre(name='Sample Genre')
-                db.session.add_all([a1, g1])
-                db.session.flush()
+    @app.cli.command('import-items')
+    @click.argument('path', type=click.Path(allow_dash=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['json', 'ndjson', 'csv']), default=None, help='Input format (default: guessed from the file extension)')
+    @click.option('--chunk-size', type=int, default=None, help='Items per transaction (default: IMPORT_CHUNK_SIZE)')
+    def import_items(path: str, fmt: str, chunk_size: int):
+        """Bulk import items from a JSON, NDJSON or CSV file (`-` for stdin).
 
-                book = Book(title='Example Book', description='An example', language='en', publisher='ExamplePub', length=123, size='200x130mm')
-                book.authors.append(a1)
-                book.genres.append(g1)
+        Records use the same keys as `POST /api/items`; in CSV files the
+        authors, genres and track_list cells are `;`-separated.
+        """
+        from .importer import detect_format, import_records, parse_records, text_stream
 
-                cd = CD(title='Example CD', description='Sample CD', primary_artist='Sample Artist', publisher='MusicPub', duration_minutes=42, track_list=['Track 1', 'Track 2'])
-                cd.genres.append(g1)
+        fmt = fmt or detect_format(path)
+        chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
 
-                dvd = DVD(title='Example DVD', description='Sample DVD', director='Jane Doe', main_actors='Actor A, Actor B', genre='Drama', duration_minutes=120)
-                dvd.genres.append(g1)
+        def progress(stats):
+            click.echo(f"  {stats['imported']} items imported ({stats['items_per_second']} items/s)")
 
-                bg = BoardGame(title='Example Game', description='Sample board game', author_note='Designer', min_players=2, max_players=4, genre='Family')
-                bg.genres.append(g1)
+        if path == '-':
+            stream = text_stream(click.get_binary_stream('stdin'))
+        else:
+            stream = open(path, encoding='utf-8', newline='')
+        with stream:
+            stats = import_records(parse_records(stream, fmt), chunk_size=chunk_size, progress=progress)
 
-                db.session.add_all([book, cd, dvd, bg])
-                db.session.commit()
+        for err in stats['errors']:
+            click.echo(f'Skipped {err}')
+        click.echo(f"Imported {stats['imported']} items in {stats['elapsed_seconds']}s ({stats['items_per_second']} items/s).")
 
-        # save current hash
-        hash_file.write_text(current_hash)
-        click.echo('Database recreated and model hash updated.')
+    @app.cli.command('generate-items')
+    @click.argument('count', type=int)
+    @click.option('--seed', type=int, default=0, help='Random seed; equal seeds generate identical catalogs')
+    @click.option('--chunk-size', type=int, default=None, help='Items per transaction (default: IMPORT_CHUNK_SIZE)')
+    def generate_items(count: int, seed: int, chunk_size: int):
+        """Add COUNT synthetic items of all types (e.g. for load testing)."""
+        from .importer import import_records
+        from .seed import generate_records
+
+        def progress(stats):
+            click.echo(f"  {stats['imported']} items imported ({stats['items_per_second']} items/s)")
+
+        stats = import_records(generate_records(count, seed), chunk_size=chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000), progress=progress)
+        click.echo(f"Generated {stats['imported']} items in {stats['elapsed_seconds']}s.")
+
+    @app.cli.command('export-items')
+    @click.argument('directory', type=click.Path(file_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv', 'columnar']), default='ndjson', help='Output format')
+    @click.option('--compress', 'compression', type=click.Choice(['none', 'gzip', 'zstd']), default='none', help='Compress every chunk (zstd needs the zstandard package)')
+    @click.option('--chunk-size', type=int, default=5000, help='Items read and written per chunk')
+    @click.option('--resume', is_flag=True, help='Continue an interrupted export in DIRECTORY')
+    def export_items_command(directory: str, fmt: str, compression: str, chunk_size: int, resume: bool):
+        """Export the whole catalog into DIRECTORY in keyset-ordered chunks."""
+        from .exporter import export_items
+
+        def progress(stats):
+            click.echo(f"  {stats['exported']} items exported up to id {stats['last_id']} "
+                       f"({stats['items_per_second']} items/s, {stats['bytes_written'] / 1e6:.1f} MB written)")
+
+        try:
+            stats = export_items(directory, fmt, compression, chunk_size=chunk_size, resume=resume, progress=progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for name, size in sorted(stats['files'].items()):
+            click.echo(f'  {name}: {size} bytes')
+        click.echo(f"Exported {stats['exported']} items in {stats.get('elapsed_seconds', 0)}s "
+                   f"({stats.get('items_per_second', 0)} items/s). Changes since: /api/items/changes?since={stats['since']}")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Recreate the full-text search table and triggers and reindex all items."""
+        from .extensions import db
+        from . import search
+
+        if not search.available():
+            click.echo('Full-text search needs SQLite (FTS5); nothing to rebuild.')
+            return
+        count = search.rebuild()
+        db.session.commit()
+        click.echo(f'Indexed {count} items.')
+
+    @app.cli.command('rebuild-counts')
+    def rebuild_counts_command():
+        """Recompute the per-type item counters from the item table."""
+        from .extensions import db
+        from .counters import rebuild_counts
+
+        counts = rebuild_counts(db.session.connection())
+        db.session.commit()
+        for typ, n in sorted(counts.items()):
+            click.echo(f'{typ}: {n}')
+
+    @app.cli.command('rebuild-facets')
+    def rebuild_facets_command():
+        """Recompute the facet values and counts of every item."""
+        from .extensions import db
+        from .facets import rebuild_facets
+
+        stats = rebuild_facets(db.session.connection())
+        db.session.commit()
+        click.echo(f"{stats['values']} facet values of {stats['items']} items")
+
+    @app.cli.command('rebuild-summaries')
+    def rebuild_summaries_command():
+        """Recompute the item summaries read by the home page and listings."""
+        from .extensions import db
+        from .summaries import rebuild_summaries
+
+        count = rebuild_summaries(db.session.connection())
+        db.session.commit()
+        click.echo(f'{count} item summaries')
+
+    @app.cli.command('precompile-templates')
+    def precompile_templates():
+        """Compile every template into the Jinja bytecode cache."""
+        from .templating import cache_dir, precompile
+
+        result = precompile(current_app)
+        for name, message in result['errors']:
+            click.echo(f'{name}: {message}', err=True)
+        if current_app.jinja_env.bytecode_cache is None:
+            click.echo(f"Checked {len(result['compiled'])} templates (TEMPLATE_BYTECODE_CACHE is off, nothing stored).")
+        else:
+            click.echo(f"Compiled {len(result['compiled'])} templates into {cache_dir(current_app)}.")
+        if result['errors']:
+            raise click.ClickException(f"{len(result['errors'])} templates failed to compile")
+
+    @app.cli.command('worker')
+    @click.option('--burst', is_flag=True, help='Exit as soon as no job is due instead of polling')
+    @click.option('--max-jobs', type=int, default=None, help='Exit after running this many jobs')
+    @click.option('--name', default=None, help='Worker name recorded on claimed jobs (default: host:pid)')
+    def worker(burst: bool, max_jobs: int, name: str):
+        """Run queued background jobs (see librarymanager.jobs)."""
+        from .jobs import Worker
+
+        w = Worker(current_app._get_current_object(), name=name)
+        restore = w.install_signal_handlers()
+        click.echo(f'Worker {w.name} started.')
+        try:
+            count = w.run(burst=burst, max_jobs=max_jobs)
+        finally:
+            restore()
+        click.echo(f'Worker {w.name} stopped after {count} jobs.')
+
+    @app.cli.command('attach-image')
+    @click.argument('item_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def attach_image(item_id: int, path: str):
+        """Store a local image file as an item's image."""
+        from .extensions import db
+        from .images import check_image, store_image
+        from .models import Item
+
+        item = db.session.get(Item, item_id)
+        if item is None:
+            raise click.ClickException(f'No item {item_id}')
+        data = Path(path).read_bytes()
+        try:
+            check_image(data)
+        except ValueError as e:
+            raise click.ClickException(f'{path}: {e}')
+        item.image_digest = store_image(data)
+        db.session.commit()
+        click.echo(f'Item {item_id} image: {item.image_digest}')
+
+    @app.cli.command('jobs')
+    def jobs_command():
+        """Show job counts and timings per task and status."""
+        from .jobs import job_stats
+
+        for s in job_stats():
+            finished = s['status'] in ('done', 'failed')
+            timing = f", avg run {s['run_seconds'] / s['count'] * 1000:.1f} ms, avg wait {s['wait_seconds'] / s['count']:.1f} s" if finished else ''
+            click.echo(f"{s['task']} {s['status']}: {s['count']} jobs, {s['attempts']} attempts{timing}")
+
+    @app.cli.command('explain-queries')
+    @click.option('--verbose', '-v', is_flag=True, help='Print the plan of every statement, not only flagged ones')
+    def explain_queries(verbose: bool):
+        """Run EXPLAIN QUERY PLAN on the queries behind the hot pages.
+
+        Exits with status 1 when a query scans a table without an index, so
+        the command can gate deploys.
+        """
+        from . import register_components
+        from .explain import explain_hot_queries
+
+        # the hot pages are requested: make sure their views are registered
+        app = current_app._get_current_object()
+        register_components(app, ('html', 'api'))
+        report = explain_hot_queries(app)
+        flagged = [r for r in report if r['full_scans']]
+        for r in report:
+            if not (verbose or r['full_scans']):
+                continue
+            status = 'FULL SCAN' if r['full_scans'] else 'ok'
+            click.echo(f"[{status}] {r['page']}: {r['sql'][:200]}")
+            for step in r['plan']:
+                click.echo(f'    {step}')
+        click.echo(f'Explained {len(report)} statements, {len(flagged)} with full table scans.')
+        if flagged:
+            raise SystemExit(1)
@@ -9,3 +9,80 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     # pagination default
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', '10'))
+    # JSON API listing: default/maximum keyset page size and the chunk size
+    # used when streaming the full catalog
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '100'))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '1000'))
+    API_STREAM_BATCH_SIZE = int(os.environ.get('API_STREAM_BATCH_SIZE', '500'))
+    # JSON encoder of the item API: 'auto' (orjson when installed), 'orjson'
+    # or 'json'; see librarymanager.serializers
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    # polymorphic loading mode per endpoint ('joined', 'selectin' or 'lazy');
+    # see librarymanager.loading
+    POLYMORPHIC_LOADING_DEFAULT = os.environ.get('POLYMORPHIC_LOADING_DEFAULT', 'selectin')
+    POLYMORPHIC_LOADING = {
+        'main.item_detail': 'joined',
+        'main.edit_item': 'joined',
+    }
+    # bulk import: number of items inserted per transaction
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+    # entries per author/genre name -> id cache (librarymanager.resolver)
+    NAME_CACHE_SIZE = int(os.environ.get('NAME_CACHE_SIZE', '10000'))
+    # results per page for /search and /api/search
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+    # values shown per facet on listings and /api/items/facets
+    # (librarymanager.facets)
+    FACET_VALUES_LIMIT = int(os.environ.get('FACET_VALUES_LIMIT', '10'))
+    # rows counted at most when the per-type counters are unavailable
+    ITEM_COUNT_APPROX_LIMIT = int(os.environ.get('ITEM_COUNT_APPROX_LIMIT', '10000'))
+    # rendered page cache for the main GET views: None (off), 'memory' or
+    # 'filesystem' (PAGE_CACHE_DIR, default instance/page_cache)
+    PAGE_CACHE_TYPE = os.environ.get('PAGE_CACHE_TYPE') or None
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR') or None
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', '1000'))
+    PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '0'))
+    # Jinja bytecode cache (librarymanager.templating): compiled templates
+    # are kept in TEMPLATE_CACHE_DIR (default: a per-user temp directory) so
+    # new workers skip compiling them; `flask precompile-templates` fills it
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', '1').lower() in ('1', 'true', 'yes')
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') or None
+    # request instrumentation (librarymanager.metrics): per-endpoint
+    # histograms served at /debug/metrics, and a warning for every request
+    # slower than SLOW_REQUEST_MS (0 = off)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '0'))
+    # SQLite connection tuning (librarymanager.sqlite_profile): 'default' or
+    # 'production' (WAL, synchronous=NORMAL, mmap, larger cache and pool);
+    # SQLITE_PRAGMAS overrides single pragmas, e.g. {'mmap_size': 0}
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+    SQLITE_PRAGMAS = {}
+    # read routing (librarymanager.routing): GET views of the main and api
+    # blueprints read from READ_REPLICA_URI, a database URL or 'readonly'
+    # (the primary SQLite file opened with mode=ro). After a commit the rest
+    # of the request, and the client for READ_YOUR_WRITES_SECONDS, reads
+    # from the primary
+    READ_REPLICA_URI = os.environ.get('READ_REPLICA_URI') or None
+    READ_REPLICA_ENGINE_OPTIONS = {}
+    READ_YOUR_WRITES = True
+    READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+    # background jobs (librarymanager.jobs), run by `flask worker`: idle poll
+    # interval, retry backoff base/cap, lease after which a running job of a
+    # dead worker is retried, and how long finished jobs are kept (seconds)
+    JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', '1'))
+    JOBS_BACKOFF_SECONDS = float(os.environ.get('JOBS_BACKOFF_SECONDS', '5'))
+    JOBS_BACKOFF_MAX_SECONDS = float(os.environ.get('JOBS_BACKOFF_MAX_SECONDS', '3600'))
+    JOBS_LEASE_SECONDS = int(os.environ.get('JOBS_LEASE_SECONDS', '300'))
+    JOBS_KEEP_SECONDS = int(os.environ.get('JOBS_KEEP_SECONDS', str(7 * 24 * 3600)))
+    # local image copies (librarymanager.images); IMAGE_DIR defaults to
+    # instance/images
+    IMAGE_DIR = os.environ.get('IMAGE_DIR') or None
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+    IMAGE_FETCH_TIMEOUT = float(os.environ.get('IMAGE_FETCH_TIMEOUT', '10'))
+    # let the fetch_image job connect to loopback, private and link-local hosts
+    IMAGE_FETCH_ALLOW_PRIVATE = os.environ.get('IMAGE_FETCH_ALLOW_PRIVATE', '').lower() in ('1', 'true', 'yes')
+    # thumbnails (librarymanager.thumbnails): name -> bounding box in pixels,
+    # rendered on first request into THUMBNAIL_DIR (default
+    # instance/thumbnails), least recently used evicted beyond the budget
+    THUMBNAIL_SIZES = {'small': 96, 'medium': 320}
+    THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR') or None
+    THUMBNAIL_CACHE_BYTES = int(os.environ.get('THUMBNAIL_CACHE_BYTES', str(256 * 1024 * 1024)))
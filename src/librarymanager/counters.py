@@ -0,0 +1,88 @@
+"""Per-type item counts served in O(1) from ``item_type_count``.
+
+``items_by_type`` used to run ``SELECT count(*) FROM item WHERE type = ?``
+on every page view, a full scan of ``item``. Instead the counts live in a
+small table that is
+
+* seeded from the real counts when the table is created,
+* incremented/decremented by ``after_insert``/``after_delete`` mapper
+  events inside the writing transaction (so a rollback undoes them too),
+* bumped explicitly by Core bulk writers via :func:`bump_counts`,
+* rebuilt from scratch with ``flask rebuild-counts``.
+
+Counters are only ever *updated*, never created, by the events: a type
+without a row has no trustworthy baseline, and :func:`item_count` then
+falls back to a bounded, approximate count.
+"""
+from typing import Dict, Mapping, Tuple
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, select, update
+
+from .extensions import db
+from .models import Item, ItemTypeCount
+
+counter_table = ItemTypeCount.__table__
+
+
+def _identities():
+    """Polymorphic identities of every concrete item subtype."""
+    return [m.polymorphic_identity for m in Item.__mapper__.self_and_descendants if m is not Item.__mapper__]
+
+
+def rebuild_counts(connection) -> Dict[str, int]:
+    """Recompute all counters from ``item``; returns ``{type: count}``."""
+    counts = dict.fromkeys(_identities(), 0)
+    counts.update(connection.execute(select(Item.type, func.count()).group_by(Item.type)).all())
+    connection.execute(counter_table.delete())
+    connection.execute(counter_table.insert(), [{'type': t, 'count': n} for t, n in counts.items()])
+    return counts
+
+
+def bump_counts(connection, deltas: Mapping[str, int]) -> None:
+    """Apply ``{type: delta}`` to existing counters (e.g. after Core inserts)."""
+    for typ, delta in deltas.items():
+        if delta:
+            connection.execute(update(counter_table).where(counter_table.c.type == typ)
+                               .values(count=counter_table.c.count + delta))
+
+
+@event.listens_for(counter_table, 'after_create')
+def _seed_counts(target, connection, **kw):
+    rebuild_counts(connection)
+
+
+@event.listens_for(Item, 'after_insert', propagate=True)
+def _count_insert(mapper, connection, target):
+    bump_counts(connection, {target.type: 1})
+
+
+@event.listens_for(Item, 'after_delete', propagate=True)
+def _count_delete(mapper, connection, target):
+    bump_counts(connection, {target.type: -1})
+
+
+def _table_ready(session) -> bool:
+    # cache a positive answer only: the table may be created later on
+    state = current_app.extensions.setdefault('item_counts', {})
+    if not state.get('ready'):
+        state['ready'] = inspect(session.connection()).has_table(counter_table.name)
+    return state['ready']
+
+
+def item_count(typ: str, session=None) -> Tuple[int, bool]:
+    """Return ``(count, exact)`` for items of polymorphic type ``typ``.
+
+    Served from the counter table when possible. Otherwise at most
+    ``ITEM_COUNT_APPROX_LIMIT`` rows are counted; hitting that limit gives
+    ``exact=False`` and the count should be shown as a lower bound.
+    """
+    session = session or db.session
+    if _table_ready(session):
+        count = session.execute(select(counter_table.c.count).where(counter_table.c.type == typ)).scalar()
+        if count is not None:
+            return count, True
+    cap = current_app.config.get('ITEM_COUNT_APPROX_LIMIT', 10000)
+    sample = select(Item.id).where(Item.type == typ).limit(cap).subquery()
+    count = session.execute(select(func.count()).select_from(sample)).scalar()
+    return count, count < cap
@@ -0,0 +1,137 @@
+"""``EXPLAIN QUERY PLAN`` checks for the queries behind the hot pages.
+
+Rather than keeping a hand-written copy of every query (which would drift
+from the views), :func:`explain_hot_queries` requests each page listed in
+``HOT_PAGES`` through the test client, records the SQL the app actually
+issues, and asks SQLite for the plan of every distinct ``SELECT``.
+
+A plan step is flagged as a full scan when SQLite reads a table without an
+index (``SCAN item`` rather than ``SEARCH item USING INDEX ...``) and the
+statement filters rows (``WHERE``), is unbounded (no ``LIMIT``) or has to
+sort the scanned rows. An index-less scan of a bounded, unfiltered
+``ORDER BY id LIMIT n`` walks the rowid b-tree in order and stops after
+``n`` rows, so it is not flagged, and neither is reading the rows of a
+subquery. Temporary sort b-trees are also listed as notes (ranking search
+results always needs one).
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import event, select
+
+from .extensions import db
+from .models import Item
+
+# (label, URL, follow the rel="next" link / next_cursor once)
+HOT_PAGES: List[Tuple[str, str, bool]] = [
+    ('home', '/', False),
+    ('list books by id', '/items/type/book?sort=id&order=asc', True),
+    ('list books by id desc', '/items/type/book?sort=id&order=desc', True),
+    ('list books by title', '/items/type/book?sort=title&order=asc', True),
+    ('list books by title desc', '/items/type/book?sort=title&order=desc', True),
+    ('list books by language', '/items/type/book?language=en', True),
+    ('item detail', '/items/{item_id}', False),
+    ('api page by id', '/api/items?limit=50', True),
+    ('api page by title', '/api/items?limit=50&sort=title', True),
+    ('api search', '/api/search?q=a', False),
+    ('api changes', '/api/items/changes?limit=50', False),
+    ('api facets', '/api/items/facets?type=book', False),
+    ('api facets filtered', '/api/items/facets?type=book&language=en', False),
+]
+
+_NEXT_LINK_RE = re.compile(r'<a href="([^"]+)" rel="next">')
+
+
+def is_full_scan(detail: str, statement: str, plan: Optional[List[str]] = None) -> bool:
+    """Whether the plan step ``detail`` is a table scan worth flagging.
+
+    ``plan`` is the statement's whole plan: an index-less scan feeding a
+    temporary ``ORDER BY`` b-tree reads every row even under a ``LIMIT``.
+    """
+    if not detail.startswith('SCAN ') or ' USING ' in detail or 'VIRTUAL TABLE' in detail:
+        return False
+    # reading the rows of a subquery (co-routine or materialized) is no table scan
+    name = detail[len('SCAN '):].split(' ')[0]
+    if any(step in (f'CO-ROUTINE {name}', f'MATERIALIZE {name}') for step in plan or ()):
+        return False
+    if any('TEMP B-TREE FOR ORDER BY' in step for step in plan or ()):
+        return True
+    sql = ' '.join(statement.upper().split())
+    return ' WHERE ' in sql or ' LIMIT ' not in sql
+
+
+def explain(connection, statement: str, parameters: Any) -> List[str]:
+    """Return the ``detail`` column of ``EXPLAIN QUERY PLAN statement``."""
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+    return [row[-1] for row in rows]
+
+
+def _capture(app: Flask, url: str, follow_next: bool) -> List[Tuple[str, Any]]:
+    """Request ``url`` (and its next page) and return the SELECTs issued."""
+    captured: List[Tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        resp = client.get(url)
+        next_url = None
+        if follow_next and resp.status_code == 200:
+            if resp.is_json:
+                cursor = (resp.get_json() or {}).get('next_cursor')
+                if cursor:
+                    next_url = f'{url}&cursor={cursor}'
+            else:
+                m = _NEXT_LINK_RE.search(resp.get_data(as_text=True))
+                if m:
+                    next_url = m.group(1).replace('&amp;', '&')
+        if next_url:
+            client.get(next_url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def explain_hot_queries(app: Flask) -> List[Dict[str, Any]]:
+    """Explain every distinct SELECT issued by the pages in ``HOT_PAGES``.
+
+    Must run inside an app context. Returns one dict per statement with
+    ``page``, ``sql``, ``plan`` (list of steps), ``full_scans`` and
+    ``notes`` (e.g. temporary sort b-trees).
+    """
+    # cached pages would hide the queries behind them
+    page_cache = app.extensions.pop('page_cache', None)
+    try:
+        return _explain_pages(app)
+    finally:
+        app.extensions['page_cache'] = page_cache
+
+
+def _explain_pages(app: Flask) -> List[Dict[str, Any]]:
+    item_id: Optional[int] = db.session.execute(select(Item.id).limit(1)).scalar()
+    report: List[Dict[str, Any]] = []
+    seen = set()
+    for label, url, follow_next in HOT_PAGES:
+        if '{item_id}' in url:
+            if item_id is None:
+                continue
+            url = url.format(item_id=item_id)
+        for statement, parameters in _capture(app, url, follow_next):
+            if statement in seen:
+                continue
+            seen.add(statement)
+            with db.engine.connect() as conn:
+                plan = explain(conn, statement, parameters)
+            report.append({
+                'page': label,
+                'sql': ' '.join(statement.split()),
+                'plan': plan,
+                'full_scans': [d for d in plan if is_full_scan(d, statement, plan)],
+                'notes': [d for d in plan if 'TEMP B-TREE' in d],
+            })
+    return report
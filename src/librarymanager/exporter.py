@@ -0,0 +1,214 @@
+"""Bulk catalog export.
+
+The catalog is read in keyset chunks (``WHERE item.id > :last ORDER BY id
+LIMIT :chunk``) of raw rows serialized by ``librarymanager.serializers``,
+so memory stays constant and no read transaction is held between chunks.
+That is also what makes an export resumable: after every chunk the files are
+flushed and fsynced, then ``export-state.json`` records the last exported
+id and the size of every file. ``resume=True`` truncates the files back to
+the recorded sizes, which drops a chunk that was half written when the run
+was interrupted, and continues after that id.
+
+Formats (one or more files in the output directory):
+
+``ndjson``
+    ``items.ndjson``: one item per line, as returned by the JSON API.
+``csv``
+    ``items-<type>.csv`` per item type, with that type's columns. Lists are
+    ``;``-separated, so the files can be loaded back with ``flask
+    import-items``.
+``columnar``
+    ``items-<type>.columns.ndjson`` per item type. Each line is one row
+    group (one chunk) as ``{"type", "rows", "columns": {name: [values]}}``,
+    so readers can load single columns and values of a column compress
+    together.
+
+Each chunk is compressed as its own gzip member or zstd frame (optional
+``zstandard`` package). The concatenated file is still a valid ``.gz`` /
+``.zst`` stream, and appending after a resume needs no re-compression.
+
+Chunks are read in separate transactions, so writes that happen during the
+export can show up in it or not. The state records the catalog version at
+the start as a ``since`` token of ``/api/items/changes``. Polling the
+change feed from there catches up with everything that changed meanwhile.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .extensions import db
+from .importer import CSV_LIST_SEPARATOR
+from .models import Item
+from .pagination import encode_cursor
+from .serializers import dumps, get_serializer
+from .versioning import current_version
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'columnar')
+COMPRESSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+STATE_FILE = 'export-state.json'
+
+
+def _compressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == 'none':
+        return lambda data: data
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd compression needs the zstandard package (pip install zstandard)')
+        cctx = zstandard.ZstdCompressor(level=3)
+        return cctx.compress
+    raise ValueError(f'unsupported compression {compression!r}')
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return CSV_LIST_SEPARATOR.join(str(v) for v in value)
+    return value
+
+
+def _csv_rows(items: List[Dict[str, Any]], header: Optional[List[str]]) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    if header:
+        writer.writerow(header)
+    for it in items:
+        writer.writerow([_csv_value(v) for v in it.values()])
+    return buf.getvalue().encode()
+
+
+def _columns(typ: str, items: List[Dict[str, Any]]) -> bytes:
+    names = list(items[0])
+    return dumps({'type': typ, 'rows': len(items), 'columns': {n: [it[n] for it in items] for n in names}}) + b'\n'
+
+
+class _Files:
+    """The export's output files: appends compressed chunks and tracks
+    sizes for the state file."""
+
+    def __init__(self, directory: str, compression: str, sizes: Dict[str, int]):
+        self.directory = directory
+        self.compress = _compressor(compression)
+        self.sizes = dict(sizes)
+
+    def append(self, name: str, data: bytes) -> int:
+        path = os.path.join(self.directory, name)
+        payload = self.compress(data)
+        with open(path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.sizes[name] = self.sizes.get(name, 0) + len(payload)
+        return len(payload)
+
+    def truncate(self) -> None:
+        """Cut every file back to its recorded size (after an interruption)."""
+        for name, size in self.sizes.items():
+            path = os.path.join(self.directory, name)
+            with open(path, 'ab') as f:
+                f.truncate(size)
+
+
+def _write_state(directory: str, state: Dict[str, Any]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.export-state-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, os.path.join(directory, STATE_FILE))
+
+
+def read_state(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def export_items(directory: str, fmt: str = 'ndjson', compression: str = 'none', chunk_size: int = 5000,
+                 resume: bool = False, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Export the catalog into ``directory``; see the module docstring.
+
+    Returns the final state: ``{'format', 'compression', 'last_id',
+    'exported', 'files', 'since', 'complete', 'elapsed_seconds',
+    'items_per_second', 'bytes_written'}``. Raises ``ValueError`` for bad
+    arguments or a state that does not match them.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'unsupported format {fmt!r}')
+    suffix = COMPRESSIONS.get(compression)
+    if suffix is None:
+        raise ValueError(f'unsupported compression {compression!r}')
+    chunk_size = max(1, int(chunk_size))
+    os.makedirs(directory, exist_ok=True)
+
+    state = read_state(directory) if resume else None
+    if state is not None:
+        if (state['format'], state['compression']) != (fmt, compression):
+            raise ValueError(f"export in {directory} was started as {state['format']}/{state['compression']}")
+        if state['complete']:
+            return state
+    else:
+        state = {'format': fmt, 'compression': compression, 'last_id': 0, 'exported': 0, 'files': {},
+                 'since': encode_cursor([current_version(), 0]), 'complete': False}
+        # start the files from scratch
+        for name in os.listdir(directory):
+            if name.startswith('items') and name.endswith(('.ndjson' + suffix, '.csv' + suffix)):
+                os.remove(os.path.join(directory, name))
+        db.session.close()
+    files = _Files(directory, compression, state['files'])
+    files.truncate()
+
+    serializer = get_serializer()
+    start = time.perf_counter()
+    exported_before = state['exported']
+    bytes_written = 0
+    while True:
+        rows = db.session.execute(serializer.select().where(Item.id > state['last_id'])
+                                  .order_by(Item.id).limit(chunk_size)).all()
+        items = serializer.serialize_rows(rows) if rows else []
+        db.session.close()  # end the read transaction between chunks
+        if not rows:
+            break
+
+        by_file: Dict[str, List[Dict[str, Any]]] = {}
+        for it in items:
+            name = 'items.ndjson' if fmt == 'ndjson' else (
+                f"items-{it['type']}.csv" if fmt == 'csv' else f"items-{it['type']}.columns.ndjson")
+            by_file.setdefault(name + suffix, []).append(it)
+        for name, group in by_file.items():
+            if fmt == 'ndjson':
+                data = b''.join(dumps(it) + b'\n' for it in group)
+            elif fmt == 'csv':
+                data = _csv_rows(group, list(group[0]) if name not in files.sizes else None)
+            else:
+                data = _columns(group[0]['type'], group)
+            bytes_written += files.append(name, data)
+
+        state.update(last_id=rows[-1][serializer.id_index], exported=state['exported'] + len(rows), files=files.sizes)
+        _write_state(directory, state)
+        if progress:
+            progress(_with_rate(state, start, exported_before, bytes_written))
+
+    state['complete'] = True
+    _write_state(directory, state)
+    return _with_rate(state, start, exported_before, bytes_written)
+
+
+def _with_rate(state: Dict[str, Any], start: float, exported_before: int, bytes_written: int) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - start
+    done = state['exported'] - exported_before
+    return dict(state, elapsed_seconds=round(elapsed, 3), bytes_written=bytes_written,
+                items_per_second=round(done / elapsed, 1) if elapsed > 0 else 0.0)
@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 
-db = SQLAlchemy()
-migrate = Migrate()
+from .routing import RoutingSession
+
+# RoutingSession sends reads to READ_REPLICA_URI when configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
@@ -16,3 +17,14 @@ def load_user(user_id):
 		return User.query.get(int(user_id))
 	except Exception:
 		return None
+
+
+def __getattr__(name):
+	# Flask-Migrate imports Alembic (and with it Mako and Pygments), a large
+	# share of the startup time; only `flask db` needs it, so `migrate` is
+	# created on first access (see librarymanager.cli.LazyGroup)
+	if name == 'migrate':
+		from flask_migrate import Migrate
+		globals()['migrate'] = Migrate()
+		return globals()['migrate']
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
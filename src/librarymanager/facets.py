@@ -0,0 +1,267 @@
+"""Faceted browsing: narrow listings by genre, author, language or players.
+
+Counting facet values live (``GROUP BY`` over ``item_genre``/``item_author``
+joined to the names, per page view) gets expensive as the catalog grows.
+Instead two derived tables are maintained:
+
+``item_facet``
+    one ``(item_id, facet, value, type)`` row per facet value of an item:
+    its genre and author names, a book's language and every player count a
+    board game supports (up to ``PLAYERS_MAX``). Filters are ``item.id IN
+    (SELECT item_id FROM item_facet WHERE facet = ? AND value = ? AND type =
+    ?)``, one per active facet, so they compose with any keyset ordering.
+``facet_count``
+    the number of items per ``(type, facet, value)``, plus the totals over
+    all types under type ``'*'``. Unfiltered listings read their facet
+    counts from here: the top values of every facet in one indexed
+    statement.
+
+Just before a transaction that touched items commits (as tracked by
+:mod:`librarymanager.changes`, which also covers the Core writes of the
+importer and the resolver), the facet values of those items are recomputed
+and only the differences are applied to both tables, inside the committing
+transaction. ``flask rebuild-facets`` recomputes everything, e.g. for
+databases migrated from before the tables existed.
+
+With filters active the counts are those of the matching items, computed
+from ``item_facet`` alone for just those items.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, event, func, inspect, literal, select, tuple_, union_all
+from sqlalchemy.dialects.sqlite import insert
+
+from .changes import pending_changes
+from .extensions import db
+from .loading import ITEM_SUBCLASSES
+from .models import Author, BoardGame, Book, FacetCount, Genre, Item, ItemFacet, ItemTypeCount, item_author, item_genre
+
+FACETS = ('genre', 'author', 'language', 'players')
+FACET_LABELS = {'genre': 'Genre', 'author': 'Author', 'language': 'Language', 'players': 'Players'}
+
+#: ``facet_count.type`` of the totals over all item types
+ALL_TYPES = '*'
+
+# board games are listed under every player count from min to max, capped
+PLAYERS_MAX = 12
+
+# item ids per statement when recomputing facet values
+_BATCH = 500
+
+facet_table = ItemFacet.__table__
+count_table = FacetCount.__table__
+
+FacetValues = Set[Tuple[str, str]]
+
+
+def item_types() -> List[str]:
+    """Polymorphic identities a listing can be narrowed to."""
+    return [cls.__mapper__.polymorphic_identity for cls in ITEM_SUBCLASSES]
+
+
+def _player_counts(min_players: Optional[int], max_players: Optional[int]) -> Iterable[int]:
+    low = min_players or max_players
+    high = max_players or min_players
+    if not low:
+        return ()
+    return range(max(low, 1), min(max(low, high), PLAYERS_MAX) + 1)
+
+
+def item_facets(connection, ids: Iterable[int]) -> Dict[int, Tuple[str, FacetValues]]:
+    """Current ``{item_id: (type, {(facet, value)})}`` of the existing items among ``ids``."""
+    ids = list(ids)
+    item, book, game = Item.__table__, Book.__table__, BoardGame.__table__
+    rows = connection.execute(
+        select(item.c.id, item.c.type, book.c.language, game.c.min_players, game.c.max_players)
+        .select_from(item.outerjoin(book, book.c.id == item.c.id).outerjoin(game, game.c.id == item.c.id))
+        .where(item.c.id.in_(ids))
+    ).all()
+    result: Dict[int, Tuple[str, FacetValues]] = {}
+    for item_id, typ, language, min_players, max_players in rows:
+        values: FacetValues = {('players', str(n)) for n in _player_counts(min_players, max_players)}
+        if language:
+            values.add(('language', language))
+        result[item_id] = (typ, values)
+    for facet, link, model, fk in (('author', item_author, Author, 'author_id'), ('genre', item_genre, Genre, 'genre_id')):
+        names = connection.execute(
+            select(link.c.item_id, model.__table__.c.name)
+            .join(model.__table__, model.__table__.c.id == link.c[fk])
+            .where(link.c.item_id.in_(ids))
+        ).all()
+        for item_id, name in names:
+            if item_id in result:
+                result[item_id][1].add((facet, name))
+    return result
+
+
+def bump_facet_counts(connection, deltas: Mapping[Tuple[str, str, str], int]) -> None:
+    """Apply ``{(type, facet, value): delta}`` to ``facet_count``."""
+    rows = [{'type': t, 'facet': f, 'value': v, 'count': d} for (t, f, v), d in deltas.items() if d]
+    if not rows:
+        return
+    stmt = insert(count_table)
+    stmt = stmt.on_conflict_do_update(index_elements=['type', 'facet', 'value'],
+                                      set_={'count': count_table.c.count + stmt.excluded['count']})
+    connection.execute(stmt, rows)
+    gone = [(r['type'], r['facet'], r['value']) for r in rows if r['count'] < 0]
+    if gone:
+        key = tuple_(count_table.c.type, count_table.c.facet, count_table.c.value)
+        connection.execute(delete(count_table).where(key.in_(gone), count_table.c.count <= 0))
+
+
+def update_facets(connection, ids: Iterable[int]) -> None:
+    """Bring ``item_facet`` and ``facet_count`` up to date for ``ids``
+    (inserted, changed or deleted items)."""
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), _BATCH):
+        batch = ids[start:start + _BATCH]
+        new = item_facets(connection, batch)
+        old: Dict[int, Tuple[str, FacetValues]] = {}
+        for item_id, typ, facet, value in connection.execute(
+                select(facet_table.c.item_id, facet_table.c.type, facet_table.c.facet, facet_table.c.value)
+                .where(facet_table.c.item_id.in_(batch))):
+            old.setdefault(item_id, (typ, set()))[1].add((facet, value))
+
+        deltas: Counter = Counter()
+        changed = [item_id for item_id in batch if old.get(item_id) != new.get(item_id)]
+        for item_id in changed:
+            for state, sign in ((old.get(item_id), -1), (new.get(item_id), 1)):
+                if state is None:
+                    continue
+                typ, values = state
+                for facet, value in values:
+                    deltas[(typ, facet, value)] += sign
+                    deltas[(ALL_TYPES, facet, value)] += sign
+        if not changed:
+            continue
+        connection.execute(delete(facet_table).where(facet_table.c.item_id.in_(changed)))
+        rows = [{'item_id': item_id, 'type': new[item_id][0], 'facet': facet, 'value': value}
+                for item_id in changed if item_id in new for facet, value in new[item_id][1]]
+        if rows:
+            connection.execute(facet_table.insert(), rows)
+        bump_facet_counts(connection, deltas)
+
+
+def rebuild_facets(connection) -> Dict[str, int]:
+    """Recompute both tables from the catalog; returns ``{'items', 'values'}``."""
+    connection.execute(delete(facet_table))
+    connection.execute(delete(count_table))
+    last, items, values = 0, 0, 0
+    while True:
+        ids = connection.execute(select(Item.id).where(Item.id > last).order_by(Item.id).limit(_BATCH * 10)).scalars().all()
+        if not ids:
+            break
+        for start in range(0, len(ids), _BATCH):
+            facets = item_facets(connection, ids[start:start + _BATCH])
+            rows = [{'item_id': item_id, 'type': typ, 'facet': f, 'value': v}
+                    for item_id, (typ, vals) in facets.items() for f, v in vals]
+            if rows:
+                connection.execute(facet_table.insert(), rows)
+            values += len(rows)
+        items += len(ids)
+        last = ids[-1]
+    f = facet_table.c
+    per_type = select(f.type, f.facet, f.value, func.count()).group_by(f.type, f.facet, f.value)
+    overall = select(literal(ALL_TYPES), f.facet, f.value, func.count()).group_by(f.facet, f.value)
+    for stmt in (per_type, overall):
+        connection.execute(count_table.insert().from_select(['type', 'facet', 'value', 'count'], stmt))
+    return {'items': items, 'values': values}
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def _seed_facets(target, connection, tables=(), **kw):
+    if {t.name for t in tables} & {facet_table.name, count_table.name}:
+        rebuild_facets(connection)
+
+
+def _tables_ready(session) -> bool:
+    # cache a positive answer only: the tables may be created later on
+    state = current_app.extensions.setdefault('facets', {})
+    if not state.get('ready'):
+        conn_inspect = inspect(session.connection())
+        state['ready'] = conn_inspect.has_table(facet_table.name) and conn_inspect.has_table(count_table.name)
+    return state['ready']
+
+
+@event.listens_for(db.session, 'before_commit')
+def _update_on_commit(session):
+    session.flush()
+    changes = pending_changes(session)
+    if changes and _tables_ready(session):
+        update_facets(session.connection(), changes)
+
+
+def parse_filters(args: Mapping[str, str]) -> Dict[str, str]:
+    """The facet filters (``genre=``, ``author=``, ...) of query ``args``."""
+    return {f: args[f].strip() for f in FACETS if args.get(f, '').strip()}
+
+
+def _matching(filters: Mapping[str, str], typ: Optional[str] = None):
+    """``item_facet`` rows of the last filter, one per item matching all ``filters``."""
+    f = facet_table.c
+    matching = None
+    for facet, value in filters.items():
+        stmt = select(f.item_id, f.type).where(f.facet == facet, f.value == value)
+        if typ:
+            stmt = stmt.where(f.type == typ)
+        if matching is not None:
+            stmt = stmt.where(f.item_id.in_(matching.with_only_columns(f.item_id)))
+        matching = stmt
+    return matching
+
+
+def filter_items(stmt, filters: Mapping[str, str], typ: Optional[str] = None, id_column=None):
+    """Restrict an item ``SELECT`` to items having every ``filters`` value.
+
+    ``id_column`` is the item id of ``stmt`` (default ``item.id``).
+    """
+    if not filters:
+        return stmt
+    id_column = Item.__table__.c.id if id_column is None else id_column
+    return stmt.where(id_column.in_(_matching(filters, typ).with_only_columns(facet_table.c.item_id)))
+
+
+def facet_counts(typ: Optional[str] = None, filters: Optional[Mapping[str, str]] = None, limit: int = 10,
+                 session=None) -> Tuple[Dict[str, List[Tuple[str, int]]], Optional[int]]:
+    """Return ``(facets, matching)`` for items of ``typ`` (all types when ``None``).
+
+    ``facets`` maps each facet with values to its ``limit`` most frequent
+    ``(value, count)`` pairs; without ``typ`` it includes a ``type`` facet.
+    ``matching`` is the number of items matching ``filters``, or ``None``
+    without filters (use :func:`librarymanager.counters.item_count`).
+    Empty when the facet tables do not exist yet.
+    """
+    session = session or db.session
+    if not _tables_ready(session):
+        return {}, None
+    f = facet_table.c
+    if not filters:
+        c = count_table.c
+        parts = [select(c.facet, c.value, c.count).where(c.type == (typ or ALL_TYPES), c.facet == facet)
+                 .order_by(c.count.desc(), c.value).limit(limit).subquery() for facet in FACETS]
+        selects = [select(*p.c) for p in parts]
+        if typ is None:
+            t = ItemTypeCount.__table__.c
+            selects.append(select(literal('type'), t.type, t.count).where(t.count > 0))
+    else:
+        # the values of the matching items, read from the covering primary key
+        matching = _matching(filters, typ)
+        selects = [select(f.facet, f.value, func.count()).where(f.item_id.in_(matching.with_only_columns(f.item_id)))
+                   .group_by(f.facet, f.value)]
+        if typ is None:
+            m = matching.subquery()
+            selects.append(select(literal('type'), m.c.type, func.count()).group_by(m.c.type))
+    rows = session.execute(union_all(*selects) if len(selects) > 1 else selects[0]).all()
+
+    counts: Dict[str, List[Tuple[str, int]]] = {}
+    for facet, value, count in sorted(rows, key=lambda r: (-r[2], r[1])):
+        counts.setdefault(facet, []).append((value, count))
+    matching = None
+    if filters:
+        # every matching item has each filter value exactly once
+        facet, value = next(iter(filters.items()))
+        matching = dict(counts.get(facet, ())).get(value, 0)
+    order = list(FACETS) + ['type']
+    return {k: counts[k][:limit] for k in sorted(counts, key=order.index)}, matching
@@ -0,0 +1,236 @@
+"""Local, content-addressed copies of item images.
+
+Setting or changing an item's ``image_url`` clears ``image_digest`` and
+queues a ``fetch_image`` job (see ``librarymanager.jobs``) in the same
+transaction; the write itself never touches the network. The job downloads
+the image (``http``/``https`` only, at most ``IMAGE_MAX_BYTES``, within
+``IMAGE_FETCH_TIMEOUT`` seconds), stores it under its SHA-256 in
+``IMAGE_DIR`` (default ``instance/images``) and records the digest on the
+item, unless an upload or ``flask attach-image`` set one in the meantime.
+Identical images are stored once. Every image is checked by
+:func:`check_image` before it is stored.
+
+``image_url`` is client input, so the worker only connects to public
+addresses: loopback, private, link-local (cloud metadata at
+169.254.169.254) and reserved addresses are refused, for the URL itself and
+for every redirect it leads to. The check runs when connecting: the host is
+resolved once and the socket is opened to the address that passed (the
+``Host`` header and TLS SNI still name the host), so a DNS answer that
+changes in between cannot slip past it. Such fetches go out directly, not
+through a proxy from the environment. Refused URLs fail the job at once
+(:class:`RefusedURL`). ``IMAGE_FETCH_ALLOW_PRIVATE`` lifts the check (e.g.
+for an image server on the local network).
+
+ORM writes are picked up in the flush events; the bulk importer, which
+inserts with Core, calls :func:`queue_fetches` itself.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import urllib.request
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from .extensions import db
+from .jobs import PermanentError, enqueue_many, task
+from .models import Item
+
+try:
+    from PIL import Image
+except ImportError:  # optional: check signatures only
+    Image = None
+
+_PENDING_KEY = 'image_fetches'
+
+# leading bytes of the image formats accepted for uploads
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def image_dir() -> str:
+    return current_app.config.get('IMAGE_DIR') or os.path.join(current_app.instance_path, 'images')
+
+
+def image_path(digest: str) -> str:
+    """Path of the stored image ``digest`` (fanned out by its first two
+    characters)."""
+    return os.path.join(image_dir(), digest[:2], digest)
+
+
+def store_image(data: bytes) -> str:
+    """Store ``data`` under its SHA-256 and return the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = image_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file and rename so readers never see partial files
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+def sniff_type(data: bytes) -> Optional[str]:
+    """MIME type of image ``data`` from its signature (``None`` if unknown)."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return next((mime for magic, mime in IMAGE_SIGNATURES if data.startswith(magic)), None)
+
+
+def check_image(data: bytes) -> str:
+    """MIME type of image ``data``; raises ``ValueError`` unless it is a
+    JPEG, PNG, GIF or WebP image. With Pillow it must also parse, pass
+    ``Image.verify()`` and stay within Pillow's decompression bomb limit."""
+    mime = sniff_type(data)
+    if mime is None:
+        raise ValueError('not a JPEG, PNG, GIF or WebP image')
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                im.verify()
+        except Image.DecompressionBombError as e:
+            raise ValueError(f'image too large to decode: {e}') from e
+        except (OSError, SyntaxError, ValueError) as e:  # UnidentifiedImageError is an OSError
+            raise ValueError(f'corrupt image: {e}') from e
+    return mime
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%')[0])  # drop an IPv6 scope id
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+class RefusedURL(PermanentError, ValueError):
+    """An image URL the worker must not fetch; retrying cannot change that."""
+
+
+def check_url(url: str) -> None:
+    """Raise :class:`RefusedURL` unless ``url`` is ``http``/``https`` with a host."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise RefusedURL(f'unsupported image URL {url!r}')
+
+
+def _public_connection(address, timeout, source_address=None) -> socket.socket:
+    """``socket.create_connection`` to a checked address: resolves the host
+    once, refuses it unless every address is public and connects to those."""
+    host, port = address
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if not all(_is_public(info[4][0]) for info in infos):
+        raise RefusedURL(f'refusing to fetch from {host}: not a public address')
+    error: Optional[OSError] = None
+    for info in infos:
+        try:
+            return socket.create_connection((info[4][0], port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follow a redirect only to a URL :func:`check_url` accepts."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def download(url: str) -> bytes:
+    """Fetch ``url``; raises :class:`RefusedURL` for unsupported or
+    non-public URLs (also as redirect targets), ``ValueError`` for oversized
+    bodies or non-image responses, ``OSError`` for network errors."""
+    check_url(url)
+    limit = current_app.config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+    request = urllib.request.Request(url, headers={'User-Agent': 'librarymanager'})
+    handlers = [_CheckedRedirectHandler]
+    if not current_app.config.get('IMAGE_FETCH_ALLOW_PRIVATE'):
+        handlers += [urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler]
+    opener = urllib.request.build_opener(*handlers)
+    with opener.open(request, timeout=current_app.config.get('IMAGE_FETCH_TIMEOUT', 10)) as resp:
+        content_type = resp.headers.get_content_type()
+        if not content_type.startswith('image/'):
+            raise ValueError(f'{url} is not an image ({content_type})')
+        data = resp.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f'{url} is larger than {limit} bytes')
+    try:
+        check_image(data)
+    except ValueError as e:
+        raise ValueError(f'{url}: {e}') from e
+    return data
+
+
+@task('fetch_image', max_attempts=5)
+def fetch_image(item_id: int, url: str) -> None:
+    item = db.session.get(Item, item_id)
+    if item is None or item.image_url != url:
+        return  # deleted or changed since; a newer job handles the new URL
+    if item.image_digest is not None:
+        # setting image_url clears the digest, so it was set since by an
+        # upload or attach-image, which wins over the URL
+        return
+    item.image_digest = store_image(download(url))
+
+
+def queue_fetches(items: Iterable[Tuple[int, str]], session=None) -> None:
+    """Queue ``fetch_image`` for ``(item id, image_url)`` pairs."""
+    enqueue_many('fetch_image', [{'item_id': i, 'url': url} for i, url in items if url], session=session)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _image_url_changes(session, flush_context, instances):
+    pending: List[Item] = session.info.setdefault(_PENDING_KEY, [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Item) and inspect(obj).attrs.image_url.history.has_changes():
+            obj.image_digest = None
+            if obj.image_url:
+                pending.append(obj)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _queue_image_fetches(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        queue_fetches(((obj.id, obj.image_url) for obj in pending if obj not in session.deleted), session=session)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
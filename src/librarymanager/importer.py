@@ -0,0 +1,232 @@
+"""Bulk catalog import.
+
+Records (dicts using the same keys as ``POST /api/items``) are inserted in
+chunks with Core ``INSERT`` statements executed executemany-style, so the
+ORM unit of work, per-object flushes and per-name lookups are skipped:
+
+1. one multi-row ``INSERT ... RETURNING id`` into ``item`` per chunk,
+2. one executemany ``INSERT`` per subtype table present in the chunk,
+3. one set-based lookup/insert for all author and genre names of the chunk
+   (:mod:`librarymanager.resolver`),
+4. one executemany ``INSERT`` per association table,
+
+followed by a single commit per chunk.
+"""
+import csv
+import io
+import json
+import time
+from collections import Counter
+from datetime import date
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import Date, Integer, insert
+
+from .changes import record_change
+from .counters import bump_counts
+from .extensions import db
+from .images import queue_fetches
+from .models import Author, BoardGame, Book, CD, DVD, Genre, Item, item_author, item_genre
+from .resolver import resolve_names
+
+# request type names (including aliases) -> mapped class
+ITEM_TYPES = {
+    'book': Book,
+    'cd': CD,
+    'dvd': DVD,
+    'board_game': BoardGame,
+    'boardgame': BoardGame,
+    'game': BoardGame,
+}
+
+# payload keys that differ from the column they populate
+FIELD_ALIASES = {
+    CD: {'artist': 'primary_artist'},
+    BoardGame: {'author': 'author_note'},
+}
+
+IMPORT_FORMATS = ('json', 'ndjson', 'csv')
+
+# separator for multi-valued CSV cells (authors, genres, track_list)
+CSV_LIST_SEPARATOR = ';'
+
+# keep error reports bounded on very dirty inputs
+MAX_REPORTED_ERRORS = 100
+
+
+def _coerce(column, value: Any) -> Any:
+    """Convert loosely typed input (CSV cells, form values) for ``column``."""
+    if value == '':
+        return None
+    if isinstance(column.type, Integer) and isinstance(value, str):
+        return int(value)
+    if isinstance(column.type, Date) and isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def item_values(data: Dict[str, Any]) -> Tuple[type, Dict[str, Any], Dict[str, Any]]:
+    """Split an item payload into ``(class, item columns, subtype columns)``.
+
+    Raises ``ValueError`` for unknown types or values that cannot be
+    converted to the column type.
+    """
+    typ = (data.get('type') or 'book').lower()
+    cls = ITEM_TYPES.get(typ)
+    if cls is None:
+        raise ValueError('unknown type')
+    aliases = FIELD_ALIASES.get(cls, {})
+    base_table = Item.__table__
+    sub_table = cls.__table__
+
+    # every column is present (None when missing) so rows of one type share
+    # the same keys, as executemany requires
+    base = {'type': cls.__mapper__.polymorphic_identity}
+    for col in base_table.columns:
+        if col.key not in ('id', 'type', 'version', 'image_digest'):
+            base[col.key] = _coerce(col, data.get(col.key))
+    base['title'] = base['title'] or 'Untitled'
+
+    sub = {}
+    for col in sub_table.columns:
+        if col.key == 'id':
+            continue
+        value = data.get(col.key)
+        if value is None:
+            value = next((data.get(k) for k, target in aliases.items() if target == col.key and data.get(k) is not None), None)
+        sub[col.key] = _coerce(col, value)
+        if sub[col.key] is None and not col.nullable:
+            raise ValueError(f'{col.key} is required')
+    return cls, base, sub
+
+
+def _names(value: Any) -> List[str]:
+    """Normalize an authors/genres value (list or separated string)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(CSV_LIST_SEPARATOR)
+    return [n.strip() for n in value if n and n.strip()]
+
+
+def _insert_chunk(records: List[Dict[str, Any]], offset: int, errors: List[str]) -> int:
+    """Insert one chunk of records; returns the number of items inserted."""
+    prepared = []
+    for pos, data in enumerate(records, start=offset):
+        try:
+            cls, base, sub = item_values(data)
+            prepared.append((cls, base, sub, _names(data.get('authors')), _names(data.get('genres'))))
+        except (ValueError, TypeError, AttributeError) as e:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f'record {pos}: {e}')
+    if not prepared:
+        return 0
+
+    # item rows; RETURNING with sort_by_parameter_order keeps ids aligned
+    # with the input order even when SQLAlchemy batches the VALUES lists
+    stmt = insert(Item.__table__).returning(Item.__table__.c.id, sort_by_parameter_order=True)
+    ids = db.session.execute(stmt, [p[1] for p in prepared]).scalars().all()
+
+    # Core inserts bypass the mapper events that maintain the type counters
+    bump_counts(db.session.connection(), Counter(p[1]['type'] for p in prepared))
+
+    by_table: Dict[Any, List[Dict[str, Any]]] = {}
+    for item_id, (cls, base, sub, _, _) in zip(ids, prepared):
+        by_table.setdefault(cls.__table__, []).append(dict(sub, id=item_id))
+        record_change(db.session, item_id, base['type'], 'insert')
+    for table, rows in by_table.items():
+        db.session.execute(insert(table), rows)
+    queue_fetches((item_id, p[1]['image_url']) for item_id, p in zip(ids, prepared))
+
+    author_ids = resolve_names(Author, (n for p in prepared for n in p[3]))
+    genre_ids = resolve_names(Genre, (n for p in prepared for n in p[4]))
+    # dict.fromkeys drops duplicate names within one record
+    links_a = [{'item_id': i, 'author_id': author_ids[n]} for i, p in zip(ids, prepared) for n in dict.fromkeys(p[3])]
+    links_g = [{'item_id': i, 'genre_id': genre_ids[n]} for i, p in zip(ids, prepared) for n in dict.fromkeys(p[4])]
+    if links_a:
+        db.session.execute(insert(item_author), links_a)
+    if links_g:
+        db.session.execute(insert(item_genre), links_g)
+    return len(ids)
+
+
+def import_records(records: Iterable[Dict[str, Any]], chunk_size: int = 1000,
+                   progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Import ``records`` in chunks of ``chunk_size``, committing each chunk.
+
+    Invalid records are skipped and reported under ``errors``. ``progress``
+    is called with the running stats after every committed chunk.
+    Returns ``{'imported', 'errors', 'elapsed_seconds', 'items_per_second'}``.
+    """
+    chunk_size = max(1, int(chunk_size))
+    stats: Dict[str, Any] = {'imported': 0, 'errors': [], 'elapsed_seconds': 0.0, 'items_per_second': 0.0}
+    start = time.perf_counter()
+    it = iter(records)
+    offset = 0
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        try:
+            stats['imported'] += _insert_chunk(chunk, offset, stats['errors'])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        offset += len(chunk)
+        _update_rate(stats, start)
+        if progress:
+            progress(stats)
+    _update_rate(stats, start)
+    return stats
+
+
+def _update_rate(stats: Dict[str, Any], start: float) -> None:
+    elapsed = time.perf_counter() - start
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['items_per_second'] = round(stats['imported'] / elapsed, 1) if elapsed > 0 else 0.0
+
+
+def parse_records(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yield item payloads from a text stream in ``json``/``ndjson``/``csv``.
+
+    JSON accepts a list or ``{"items": [...]}``; NDJSON and CSV are read
+    incrementally. CSV multi-valued cells use ``CSV_LIST_SEPARATOR``.
+    """
+    if fmt == 'json':
+        data = json.load(stream)
+        if isinstance(data, dict):
+            data = data.get('items', [])
+        if not isinstance(data, list):
+            raise ValueError('expected a JSON list of items')
+        yield from data
+    elif fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == 'csv':
+        for row in csv.DictReader(stream):
+            if row.get('track_list'):
+                row['track_list'] = _names(row['track_list'])
+            yield row
+    else:
+        raise ValueError(f'unsupported format {fmt!r}')
+
+
+def detect_format(name: str | None, default: str = 'json') -> str:
+    """Guess the import format from a file name or content type."""
+    name = (name or '').lower()
+    if 'ndjson' in name or name.endswith('.jsonl') or 'jsonlines' in name:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in name:
+        return 'csv'
+    if name.endswith('.json') or 'json' in name:
+        return 'json'
+    return default
+
+
+def text_stream(binary) -> TextIO:
+    """Wrap a binary stream (request body, stdin buffer) for ``parse_records``."""
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
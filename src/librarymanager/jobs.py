@@ -0,0 +1,233 @@
+"""Persistent background jobs.
+
+Slow work triggered by a write -- fetching the image behind an item's
+``image_url``, see ``librarymanager.images`` -- is queued as a row of the
+``job`` table instead of running inside the request. :func:`enqueue` adds
+the row to the caller's transaction, so a job exists exactly when the write
+that needs it commits, and the request returns without waiting for it.
+
+``flask worker`` runs a :class:`Worker`. It claims the oldest due job with
+one ``UPDATE ... RETURNING`` (several workers never get the same job;
+SQLite serializes the writers), runs the registered task in an app context
+and marks the job ``done`` in the same transaction as the task's own
+changes. A task that raises is rolled back and retried after an
+exponential backoff (``JOBS_BACKOFF_SECONDS * 2 ** (attempt - 1)``, capped
+at ``JOBS_BACKOFF_MAX_SECONDS``, +/-20% jitter) until its ``max_attempts``
+are used up; then it stays ``failed`` with its last error. A task that
+raises :class:`PermanentError` fails at once: retrying cannot help. Jobs left
+``running`` by a worker that died are claimed again once
+``JOBS_LEASE_SECONDS`` have passed.
+
+Every job row keeps its queue/start/finish times, attempts and last error.
+:func:`job_stats` aggregates them per task and status for ``flask jobs``
+and ``/debug/metrics``. Finished jobs older than ``JOBS_KEEP_SECONDS`` are
+pruned by idle workers.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from flask import Flask, current_app
+from sqlalchemy import and_, case, delete, func, insert, or_, select, update
+
+from .extensions import db
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# longest error text kept on a job row
+MAX_ERROR_LENGTH = 2000
+
+
+class PermanentError(Exception):
+    """Raised by a task to fail its job without retrying it."""
+
+
+class Task(NamedTuple):
+    func: Callable[..., Any]
+    max_attempts: int
+
+
+#: task name -> Task; filled by the :func:`task` decorator
+TASKS: Dict[str, Task] = {}
+
+
+def task(name: str, max_attempts: int = 3):
+    """Register the decorated function as task ``name``.
+
+    It is called with the job payload as keyword arguments inside an app
+    context; its session changes are committed together with the job's
+    ``done`` status.
+    """
+    def decorator(func):
+        TASKS[name] = Task(func, max_attempts)
+        return func
+    return decorator
+
+
+def _job_row(name: str, payload: Optional[Dict[str, Any]], delay: float, now: float) -> Dict[str, Any]:
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name!r}')
+    return {'task': name, 'payload': payload or {}, 'status': 'queued', 'attempts': 0,
+            'max_attempts': TASKS[name].max_attempts, 'created_at': now, 'run_at': now + delay}
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None, delay: float = 0, session=None) -> Job:
+    """Queue task ``name``; the job is visible to workers once the
+    session's transaction commits."""
+    job = Job(**_job_row(name, payload, delay, time.time()))
+    (session or db.session).add(job)
+    return job
+
+
+def enqueue_many(name: str, payloads: List[Dict[str, Any]], session=None) -> None:
+    """Queue one job per payload with a single ``INSERT``.
+
+    Safe to call from flush events (no ORM objects are added).
+    """
+    if payloads:
+        now = time.time()
+        (session or db.session).execute(insert(Job.__table__), [_job_row(name, p, 0, now) for p in payloads])
+
+
+def backoff(attempts: int, base: float, cap: float) -> float:
+    """Seconds to wait before retrying after ``attempts`` failed attempts."""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+class Worker:
+    """Claims and runs due jobs of ``app``; see the module docstring."""
+
+    def __init__(self, app: Flask, name: Optional[str] = None):
+        self.app = app
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self._last_prune = 0.0
+
+    def claim(self) -> Optional[Any]:
+        """Mark the oldest due job ``running`` and return it (``None`` if
+        nothing is due)."""
+        now = time.time()
+        lease = current_app.config.get('JOBS_LEASE_SECONDS', 300)
+        due = select(Job.id).where(or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.started_at < now - lease),
+        )).order_by(Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        stmt = update(Job.__table__).where(Job.id == due).values(
+            status='running', attempts=Job.attempts + 1, started_at=now, locked_by=self.name,
+        ).returning(Job.id, Job.task, Job.payload, Job.attempts, Job.max_attempts, Job.created_at)
+        row = db.session.execute(stmt).first()
+        db.session.commit()
+        return row
+
+    def run_job(self, job) -> bool:
+        """Run a claimed job and record the outcome; returns success."""
+        started = time.perf_counter()
+        config = current_app.config
+        try:
+            spec = TASKS.get(job.task)
+            if spec is None:
+                raise LookupError(f'Unknown task {job.task!r}')
+            if job.attempts > job.max_attempts:
+                # claimed again after its worker died on the last attempt
+                raise RuntimeError('lease expired on the last attempt')
+            spec.func(**job.payload)
+            db.session.execute(update(Job.__table__).where(Job.id == job.id).values(
+                status='done', finished_at=time.time(), last_error=None, locked_by=None))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'[:MAX_ERROR_LENGTH]
+            retry = job.attempts < job.max_attempts and not isinstance(e, (LookupError, PermanentError))
+            values = {'last_error': error, 'locked_by': None}
+            if retry:
+                delay = backoff(job.attempts, config.get('JOBS_BACKOFF_SECONDS', 5), config.get('JOBS_BACKOFF_MAX_SECONDS', 3600))
+                values.update(status='queued', run_at=time.time() + delay)
+            else:
+                values.update(status='failed', finished_at=time.time())
+            db.session.execute(update(Job.__table__).where(Job.id == job.id).values(**values))
+            db.session.commit()
+            logger.warning('job %d %s attempt %d/%d failed%s: %s', job.id, job.task, job.attempts, job.max_attempts,
+                           f', retrying in {delay:.1f}s' if retry else '', error)
+            return False
+        logger.info('job %d %s done in %.1f ms (attempt %d, %.1f s after it was queued)', job.id, job.task,
+                    (time.perf_counter() - started) * 1000, job.attempts, max(0.0, time.time() - job.created_at))
+        return True
+
+    def prune(self) -> int:
+        """Delete finished jobs older than ``JOBS_KEEP_SECONDS``."""
+        keep = current_app.config.get('JOBS_KEEP_SECONDS', 7 * 24 * 3600)
+        result = db.session.execute(delete(Job.__table__).where(
+            Job.status.in_(('done', 'failed')), Job.finished_at < time.time() - keep))
+        db.session.commit()
+        return result.rowcount
+
+    def run(self, burst: bool = False, max_jobs: Optional[int] = None) -> int:
+        """Process jobs until stopped; with ``burst`` return as soon as no
+        job is due. Returns the number of jobs run."""
+        processed = 0
+        with self.app.app_context():
+            poll = current_app.config.get('JOBS_POLL_SECONDS', 1.0)
+            while not self.stopping and (max_jobs is None or processed < max_jobs):
+                job = self.claim()
+                if job is None:
+                    if burst:
+                        break
+                    if time.time() - self._last_prune > 60:
+                        self.prune()
+                        self._last_prune = time.time()
+                    time.sleep(poll)
+                    continue
+                self.run_job(job)
+                processed += 1
+                db.session.remove()
+        return processed
+
+    def install_signal_handlers(self) -> Callable[[], None]:
+        """Finish the current job, then exit, on SIGTERM/SIGINT. Returns a
+        function restoring the previous handlers."""
+        def stop(signum, frame):
+            self.stopping = True
+        previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+        def restore():
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        return restore
+
+
+def job_stats(session=None) -> List[Dict[str, Any]]:
+    """Per ``(task, status)``: job count, and total run/queue time of the
+    finished ones."""
+    session = session or db.session
+    finished = Job.finished_at.isnot(None)
+    rows = session.execute(select(
+        Job.task, Job.status, func.count(),
+        func.sum(case((finished, Job.finished_at - Job.started_at), else_=0)),
+        func.sum(case((finished, Job.started_at - Job.created_at), else_=0)),
+        func.sum(Job.attempts),
+    ).group_by(Job.task, Job.status).order_by(Job.task, Job.status))
+    return [{'task': t, 'status': s, 'count': n, 'run_seconds': run or 0.0, 'wait_seconds': wait or 0.0,
+             'attempts': attempts or 0} for t, s, n, run, wait, attempts in rows]
+
+
+def render_job_metrics(session=None) -> str:
+    """:func:`job_stats` in the Prometheus text format."""
+    stats = job_stats(session)
+    series = (
+        ('librarymanager_jobs', 'gauge', 'Jobs per task and status.', 'count'),
+        ('librarymanager_job_attempts', 'gauge', 'Attempts made by the jobs per task and status.', 'attempts'),
+        ('librarymanager_job_run_seconds', 'gauge', 'Total run time of the last attempt of finished jobs.', 'run_seconds'),
+        ('librarymanager_job_wait_seconds', 'gauge', 'Total time finished jobs were queued before their last attempt.', 'wait_seconds'),
+    )
+    lines = []
+    for name, kind, help_text, field in series:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for s in stats:
+            lines.append(f'{name}{{task="{s["task"]}",status="{s["status"]}"}} {s[field]!r}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,89 @@
+"""Per-endpoint loading strategies for the polymorphic ``Item`` hierarchy.
+
+``Item`` uses joined-table inheritance, so by default an ``Item.query`` row
+only carries the ``item`` columns; touching e.g. ``book.language`` then
+issues one SELECT against the subtype table per instance. The helpers here
+let each view pick a strategy that loads a mixed-type page in a fixed
+number of queries:
+
+``joined``
+    One ``LEFT OUTER JOIN`` across all subtype tables
+    (``with_polymorphic('*')``). Best for single rows and small pages.
+``selectin``
+    One extra ``SELECT ... WHERE id IN (...)`` per subtype present in the
+    result (``selectin_polymorphic``). Best for large pages: the base query
+    stays narrow and each subtype is fetched in bulk.
+``lazy``
+    SQLAlchemy's default; only suitable when the view never touches
+    subtype attributes.
+
+The mode is looked up in ``POLYMORPHIC_LOADING`` (endpoint -> mode) and
+falls back to ``POLYMORPHIC_LOADING_DEFAULT``.
+"""
+from typing import Sequence
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import func
+from sqlalchemy.orm import selectin_polymorphic, selectinload, with_polymorphic
+
+from .extensions import db
+from .models import Item, Book, CD, DVD, BoardGame
+
+POLYMORPHIC_MODES = ('joined', 'selectin', 'lazy')
+ITEM_SUBCLASSES = (Book, CD, DVD, BoardGame)
+
+
+def polymorphic_mode(endpoint: str | None = None) -> str:
+    """Return the configured loading mode for ``endpoint``.
+
+    ``endpoint`` defaults to the endpoint of the current request.
+    """
+    if endpoint is None and has_request_context():
+        endpoint = request.endpoint
+    per_endpoint = current_app.config.get('POLYMORPHIC_LOADING') or {}
+    mode = per_endpoint.get(endpoint) or current_app.config.get('POLYMORPHIC_LOADING_DEFAULT', 'selectin')
+    if mode not in POLYMORPHIC_MODES:
+        raise ValueError(f'Unknown polymorphic loading mode {mode!r} for {endpoint!r}')
+    return mode
+
+
+def item_query(endpoint: str | None = None, relations: bool = True, mode: str | None = None, session=None):
+    """Return an ``Item`` query that loads subtype columns per ``mode``.
+
+    When ``relations`` is true, authors and genres are loaded in bulk with
+    ``selectinload`` as well. Filters and ordering can keep using the plain
+    ``Item`` columns: the polymorphic selectable is not aliased. ``session``
+    defaults to ``db.session``.
+    """
+    mode = mode or polymorphic_mode(endpoint)
+    if mode == 'joined':
+        entity = with_polymorphic(Item, '*')
+        query = (session or db.session).query(entity)
+    else:
+        entity = Item
+        query = Item.query if session is None else session.query(Item)
+        if mode == 'selectin':
+            query = query.options(selectin_polymorphic(Item, ITEM_SUBCLASSES))
+    if relations:
+        query = query.options(selectinload(entity.authors), selectinload(entity.genres))
+    return query
+
+
+def field_column(name: str, types: Sequence[str] | None = None):
+    """Return ``(expression, subtype_tables)`` for the item field ``name``.
+
+    Names are looked up on the ``item`` table first, then on the subtype
+    tables (only those of ``types`` when given); a name several subtypes
+    define (``genre``, ``publisher``, ...) becomes ``COALESCE`` of their
+    columns. ``subtype_tables`` must be outer-joined on ``id`` to select it.
+    Raises ``ValueError`` for unknown names.
+    """
+    base = Item.__table__
+    if name in base.c:
+        return base.c[name], []
+    sources = [cls.__table__.c[name] for cls in ITEM_SUBCLASSES
+               if name in cls.__table__.c and (types is None or cls.__mapper__.polymorphic_identity in types)]
+    if not sources:
+        raise ValueError(f'Unknown item field {name!r}')
+    expr = sources[0] if len(sources) == 1 else func.coalesce(*sources)
+    return expr, [col.table for col in sources]
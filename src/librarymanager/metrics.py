@@ -0,0 +1,231 @@
+"""Per-endpoint request instrumentation.
+
+For every request the app records, keyed by endpoint:
+
+- total latency (``before_request`` to ``teardown_request``, so streamed
+  bodies are included),
+- the number of SQL statements and the time spent executing them (engine
+  ``before/after_cursor_execute`` events, registered on the ``Engine`` class
+  so every bind is covered),
+- the time spent rendering Jinja templates (Flask's
+  ``before_render_template``/``template_rendered`` signals).
+
+Each value feeds a histogram with fixed buckets. Render times are also kept
+per template (``librarymanager_template_render_duration_seconds`` with a
+``template`` label), so a slow page can be traced to the template and not
+just the endpoint; templates pulled in with ``extends``/``include`` count
+towards the template passed to ``render_template``. :meth:`Metrics.render`
+produces the Prometheus text format served by ``/debug/metrics``. Requests
+slower than ``SLOW_REQUEST_MS`` are logged with their SQL and render cost.
+
+Configuration: ``METRICS_ENABLED`` (collect and expose ``/debug/metrics``)
+and ``SLOW_REQUEST_MS`` (0 disables the slow log). With both off nothing is
+installed. Histograms live in process memory, so each worker reports its
+own.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# upper bounds of the histogram buckets (+Inf is implicit)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name -> (help text, buckets, per-request field)
+HISTOGRAMS: Dict[str, Tuple[str, Sequence[float], str]] = {
+    'librarymanager_request_duration_seconds': ('Request latency.', SECONDS_BUCKETS, 'duration'),
+    'librarymanager_request_sql_statements': ('SQL statements executed per request.', COUNT_BUCKETS, 'sql_count'),
+    'librarymanager_request_sql_duration_seconds': ('Time spent executing SQL per request.', SECONDS_BUCKETS, 'sql_time'),
+    'librarymanager_request_render_duration_seconds': ('Time spent rendering templates per request.', SECONDS_BUCKETS, 'render_time'),
+}
+
+# per-template histogram, labelled by template name instead of endpoint
+TEMPLATE_HISTOGRAM = 'librarymanager_template_render_duration_seconds'
+TEMPLATE_HISTOGRAM_HELP = 'Time spent rendering each template.'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """``(le, cumulative count)`` pairs including ``+Inf``."""
+        total = 0
+        out = []
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append(('+Inf' if bound == float('inf') else repr(float(bound)), total))
+        return out
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Histograms per ``(metric name, endpoint)`` and per template."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._templates: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, values: Dict[str, float]) -> None:
+        with self._lock:
+            for name, (_, buckets, field) in HISTOGRAMS.items():
+                hist = self._histograms.get((name, endpoint))
+                if hist is None:
+                    hist = self._histograms[(name, endpoint)] = Histogram(buckets)
+                hist.observe(values[field])
+
+    def observe_template(self, template: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._templates.get(template)
+            if hist is None:
+                hist = self._templates[template] = Histogram(SECONDS_BUCKETS)
+            hist.observe(seconds)
+
+    def histogram(self, name: str, endpoint: str) -> Optional[Histogram]:
+        return self._histograms.get((name, endpoint))
+
+    def template_histogram(self, template: str) -> Optional[Histogram]:
+        return self._templates.get(template)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._templates.clear()
+
+    def render(self) -> str:
+        """Return every histogram in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (help_text, _, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (hist_name, endpoint), hist in sorted(self._histograms.items()):
+                    if hist_name != name:
+                        continue
+                    self._render_histogram(lines, name, f'endpoint="{_escape(endpoint)}"', hist)
+            lines.append(f'# HELP {TEMPLATE_HISTOGRAM} {TEMPLATE_HISTOGRAM_HELP}')
+            lines.append(f'# TYPE {TEMPLATE_HISTOGRAM} histogram')
+            for template, hist in sorted(self._templates.items()):
+                self._render_histogram(lines, TEMPLATE_HISTOGRAM, f'template="{_escape(template)}"', hist)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines: List[str], name: str, label: str, hist: Histogram) -> None:
+        for le, count in hist.cumulative():
+            lines.append(f'{name}_bucket{{{label},le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{{label}}} {hist.sum!r}')
+        lines.append(f'{name}_count{{{label}}} {hist.count}')
+
+
+def _stats() -> Optional[Dict[str, float]]:
+    """The current request's counters, if it is being measured."""
+    if not has_request_context():
+        return None
+    return g.get('_request_metrics')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, which ends with the statement even when
+    # it fails
+    if _stats() is not None and context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _statement_done(context) -> None:
+    stats = _stats()
+    start = getattr(context, '_metrics_start', None)
+    if stats is None or start is None:
+        return
+    context._metrics_start = None
+    stats['sql_time'] += time.perf_counter() - start
+    stats['sql_count'] += 1
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _statement_done(context)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _statement_failed(exception_context):
+    # a failing statement never reaches after_cursor_execute
+    _statement_done(exception_context.execution_context)
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        g.setdefault('_render_starts', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stats = _stats()
+    starts = g.get('_render_starts')
+    if stats is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats['render_time'] += elapsed
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.observe_template(template.name or '<string>', elapsed)
+
+
+def _start_request():
+    g._request_metrics = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0, 'render_time': 0.0}
+
+
+def _finish_request(exc):
+    stats = g.pop('_request_metrics', None)
+    if stats is None:
+        return
+    stats['duration'] = time.perf_counter() - stats['start']
+    endpoint = request.endpoint or 'unmatched'
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.observe(endpoint, stats)
+    slow_ms = current_app.config.get('SLOW_REQUEST_MS', 0)
+    if slow_ms and stats['duration'] * 1000 >= slow_ms:
+        current_app.logger.warning(
+            'slow request %s %s (%s): %.1f ms, %d SQL statements in %.1f ms, %.1f ms rendering',
+            request.method, request.full_path.rstrip('?'), endpoint, stats['duration'] * 1000,
+            stats['sql_count'], stats['sql_time'] * 1000, stats['render_time'] * 1000)
+
+
+def init_app(app: Flask) -> None:
+    """Install the request hooks if metrics or the slow log are enabled."""
+    enabled = app.config.get('METRICS_ENABLED', False)
+    app.extensions['metrics'] = Metrics() if enabled else None
+    if not enabled and not app.config.get('SLOW_REQUEST_MS', 0):
+        return
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+
+def get_metrics() -> Optional[Metrics]:
+    return current_app.extensions.get('metrics')
@@ -19,6 +19,11 @@ class Item(db.Model):
     # optional links
     external_url = db.Column(db.String(512), nullable=True)
     image_url = db.Column(db.String(512), nullable=True)
+    # sha256 of the local copy of image_url, set by the fetch_image job
+    # (see images.py); None until fetched
+    image_digest = db.Column(db.String(64), nullable=True)
+    # catalog version of the last change to this item (see versioning.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # relationships: authors and genres (many-to-many)
     authors = db.relationship('Author', secondary='item_author', backref='items')
@@ -29,18 +34,31 @@ class Item(db.Model):
         'polymorphic_on': type
     }
 
+    # keyset pagination: per-type listings filter on type and order by id or
+    # (title, id); the API lists all types ordered by (title, id) and the
+    # change feed by (version, id)
+    __table_args__ = (
+        db.Index('ix_item_type_id', 'type', 'id'),
+        db.Index('ix_item_type_title_id', 'type', 'title', 'id'),
+        db.Index('ix_item_title_id', 'title', 'id'),
+        db.Index('ix_item_version_id', 'version', 'id'),
+    )
+
 
 # Association tables for many-to-many relationships
 item_author = db.Table(
     'item_author',
     db.Column('item_id', db.Integer, db.ForeignKey('item.id'), primary_key=True),
     db.Column('author_id', db.Integer, db.ForeignKey('author.id'), primary_key=True),
+    # reverse lookups (items of an author); the primary key covers item_id
+    db.Index('ix_item_author_author_id', 'author_id', 'item_id'),
 )
 
 item_genre = db.Table(
     'item_genre',
     db.Column('item_id', db.Integer, db.ForeignKey('item.id'), primary_key=True),
     db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+    db.Index('ix_item_genre_genre_id', 'genre_id', 'item_id'),
 )
 
 
@@ -111,3 +129,105 @@ class BoardGame(Item):
     __mapper_args__ = {
         'polymorphic_identity': 'board_game',
     }
+
+
+class ItemTypeCount(db.Model):
+    """Number of items per polymorphic type, kept current by
+    ``librarymanager.counters`` so listings never need ``COUNT(*)``."""
+    __tablename__ = 'item_type_count'
+    type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ItemSummary(db.Model):
+    """What the home page and the listings show of an item, one narrow row
+    per item kept current by ``librarymanager.summaries``."""
+    __tablename__ = 'item_summary'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    type = db.Column(db.String(50))
+    title = db.Column(db.String(200), nullable=False)
+    author = db.Column(db.String(120), nullable=True)  # first author by name
+    artist = db.Column(db.String(120), nullable=True)  # CD primary artist
+    director = db.Column(db.String(120), nullable=True)
+    min_players = db.Column(db.Integer, nullable=True)
+    max_players = db.Column(db.Integer, nullable=True)
+
+    # the same orderings as the item table's listing indexes
+    __table_args__ = (
+        db.Index('ix_item_summary_type_id', 'type', 'id'),
+        db.Index('ix_item_summary_type_title_id', 'type', 'title', 'id'),
+    )
+
+
+class ItemFacet(db.Model):
+    """One facet value of an item (a genre, an author, the language of a
+    book or a player count of a board game); see ``librarymanager.facets``."""
+    __tablename__ = 'item_facet'
+    item_id = db.Column(db.Integer, primary_key=True)
+    facet = db.Column(db.String(16), primary_key=True)
+    value = db.Column(db.String(120), primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        # filters: facet = ? AND value = ? [AND type = ?], item ids in order
+        db.Index('ix_item_facet_value_type_item', 'facet', 'value', 'type', 'item_id'),
+    )
+
+
+class FacetCount(db.Model):
+    """Number of items per type and facet value, kept current by
+    ``librarymanager.facets``; ``type`` ``'*'`` counts all types."""
+    __tablename__ = 'facet_count'
+    type = db.Column(db.String(50), primary_key=True)
+    facet = db.Column(db.String(16), primary_key=True)
+    value = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# the most frequent values of a facet: type = ? AND facet = ? ORDER BY count DESC, value
+db.Index('ix_facet_count_rank', FacetCount.type, FacetCount.facet, FacetCount.count.desc(), FacetCount.value)
+
+
+class CatalogVersion(db.Model):
+    """Single-row change counter bumped by every commit that touches items."""
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ItemTombstone(db.Model):
+    """Record of a deleted item so the change feed can report the delete."""
+    __tablename__ = 'item_tombstone'
+    id = db.Column(db.Integer, primary_key=True)  # id of the deleted item
+    type = db.Column(db.String(50))
+    version = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_item_tombstone_version_id', 'version', 'id'),
+    )
+
+
+class Job(db.Model):
+    """Queued background work, run by ``flask worker`` (see jobs.py).
+
+    Times are Unix timestamps.
+    """
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # 'queued', 'running', 'done' or 'failed'
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    created_at = db.Column(db.Float, nullable=False)
+    run_at = db.Column(db.Float, nullable=False)  # not before this time
+    started_at = db.Column(db.Float, nullable=True)  # of the latest attempt
+    finished_at = db.Column(db.Float, nullable=True)
+    locked_by = db.Column(db.String(128), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        # workers claim the oldest due job: status = ? AND run_at <= ?
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
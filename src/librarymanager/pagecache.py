@@ -0,0 +1,244 @@
+"""Opt-in cache of rendered HTML pages with tag-based invalidation.
+
+Views decorated with :func:`cached_page` store their rendered body under a
+key built from the request path and query string. Each entry is tagged
+(``item:<id>``, ``type:<type>``, ``index``) and remembers the version every
+tag had when the page was rendered. Invalidating a tag is a single version
+bump; entries whose recorded versions no longer match are treated as
+misses. This keeps invalidation O(number of tags) no matter how many pages
+are cached, and works across processes with the filesystem backend.
+
+Invalidation is driven by :data:`librarymanager.changes.items_committed`,
+so every committed write -- forms, JSON API, bulk import -- evicts exactly
+the detail page of the touched items plus the listings they appear on.
+
+Responses carry ``ETag``/``Last-Modified`` and answer conditional requests
+with ``304 Not Modified``.
+
+Configuration: ``PAGE_CACHE_TYPE`` (``None``, ``'memory'`` or
+``'filesystem'``), ``PAGE_CACHE_DIR``, ``PAGE_CACHE_MAX_ENTRIES`` and
+``PAGE_CACHE_TIMEOUT`` (seconds, 0 for no expiry).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask import Flask, Response, current_app, request
+
+from .changes import items_committed
+
+Entry = Dict[str, Any]
+
+
+class MemoryBackend:
+    """Per-process LRU of entries plus in-memory tag versions."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Entry]' = OrderedDict()
+        self._tags: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {t: self._tags.get(t, 0) for t in tags}
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for t in tags:
+                self._tags[t] = self._tags.get(t, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class FileSystemBackend:
+    """Entries and tag versions stored as files, shared by all workers.
+
+    Each entry is one file: a JSON header line followed by the body. Files
+    are written to a temporary name and renamed into place, so readers never
+    see partial writes. Tag versions are nanosecond timestamps rather than
+    counters, which avoids a read-modify-write race between processes.
+    Every ``PRUNE_EVERY`` writes the oldest entries beyond ``max_entries``
+    are removed.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory: str, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries_dir = os.path.join(directory, 'entries')
+        self.tags_dir = os.path.join(directory, 'tags')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.tags_dir, exist_ok=True)
+        self._writes = 0
+
+    @staticmethod
+    def _name(value: str) -> str:
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def _write(self, path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[Entry]:
+        try:
+            with open(os.path.join(self.entries_dir, self._name(key)), 'rb') as f:
+                header = json.loads(f.readline())
+                header['body'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return header
+
+    def set(self, key: str, entry: Entry) -> None:
+        header = {k: v for k, v in entry.items() if k != 'body'}
+        self._write(os.path.join(self.entries_dir, self._name(key)), json.dumps(header).encode() + b'\n' + entry['body'])
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete the least recently written entries above ``max_entries``."""
+        paths = [os.path.join(self.entries_dir, n) for n in os.listdir(self.entries_dir)]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=lambda p: os.stat(p).st_mtime)
+        for p in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        versions = {}
+        for t in tags:
+            try:
+                with open(os.path.join(self.tags_dir, self._name(t))) as f:
+                    versions[t] = int(f.read() or 0)
+            except (OSError, ValueError):
+                versions[t] = 0
+        return versions
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        for t in tags:
+            self._write(os.path.join(self.tags_dir, self._name(t)), str(time.time_ns()).encode())
+
+    def clear(self) -> None:
+        for d in (self.entries_dir, self.tags_dir):
+            for n in os.listdir(d):
+                try:
+                    os.remove(os.path.join(d, n))
+                except OSError:
+                    pass
+
+
+def init_app(app: Flask) -> None:
+    """Create the configured backend (if any) and store it on the app."""
+    kind = app.config.get('PAGE_CACHE_TYPE')
+    max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 1000)
+    if not kind:
+        backend = None
+    elif kind == 'memory':
+        backend = MemoryBackend(max_entries)
+    elif kind == 'filesystem':
+        directory = app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache')
+        backend = FileSystemBackend(directory, max_entries)
+    else:
+        raise ValueError(f'Unknown PAGE_CACHE_TYPE {kind!r}')
+    app.extensions['page_cache'] = backend
+
+
+def get_backend():
+    return current_app.extensions.get('page_cache')
+
+
+def tags_for_item(item_id: int, item_type: str) -> List[str]:
+    """Tags of every page that shows ``item_id`` (its detail and listings)."""
+    return [f'item:{item_id}', f'type:{item_type}', 'index']
+
+
+@items_committed.connect
+def _invalidate(sender, changes, **kw):
+    backend = sender.extensions.get('page_cache') if sender is not None else None
+    if backend is None:
+        return
+    tags = set()
+    for item_id, (item_type, op) in changes.items():
+        tags.update(tags_for_item(item_id, item_type))
+    backend.bump_tags(tags)
+
+
+def _cache_key() -> str:
+    args = sorted(request.args.items(multi=True))
+    return request.path + '?' + '&'.join(f'{k}={v}' for k, v in args)
+
+
+def _response(entry: Entry) -> Response:
+    resp = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+    resp.set_etag(entry['etag'])
+    resp.last_modified = entry['last_modified']
+    return resp
+
+
+def cached_page(tags: Callable[..., Iterable[str]]):
+    """Cache a GET view's rendered response under tags derived from its
+    view arguments, e.g. ``@cached_page(lambda item_id: [f'item:{item_id}'])``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = _cache_key()
+            entry = backend.get(key)
+            if entry is not None:
+                timeout = current_app.config.get('PAGE_CACHE_TIMEOUT', 0)
+                fresh = not timeout or time.time() - entry['last_modified'] < timeout
+                if fresh and backend.tag_versions(entry['tags']) == entry['tags']:
+                    return _response(entry).make_conditional(request)
+
+            # read tag versions before rendering: a write committed while the
+            # page renders bumps them and the stored entry is born stale
+            versions = backend.tag_versions(tags(**kwargs))
+            resp = current_app.make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed:
+                return resp
+            body = resp.get_data()
+            entry = {
+                'body': body,
+                'status': resp.status_code,
+                'mimetype': resp.mimetype,
+                'etag': hashlib.md5(body).hexdigest(),
+                'last_modified': int(time.time()),
+                'tags': versions,
+            }
+            backend.set(key, entry)
+            return _response(entry).make_conditional(request)
+        return wrapper
+    return decorator
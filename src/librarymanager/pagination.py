@@ -0,0 +1,248 @@
+"""Keyset pagination shared by the HTML listings and the JSON API.
+
+A :class:`Keyset` is an ordering -- one or more sort fields, each ascending
+or descending, always ending with ``item.id`` as the unique tiebreak -- and
+turns a listing ``SELECT`` into pages with one ``LIMIT n + 1`` query each:
+the extra row tells whether another page follows, so no ``COUNT`` is run.
+
+Sort fields are item columns or subtype columns (``length``,
+``duration_minutes``, ...; see :func:`librarymanager.loading.field_column`);
+subtype tables the statement does not select from yet are outer-joined.
+A keyset may also page a table keyed by item ``id`` other than ``item``
+(``item_summary``): its own columns sort directly and other fields are
+joined on ``id``.
+When every key is ``NOT NULL`` and all keys share one direction, the
+position is compared as a row value (``(title, id) > (?, ?)``), which
+SQLite answers from a matching index. Otherwise the predicate is expanded
+key by key with explicit ``IS NULL`` terms, following SQLite's ordering
+(``NULL`` first ascending, last descending).
+
+Cursor tokens hold the sort key values of a boundary row as compact JSON,
+prefixed with a truncated HMAC-SHA256 (keyed by ``SECRET_KEY``) of the
+ordering and the values, in URL-safe base64 without padding. The same
+position always yields the same token, a token only decodes for the
+ordering it was issued for, and tampered tokens are rejected with
+``ValueError`` before any SQL runs.
+
+:func:`encode_cursor` and :func:`decode_cursor` make plain, unsigned tokens
+(the change feed's ``since`` position).
+"""
+import hashlib
+import hmac
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import Date, and_, or_, tuple_
+from sqlalchemy.sql.selectable import Join
+
+from .extensions import db
+from .loading import field_column
+from .models import Item
+
+# bytes of the HMAC kept in a token
+_MAC_BYTES = 8
+
+# sort fields a listing may combine (plus the implicit id tiebreak)
+MAX_SORT_KEYS = 3
+
+
+def encode_cursor(obj: Any) -> str:
+    """Encode a JSON-serialisable cursor position as a URL-safe token."""
+    s = json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+    return urlsafe_b64encode(s.encode()).decode()
+
+
+def decode_cursor(token: str) -> Any:
+    """Decode a token produced by :func:`encode_cursor`.
+
+    Raises ``ValueError`` when the token is not valid base64 JSON so callers
+    can turn it into a 400 response in whatever format they serve.
+    """
+    try:
+        txt = urlsafe_b64decode(token.encode()).decode()
+        return json.loads(txt)
+    except Exception as e:
+        raise ValueError('Invalid cursor token') from e
+
+
+class Page(NamedTuple):
+    """One page of rows; each row ends with the keyset's sort key values."""
+    rows: List[Any]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def parse_sort(sort: str, order: str = 'asc') -> List[Tuple[str, bool]]:
+    """``'-length,title'`` -> ``[('length', True), ('title', False)]``.
+
+    A ``-`` prefix sorts that field descending; ``order='desc'`` reverses
+    every field. Raises ``ValueError`` for an empty or invalid spec.
+    """
+    if order not in ('asc', 'desc'):
+        raise ValueError('invalid sort or order')
+    keys = []
+    for part in (sort or 'id').split(','):
+        part = part.strip()
+        descending = part.startswith('-')
+        name = part.lstrip('-')
+        if not name:
+            raise ValueError('invalid sort or order')
+        keys.append((name, descending != (order == 'desc')))
+    if len(keys) > MAX_SORT_KEYS:
+        raise ValueError(f'at most {MAX_SORT_KEYS} sort fields')
+    return keys
+
+
+def _tables(from_clause) -> set:
+    if isinstance(from_clause, Join):
+        return _tables(from_clause.left) | _tables(from_clause.right)
+    return {from_clause}
+
+
+class Keyset:
+    """An ordering of items for keyset pagination, see the module docstring.
+
+    ``types`` limits subtype columns to the tables of those item types
+    (e.g. a per-type listing sorting by ``duration_minutes``). ``table`` is
+    the table the statements select from (default ``item``).
+    """
+
+    def __init__(self, sort: str = 'id', order: str = 'asc', types: Optional[Sequence[str]] = None, table=None):
+        item = Item.__table__
+        self.table = item if table is None else table
+        self.keys = []  # (name, expression, descending, nullable)
+        self.tables = []
+        id_descending = None
+        for name, descending in parse_sort(sort, order):
+            if name == 'id':
+                id_descending = descending
+                break  # unique: later fields could never apply
+            if name in self.table.c:
+                expr, tables = self.table.c[name], []
+            else:
+                expr, tables = field_column(name, types)
+                if not tables and self.table is not item:
+                    tables = [item]
+            if isinstance(expr.type, db.JSON):
+                raise ValueError(f'cannot sort by {name!r}')
+            if any(name == k[0] for k in self.keys):
+                continue
+            # subtype columns are NULL for items of other types
+            nullable = any(t is not item for t in tables) or getattr(expr, 'nullable', True)
+            self.keys.append((name, expr, descending, nullable))
+            self.tables.extend(t for t in tables if t not in self.tables)
+        if id_descending is None:
+            id_descending = self.keys[-1][2]
+        self.keys.append(('id', self.table.c.id, id_descending, False))
+        self.spec = ','.join(('-' if d else '') + n for n, _, d, _ in self.keys)
+        self._row_value = all(not k[3] for k in self.keys) and len({k[2] for k in self.keys}) == 1
+        self._keyed = {}
+
+    # -- statements
+
+    def select(self, stmt, cursor: Optional[str] = None, direction: str = 'next'):
+        """Order ``stmt`` (a ``SELECT`` over the keyset's table), filter it to
+        the rows after (``direction='next'``) or before (``'prev'``)
+        ``cursor`` and append the sort key columns. Raises ``ValueError``
+        for bad cursors."""
+        if direction not in ('next', 'prev'):
+            raise ValueError('invalid direction')
+        reverse = direction == 'prev'
+        if self.tables:
+            # get_final_froms() compiles the statement: only pay for it when
+            # a sort key lives in another table
+            present = set().union(*(_tables(f) for f in stmt.get_final_froms()))
+            for table in self.tables:
+                if table not in present:
+                    stmt = stmt.outerjoin(table, table.c.id == self.table.c.id)
+        if cursor:
+            stmt = stmt.where(self._after(self.decode(cursor), reverse))
+        order = [expr.desc() if descending != reverse else expr.asc() for _, expr, descending, _ in self.keys]
+        return stmt.add_columns(*(expr.label(f'_key_{i}') for i, (_, expr, _, _) in enumerate(self.keys))).order_by(*order)
+
+    def _after(self, values: Sequence[Any], reverse: bool):
+        keys = [(expr, descending != reverse, nullable) for _, expr, descending, nullable in self.keys]
+        if self._row_value:
+            exprs = [k[0] for k in keys]
+            lhs, rhs = (tuple_(*exprs), tuple(values)) if len(exprs) > 1 else (exprs[0], values[0])
+            return lhs < rhs if keys[0][1] else lhs > rhs
+        expr, descending, _ = keys[-1]
+        condition = expr < values[-1] if descending else expr > values[-1]
+        for (expr, descending, nullable), value in zip(reversed(keys[:-1]), reversed(values[:-1])):
+            if value is None:
+                # NULLs sort first ascending and last descending
+                condition = and_(expr.is_(None), condition)
+                if not descending:
+                    condition = or_(condition, expr.is_not(None))
+                continue
+            beyond = expr < value if descending else expr > value
+            if nullable and descending:
+                beyond = or_(beyond, expr.is_(None))
+            condition = or_(beyond, and_(expr == value, condition))
+        return condition
+
+    def page(self, stmt, limit: int, cursor: Optional[str] = None, direction: str = 'next', session=None) -> Page:
+        """Run one page of ``stmt``: ``limit`` rows after/before ``cursor``.
+
+        ``next_cursor`` is set when rows follow the page, ``prev_cursor``
+        when rows precede it. Raises ``ValueError`` for bad cursors.
+        """
+        session = session or db.session
+        rows = session.execute(self.select(stmt, cursor, direction).limit(limit + 1)).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_prev = bool(cursor), more
+        else:
+            has_next, has_prev = more, bool(cursor)
+        if not rows:
+            return Page(rows, None, None)
+        return Page(rows, self.cursor_for(rows[-1]) if has_next else None,
+                    self.cursor_for(rows[0]) if has_prev else None)
+
+    # -- tokens
+
+    def _mac(self, payload: bytes) -> bytes:
+        secret = current_app.config['SECRET_KEY']
+        keyed = self._keyed.get(secret)
+        if keyed is None:
+            # HMAC state after the key and ordering, copied per token
+            keyed = hmac.new(secret.encode() if isinstance(secret, str) else secret,
+                             self.spec.encode() + b'\0', hashlib.sha256)
+            self._keyed[secret] = keyed
+        mac = keyed.copy()
+        mac.update(payload)
+        return mac.digest()[:_MAC_BYTES]
+
+    def cursor_for(self, row) -> str:
+        """Token for the position of ``row`` (a row of :meth:`select`)."""
+        values = [v.isoformat() if isinstance(v, date) else v for v in row[-len(self.keys):]]
+        payload = json.dumps(values, separators=(',', ':'), ensure_ascii=False).encode()
+        return urlsafe_b64encode(self._mac(payload) + payload).rstrip(b'=').decode()
+
+    def decode(self, token: str) -> List[Any]:
+        """Key values of a token from :meth:`cursor_for`; ``ValueError`` if
+        it is malformed, tampered with or issued for another ordering."""
+        try:
+            raw = urlsafe_b64decode(token.encode() + b'=' * (-len(token) % 4))
+        except Exception as e:
+            raise ValueError('Invalid cursor token') from e
+        mac, payload = raw[:_MAC_BYTES], raw[_MAC_BYTES:]
+        if len(mac) != _MAC_BYTES or not hmac.compare_digest(mac, self._mac(payload)):
+            raise ValueError('Invalid cursor token')
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise ValueError('Invalid cursor token')
+        return [date.fromisoformat(v) if v is not None and isinstance(expr.type, Date) else v
+                for v, (_, expr, _, _) in zip(values, self.keys)]
+
+
+@lru_cache(maxsize=256)
+def get_keyset(sort: str = 'id', order: str = 'asc', types: Optional[Tuple[str, ...]] = None, table=None) -> Keyset:
+    """Cached :class:`Keyset`; raises ``ValueError`` for invalid orderings."""
+    return Keyset(sort, order, types, table)
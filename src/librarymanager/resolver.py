@@ -0,0 +1,179 @@
+"""Shared get-or-create resolution of author and genre names.
+
+Every write path (API, HTML forms, bulk import) attaches authors and genres
+by name. Instead of one ``SELECT`` (and possibly ``INSERT`` + flush) per
+name, :func:`resolve_names` resolves a whole set of names with:
+
+1. a lookup in a bounded, per-app LRU cache of ``name -> id``,
+2. one ``SELECT ... WHERE name IN (...)`` for the cache misses,
+3. one ``INSERT ... ON CONFLICT (name) DO NOTHING RETURNING`` for names
+   that still do not exist, plus a follow-up ``SELECT`` only when a
+   concurrent writer won the race for some of them.
+
+Ids learnt inside a transaction are staged on the session and only enter
+the shared cache once that transaction commits; a rollback discards the
+staged ids and clears the cache, so a rolled back insert can never leave a
+dangling id behind.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from flask import current_app
+from sqlalchemy import delete, event, insert, select
+
+from .changes import record_change
+from .extensions import db
+from .models import Author, Genre, item_author, item_genre
+
+# session.info key holding (resolver, {name: id}) pairs of the open transaction
+_STAGED_KEY = 'name_resolver_staged'
+
+
+class NameResolver:
+    """Resolve names of ``model`` (``Author``/``Genre``) to ids.
+
+    The cache is a plain ``OrderedDict`` used as an LRU: hits are moved to
+    the end and the oldest entry is evicted once ``maxsize`` is exceeded.
+    """
+
+    def __init__(self, model, maxsize: int = 10000):
+        self.model = model
+        self.maxsize = maxsize
+        self._cache: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, name: str) -> Optional[int]:
+        """Return the cached id for ``name`` (refreshing its LRU position)."""
+        with self._lock:
+            id_ = self._cache.get(name)
+            if id_ is not None:
+                self._cache.move_to_end(name)
+            return id_
+
+    def remember(self, mapping: Dict[str, int]) -> None:
+        """Add committed ``name -> id`` pairs, evicting the oldest entries."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            for name, id_ in mapping.items():
+                self._cache[name] = id_
+                self._cache.move_to_end(name)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def resolve(self, names: Iterable[str], session=None) -> Dict[str, int]:
+        """Return ``{name: id}`` for ``names``, creating missing rows."""
+        session = session or db.session
+        wanted = set(n for n in names if n)
+        if not wanted:
+            return {}
+        staged = _staged(session, self)
+        result = {}
+        for name in wanted:
+            id_ = staged.get(name) or self.cached(name)
+            if id_ is not None:
+                result[name] = id_
+        missing = wanted - result.keys()
+        if not missing:
+            return result
+
+        model = self.model
+        found = dict((name, id_) for id_, name in session.execute(select(model.id, model.name).where(model.name.in_(missing))))
+        missing -= found.keys()
+        if missing:
+            found.update(_insert_missing(session, model, sorted(missing)))
+            missing -= found.keys()
+            if missing:
+                # lost a race with a concurrent writer: the rows exist now
+                found.update((name, id_) for id_, name in session.execute(select(model.id, model.name).where(model.name.in_(missing))))
+        staged.update(found)
+        result.update(found)
+        return result
+
+
+def _insert_missing(session, model, names: List[str]) -> Dict[str, int]:
+    """Insert ``names`` in one statement, ignoring unique-name conflicts."""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is None:
+        stmt = insert(model).returning(model.id, model.name)
+    else:
+        stmt = dialect_insert(model).on_conflict_do_nothing(index_elements=['name']).returning(model.id, model.name)
+    rows = session.execute(stmt.values([{'name': n} for n in names]))
+    return {name: id_ for id_, name in rows}
+
+
+def _staged(session, resolver: NameResolver) -> Dict[str, int]:
+    entries = session.info.setdefault(_STAGED_KEY, {})
+    return entries.setdefault(resolver, {})
+
+
+@event.listens_for(db.session, 'after_commit')
+def _promote_staged(session):
+    for resolver, mapping in session.info.pop(_STAGED_KEY, {}).items():
+        resolver.remember(mapping)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_staged(session):
+    for resolver in session.info.pop(_STAGED_KEY, {}):
+        resolver.clear()
+
+
+def get_resolver(model) -> NameResolver:
+    """Return the current app's resolver for ``model``, creating it lazily."""
+    resolvers = current_app.extensions.setdefault('name_resolvers', {})
+    resolver = resolvers.get(model)
+    if resolver is None:
+        resolver = resolvers.setdefault(model, NameResolver(model, current_app.config.get('NAME_CACHE_SIZE', 10000)))
+    return resolver
+
+
+def resolve_names(model, names: Iterable[str], session=None) -> Dict[str, int]:
+    """Shortcut for ``get_resolver(model).resolve(names, session)``."""
+    return get_resolver(model).resolve(names, session)
+
+
+def clear_name_caches() -> None:
+    """Forget every cached id of the current app (e.g. after a DB rebuild)."""
+    for resolver in current_app.extensions.get('name_resolvers', {}).values():
+        resolver.clear()
+
+
+def set_item_names(item, authors: Optional[Iterable[str]] = None, genres: Optional[Iterable[str]] = None,
+                   replace: bool = False, session=None) -> None:
+    """Link ``item`` to the given author/genre names.
+
+    The association rows are written with Core statements (one executemany
+    per table) and the ``authors``/``genres`` relationships are expired so
+    they reload on next access. ``item`` must have been flushed. With
+    ``replace`` the existing links of the given kind are removed first;
+    ``None`` leaves that kind untouched.
+    """
+    session = session or db.session
+    for names, model, table, fk in ((authors, Author, item_author, 'author_id'), (genres, Genre, item_genre, 'genre_id')):
+        if names is None:
+            continue
+        names = list(dict.fromkeys(n for n in names if n))
+        if replace:
+            session.execute(delete(table).where(table.c.item_id == item.id))
+        ids = resolve_names(model, names, session)
+        if names:
+            session.execute(insert(table), [{'item_id': item.id, fk: ids[n]} for n in names])
+    # Core writes are invisible to the flush-based change tracking
+    record_change(session, item.id, item.type)
+    session.expire(item, ['authors', 'genres'])
@@ -1,80 +1,362 @@
-from flask import Blueprint, jsonify, request
-from ..models import Item, Book, CD, DVD, BoardGame
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from ..models import Item
 from ..extensions import db
+from ..facets import facet_counts, filter_items, item_types, parse_filters
+from ..images import check_image, store_image
+from ..importer import IMPORT_FORMATS, detect_format, import_records, item_values, parse_records, text_stream
+from ..serializers import RowSerializer, dumps, get_serializer, json_response, parse_fields, serialize_item
+from ..resolver import set_item_names
+from ..search import search_items
+from ..thumbnails import thumbnail_url
+from ..pagination import Keyset, decode_cursor, encode_cursor, get_keyset
+from ..versioning import catalog_etag, changes_since, current_version, item_etag, parse_item_etag
 
 api_bp = Blueprint('api', __name__)
 
+# room for the multipart boundaries and part headers of an image upload
+_MULTIPART_OVERHEAD = 16 * 1024
+
+
+def _listing_select(serializer: RowSerializer, typ: str | None = None, filters: dict | None = None):
+    """The unordered listing ``SELECT``: items of ``typ`` with the facet ``filters``."""
+    stmt = serializer.select()
+    if typ:
+        stmt = stmt.where(Item.type == typ)
+    if filters:
+        stmt = filter_items(stmt, filters, typ)
+    return stmt
+
+
+def _keyset(sort: str, order: str, typ: str | None = None) -> Keyset:
+    """The ordering for ``sort``/``order``; raises ``ValueError`` when invalid."""
+    return get_keyset(sort, order, (typ,) if typ else None)
+
+
+def _fetch_page(serializer: RowSerializer, sort: str, order: str, cursor: str | None, limit: int, session=None,
+                typ: str | None = None, filters: dict | None = None):
+    """Return ``(items, next_cursor)`` for one keyset page.
+
+    Raises ``ValueError`` for invalid orderings and malformed cursors.
+    """
+    page = _keyset(sort, order, typ).page(_listing_select(serializer, typ, filters), limit, cursor, session=session)
+    return serializer.serialize_rows(page.rows, session or db.session), page.next_cursor
+
+
+def _stream_rows(stmt, serializer: RowSerializer, fmt: str):
+    """Yield the serialized rows of ``stmt`` as a JSON array or as NDJSON.
+
+    Rows are pulled from the database in chunks of ``API_STREAM_BATCH_SIZE``
+    so memory stays bounded regardless of the catalog size; author and genre
+    names are looked up once per chunk.
+    """
+    batch = current_app.config.get('API_STREAM_BATCH_SIZE', 500)
+    result = db.session.execute(stmt.execution_options(yield_per=batch))
+    if fmt != 'ndjson':
+        yield b'['
+    first = True
+    for rows in result.partitions():
+        items = serializer.serialize_rows(rows)
+        if fmt == 'ndjson':
+            yield b''.join(dumps(it) + b'\n' for it in items)
+        elif items:
+            yield (b'' if first else b',') + b','.join(dumps(it) for it in items)
+            first = False
+    if fmt != 'ndjson':
+        yield b']'
+
+
+def _fields_arg():
+    """The serializer for ``?fields=``; raises ``ValueError`` for unknown names."""
+    return get_serializer(parse_fields(request.args.get('fields')))
+
+
+def _type_arg(args=None):
+    """The ``?type=`` item type of ``args`` (default: the request's) or
+    ``None``; raises ``ValueError`` for unknown types."""
+    typ = (request.args if args is None else args).get('type') or None
+    if typ is not None and typ not in item_types():
+        raise ValueError(f'unknown item type {typ!r}')
+    return typ
+
+
+def _with_etag(resp, etag: str):
+    """Attach ``etag`` and ask clients to revalidate before reusing the body."""
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True
+    return resp
+
+
+def _not_modified(etag: str):
+    return _with_etag(Response(status=304), etag)
+
 
 @api_bp.route('/items', methods=['GET'])
 def list_items():
-    items = Item.query.all()
-    result = []
-    for it in items:
-        base = {'id': it.id, 'type': it.type, 'title': it.title, 'description': it.description}
-        base['external_url'] = getattr(it, 'external_url', None)
-        base['image_url'] = getattr(it, 'image_url', None)
-        # include authors and genres
-        base['authors'] = [a.name for a in getattr(it, 'authors', [])]
-        base['genres'] = [g.name for g in getattr(it, 'genres', [])]
-        if isinstance(it, Book):
-            base.update({'language': it.language, 'publisher': it.publisher, 'length': it.length, 'size': it.size})
-        elif isinstance(it, CD):
-            base.update({'primary_artist': it.primary_artist, 'publisher': it.publisher, 'duration_minutes': it.duration_minutes, 'track_list': it.track_list, 'genre': it.genre})
-        elif isinstance(it, DVD):
-            base.update({'director': it.director, 'main_actors': it.main_actors, 'genre': it.genre, 'duration_minutes': it.duration_minutes})
-        elif isinstance(it, BoardGame):
-            base.update({'author_note': it.author_note, 'min_players': it.min_players, 'max_players': it.max_players, 'genre': it.genre})
-        result.append(base)
-    return jsonify(result)
+    """List items.
+
+    Without paging arguments the whole catalog is streamed as a JSON array.
+    ``format=ndjson`` (or ``Accept: application/x-ndjson``) streams one JSON
+    object per line instead. Passing ``limit`` and/or ``cursor`` switches to
+    keyset pagination: ``{"items": [...], "next_cursor": ...}``. ``sort``
+    takes up to three comma-separated fields (item or subtype columns such
+    as ``length``; ``-`` sorts one descending) and ``order=desc`` reverses
+    them all; ``id`` always breaks ties.
+    ``fields=id,title,...`` limits each item to the listed fields.
+    ``type=`` and the facet filters ``genre=``, ``author=``, ``language=``
+    and ``players=`` narrow the listing in every mode.
+
+    Responses carry an ``ETag`` derived from the catalog version; a matching
+    ``If-None-Match`` gets ``304 Not Modified`` without reading any items.
+    """
+    sort = request.args.get('sort', 'id')
+    order = request.args.get('order', 'asc')
+    cursor = request.args.get('cursor')
+    filters = parse_filters(request.args)
+    try:
+        typ = _type_arg()
+        serializer = _fields_arg()
+        stmt = _keyset(sort, order, typ).select(_listing_select(serializer, typ, filters), cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fmt = request.args.get('format')
+    if fmt is None and request.accept_mimetypes.best == 'application/x-ndjson':
+        fmt = 'ndjson'
+    # read the version before the items: a concurrent commit can then only
+    # make the body newer than its ETag, never older
+    etag = catalog_etag(current_version(), f'{fmt}?{request.query_string.decode()}')
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    if fmt == 'ndjson':
+        return _with_etag(Response(stream_with_context(_stream_rows(stmt, serializer, 'ndjson')), mimetype='application/x-ndjson'), etag)
+
+    if 'limit' not in request.args and not cursor:
+        return _with_etag(Response(stream_with_context(_stream_rows(stmt, serializer, 'json')), mimetype='application/json'), etag)
+
+    max_limit = current_app.config.get('API_MAX_PAGE_SIZE', 1000)
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('API_PAGE_SIZE', 100)))
+    except ValueError:
+        return jsonify({'error': 'invalid limit'}), 400
+    limit = max(1, min(limit, max_limit))
+    items, next_cursor = _fetch_page(serializer, sort, order, cursor, limit, typ=typ, filters=filters)
+    return _with_etag(json_response({'items': items, 'next_cursor': next_cursor}), etag)
+
+
+@api_bp.route('/items/facets', methods=['GET'])
+def item_facets():
+    """Facet counts for narrowing ``GET /api/items``.
+
+    Takes the same ``type=`` and facet filters as the listing and returns
+    ``{"type", "filters", "matching", "facets": {facet: [{"value",
+    "count"}, ...]}}`` with the ``limit`` most frequent values per facet
+    among the matching items (plus a ``type`` facet without ``type=``).
+    ``matching`` is the number of items matching the filters (``null``
+    without filters).
+    """
+    filters = parse_filters(request.args)
+    try:
+        typ = _type_arg()
+        limit = int(request.args.get('limit', current_app.config.get('FACET_VALUES_LIMIT', 10)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+    etag = catalog_etag(current_version(), f'facets?{request.query_string.decode()}')
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    facets, matching = facet_counts(typ, filters, limit)
+    body = {facet: [{'value': value, 'count': count} for value, count in values] for facet, values in facets.items()}
+    return _with_etag(json_response({'type': typ, 'filters': filters, 'matching': matching, 'facets': body}), etag)
+
+
+@api_bp.route('/items/changes', methods=['GET'])
+def item_changes():
+    """Changes since ``?since=<token>`` for incremental sync.
+
+    Returns ``{"changes": [...], "next_since": token, "has_more": bool}``
+    with at most ``limit`` entries ordered by catalog version. Each entry is
+    ``{"op": "upsert", "id", "version", "item": {...}}`` or ``{"op":
+    "delete", "id", "version", "type"}``. Omitting ``since`` starts from the
+    beginning; clients store ``next_since`` and poll with it, following it
+    immediately while ``has_more`` is true. ``format=ndjson`` returns one
+    entry per line with the token in the ``X-Next-Since`` header.
+    """
+    since = (0, 0)
+    if request.args.get('since'):
+        try:
+            token = decode_cursor(request.args['since'])
+            if not isinstance(token, list) or len(token) != 2 or not all(isinstance(v, int) for v in token):
+                raise ValueError('Invalid since token')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        since = tuple(token)
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('API_PAGE_SIZE', 100)))
+    except ValueError:
+        return jsonify({'error': 'invalid limit'}), 400
+    limit = max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+    fmt = request.args.get('format')
+    if fmt is None and request.accept_mimetypes.best == 'application/x-ndjson':
+        fmt = 'ndjson'
+
+    etag = catalog_etag(current_version(), f'changes:{fmt}?{request.query_string.decode()}')
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    changes, has_more = changes_since(since, limit)
+    entries = []
+    for op, id_, version, obj in changes:
+        if op == 'upsert':
+            entries.append({'op': op, 'id': id_, 'version': version, 'item': serialize_item(obj)})
+        else:
+            entries.append({'op': op, 'id': id_, 'version': version, 'type': obj.type})
+    next_since = encode_cursor([changes[-1][2], changes[-1][1]]) if changes else encode_cursor(list(since))
+    if fmt == 'ndjson':
+        body = b''.join(dumps(e) + b'\n' for e in entries)
+        resp = Response(body, mimetype='application/x-ndjson')
+        resp.headers['X-Next-Since'] = next_since
+        resp.headers['X-Has-More'] = 'true' if has_more else 'false'
+        return _with_etag(resp, etag)
+    return _with_etag(json_response({'changes': entries, 'next_since': next_since, 'has_more': has_more}), etag)
+
+
+@api_bp.route('/items/<int:item_id>', methods=['GET'])
+def get_item(item_id):
+    """Return one item, with an ``ETag`` tied to the item's version.
+
+    A client revalidating an ETag minted at the current catalog version gets
+    ``304`` straight away (nothing can have changed since); older ETags cost
+    one primary-key lookup of the item's version. ``fields=`` works as for
+    the listing.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    serializer = get_serializer(fields)
+    for value in request.if_none_match.as_set(include_weak=True):
+        version = parse_item_etag(value, item_id, fields)
+        if version is not None and version == current_version():
+            return _not_modified(value)
+    version = db.session.query(Item.version).filter(Item.id == item_id).scalar()
+    if version is None:
+        return jsonify({'error': 'not found'}), 404
+    etag = item_etag(item_id, version, fields)
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    rows = db.session.execute(serializer.select().where(Item.id == item_id)).all()
+    if not rows:
+        return jsonify({'error': 'not found'}), 404
+    data = serializer.serialize_rows(rows)[0]
+    return _with_etag(json_response(data), item_etag(item_id, rows[0][serializer.version_index], fields))
+
+
+def _create_item(data, session=None) -> dict:
+    """Create and commit an item from a ``POST /api/items`` body; returns
+    the response body. Shared with the ASGI API (``session`` defaults to
+    ``db.session``). Raises ``ValueError``/``TypeError`` for invalid data.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    session = session or db.session
+    cls, base, sub = item_values(data)
+    authors = list(dict.fromkeys(a for a in data.get('authors') or [] if a))
+    genres = list(dict.fromkeys(g for g in data.get('genres') or [] if g))
+    obj = cls(**base, **sub)
+
+    # add the object to the session so it has an id before linking names
+    session.add(obj)
+    session.flush()
+
+    # attach authors and genres (created if missing) in a constant number
+    # of statements; see librarymanager.resolver
+    set_item_names(obj, authors, genres, session=session)
+
+    result = {'id': obj.id, 'type': obj.type, 'title': obj.title, 'authors': authors, 'genres': genres}
+    session.commit()
+    return result
 
 
 @api_bp.route('/items', methods=['POST'])
 def create_item():
-    data = request.get_json() or {}
-    typ = (data.get('type') or 'book').lower()
-    authors = data.get('authors') or []
-    genres = data.get('genres') or []
-    if typ == 'book':
-        obj = Book(title=data.get('title', 'Untitled'), description=data.get('description'), language=data['language'] if 'language' in data else None, publisher=data.get('publisher'), length=data.get('length'), size=data.get('size'))
-    elif typ == 'cd':
-        obj = CD(title=data.get('title', 'Untitled'), description=data.get('description'), primary_artist=data.get('artist') or data.get('primary_artist'), publisher=data.get('publisher'), duration_minutes=data.get('duration_minutes'), track_list=data.get('track_list'), genre=data.get('genre'))
-    elif typ == 'dvd':
-        obj = DVD(title=data.get('title', 'Untitled'), description=data.get('description'), director=data.get('director'), main_actors=data.get('main_actors'), genre=data.get('genre'), duration_minutes=data.get('duration_minutes'))
-    elif typ in ('board_game', 'boardgame', 'game'):
-        obj = BoardGame(title=data.get('title', 'Untitled'), description=data.get('description'), author_note=data.get('author'), min_players=data.get('min_players'), max_players=data.get('max_players'), genre=data.get('genre'))
-    else:
-        return jsonify({'error': 'unknown type'}), 400
-
-    # optional links (set on the object before relations)
-    obj.external_url = data.get('external_url')
-    obj.image_url = data.get('image_url')
-
-    # attach authors and genres (create if missing)
-    from ..models import Author, Genre
-
-    # add the object to the session before appending relationships
-    db.session.add(obj)
-    db.session.flush()
-
-    for a in authors:
-        if not a:
-            continue
-        auth = Author.query.filter_by(name=a).first()
-        if not auth:
-            auth = Author(name=a)
-            db.session.add(auth)
-            db.session.flush()
-        obj.authors.append(auth)
-
-    for g in genres:
-        if not g:
-            continue
-        gen = Genre.query.filter_by(name=g).first()
-        if not gen:
-            gen = Genre(name=g)
-            db.session.add(gen)
-            db.session.flush()
-        obj.genres.append(gen)
+    try:
+        result = _create_item(request.get_json() or {})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), 201
+
 
+@api_bp.route('/items/<int:item_id>/image', methods=['POST'])
+def upload_item_image(item_id):
+    """Store an uploaded image (multipart field ``image`` or the raw body)
+    as the item's image; returns its digest and thumbnail URLs."""
+    it = db.session.get(Item, item_id)
+    if it is None:
+        return jsonify({'error': 'not found'}), 404
+    limit = current_app.config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+    # refuse a declared length over the limit before reading the body, and
+    # never read more than limit + 1 bytes of a raw body
+    if request.content_length is not None and request.content_length > limit + _MULTIPART_OVERHEAD:
+        return jsonify({'error': 'image too large'}), 413
+    if request.mimetype == 'multipart/form-data':
+        if request.content_length is None:
+            # the form parser would spool a body of any size
+            return jsonify({'error': 'Content-Length required'}), 411
+        upload = request.files.get('image')
+        data = upload.read(limit + 1) if upload is not None else b''
+    else:
+        data = request.stream.read(limit + 1)
+    if len(data) > limit:
+        return jsonify({'error': 'image too large'}), 413
+    try:
+        check_image(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    it.image_digest = store_image(data)
     db.session.commit()
-    return jsonify({'id': obj.id, 'type': obj.type, 'title': obj.title, 'authors': [a.name for a in obj.authors], 'genres': [g.name for g in obj.genres]}), 201
+    thumbs = {size: thumbnail_url(it.image_digest, size) for size in current_app.config.get('THUMBNAIL_SIZES') or {}}
+    return jsonify({'id': it.id, 'image_digest': it.image_digest, 'thumbnails': thumbs}), 201
+
+
+@api_bp.route('/items/bulk', methods=['POST'])
+def bulk_create_items():
+    """Import many items in one request.
+
+    The body is a JSON list (or ``{"items": [...]}``), NDJSON or CSV, chosen
+    by ``?format=`` or the request content type. NDJSON and CSV bodies are
+    parsed incrementally. Rows are committed every ``chunk_size`` items
+    (default ``IMPORT_CHUNK_SIZE``); the response reports the throughput.
+    """
+    fmt = request.args.get('format') or detect_format(request.mimetype)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'unsupported format {fmt!r}'}), 400
+    try:
+        chunk_size = int(request.args.get('chunk_size', current_app.config.get('IMPORT_CHUNK_SIZE', 1000)))
+    except ValueError:
+        return jsonify({'error': 'invalid chunk_size'}), 400
+    try:
+        stats = import_records(parse_records(text_stream(request.stream), fmt), chunk_size=chunk_size)
+    except ValueError as e:
+        # malformed body (bad JSON/NDJSON line); chunks before it are kept
+        return jsonify({'error': str(e)}), 400
+    return jsonify(stats), 201
+
+
+@api_bp.route('/search', methods=['GET'])
+def search():
+    """Ranked full-text search: ``?q=`` with ``limit`` and 1-based ``page``.
+
+    Every word of ``q`` is matched as a prefix against titles,
+    descriptions, author and genre names and CD track lists.
+    """
+    q = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('SEARCH_PAGE_SIZE', 20)))
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        return jsonify({'error': 'invalid limit or page'}), 400
+    limit = max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+    page = max(1, page)
+    results, has_more = search_items(q, limit=limit, offset=(page - 1) * limit)
+    return jsonify({'q': q, 'page': page, 'items': results, 'has_more': has_more})
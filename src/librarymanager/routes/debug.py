@@ -0,0 +1,16 @@
+from flask import Blueprint, Response, abort
+
+from ..jobs import render_job_metrics
+from ..metrics import get_metrics
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+
+@debug_bp.route('/metrics')
+def metrics():
+    """Per-endpoint request histograms and background job statistics in the
+    Prometheus text format."""
+    registry = get_metrics()
+    if registry is None:
+        abort(404)
+    return Response(registry.render() + render_job_metrics(), mimetype='text/plain; version=0.0.4')
@@ -1,26 +1,62 @@
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, abort
-from ..models import Item, Author, Genre, Book, CD, DVD, BoardGame
+from ..models import Item, Book, CD, DVD, BoardGame
+from ..counters import item_count
 from ..extensions import db
-from sqlalchemy import tuple_
-import json
+from ..facets import FACET_LABELS, facet_counts, filter_items, parse_filters
+from ..loading import item_query
+from ..pagecache import cached_page
+from ..pagination import get_keyset
+from ..resolver import set_item_names
+from ..search import search_items
+from ..summaries import summary_select
 
 main_bp = Blueprint('main', __name__)
 
+# extra sort fields offered per listing (any item or subtype column works)
+SORT_OPTIONS = {
+    'book': [('length', 'Pages'), ('publication_date', 'Publication date')],
+    'cd': [('duration_minutes', 'Duration'), ('publication_date', 'Release date')],
+    'dvd': [('duration_minutes', 'Duration'), ('publication_date', 'Release date')],
+    'board_game': [('min_players', 'Min. players'), ('max_players', 'Max. players')],
+}
+
+# map common route values to the polymorphic identity stored in the DB
+TYPE_ALIASES = {
+    'book': 'book',
+    'cd': 'cd',
+    'dvd': 'dvd',
+    'boardgame': 'board_game',
+    'board_game': 'board_game',
+}
+
 
 @main_bp.route('/')
+@cached_page(lambda: ['index'])
 def index():
-    # server-rendered homepage showing recent items
+    # server-rendered homepage showing recent items, read from the
+    # denormalized summaries (librarymanager.summaries)
     per_page = current_app.config.get('ITEMS_PER_PAGE', 10)
-    items = Item.query.order_by(Item.id.desc()).limit(per_page).all()
+    stmt, table = summary_select()
+    items = db.session.execute(stmt.order_by(table.c.id.desc()).limit(per_page)).all()
     return render_template('index.html', items=items)
 
 
 @main_bp.route('/items/<int:item_id>')
+@cached_page(lambda item_id: [f'item:{item_id}'])
 def item_detail(item_id: int):
-    it = Item.query.get_or_404(item_id)
+    it = item_query().filter(Item.id == item_id).first_or_404()
     return render_template('item_detail.html', item=it)
 
 
+@main_bp.route('/search')
+def search():
+    q = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = current_app.config.get('SEARCH_PAGE_SIZE', 20)
+    results, has_more = search_items(q, limit=per_page, offset=(page - 1) * per_page)
+    return render_template('search.html', q=q, results=results, page=page, has_more=has_more)
+
+
 @main_bp.route('/items/new')
 def new_item_index():
     # choose type
@@ -28,132 +64,53 @@ def new_item_index():
 
 
 @main_bp.route('/items/type/<typ>')
+@cached_page(lambda typ: [f'type:{TYPE_ALIASES.get(typ.lower(), typ.lower())}'])
 def items_by_type(typ: str):
     # show all items of a given type
     typ = typ.lower()
-    # map common route values to the polymorphic identity stored in the DB
-    mapping = {
-        'book': 'book',
-        'cd': 'cd',
-        'dvd': 'dvd',
-        'boardgame': 'board_game',
-        'board_game': 'board_game',
-    }
-    db_type = mapping.get(typ, typ)
-    # pagination
-    # cursor-based bidirectional pagination and sorting
+    db_type = TYPE_ALIASES.get(typ, typ)
+    # keyset pagination (librarymanager.pagination): sort by one or more
+    # fields, cursors are signed tokens of the boundary rows
     sort = request.args.get('sort', 'id')
     order = request.args.get('order', 'asc')
     cursor = request.args.get('cursor')
     direction = request.args.get('direction', 'next')  # 'next' or 'prev'
     per_page = current_app.config.get('ITEMS_PER_PAGE', 10)
 
-    from base64 import urlsafe_b64encode, urlsafe_b64decode
-
-    def encode_cursor_obj(obj) -> str:
-        s = json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
-        return urlsafe_b64encode(s.encode()).decode()
-
-    def decode_cursor_obj(token: str):
-        try:
-            txt = urlsafe_b64decode(token.encode()).decode()
-            return json.loads(txt)
-        except Exception:
-            abort(400, description='Invalid cursor token')
-
-    query = Item.query.filter_by(type=db_type)
-    order_col = Item.title if sort == 'title' else Item.id
-    # secondary tiebreaker is id for stable ordering
-    sec_col = Item.id
-
-    # build comparison based on requested direction
-    if not cursor:
-        # initial page
-        if order == 'desc':
-            q = query.order_by(order_col.desc())
-        else:
-            q = query.order_by(order_col.asc())
-        items_raw = q.limit(per_page + 1).all()
-        # display items in order requested
-        items_display = items_raw[:per_page]
-        if order == 'desc':
-            # items_raw already in desc order; display as-is
-            pass
-    else:
-        # decode composite cursor
-        cur_obj = decode_cursor_obj(cursor)
-        cur_val = None
-        cur_title = None
-        cur_id = None
-        if sort == 'id':
-            if not isinstance(cur_obj, dict) or 'id' not in cur_obj:
-                abort(400, description='Cursor missing id')
-            try:
-                cur_id = int(cur_obj['id'])
-            except Exception:
-                abort(400, description='Invalid id in cursor')
-        else:
-            if not isinstance(cur_obj, dict) or 'title' not in cur_obj or 'id' not in cur_obj:
-                abort(400, description='Cursor missing title/id')
-            cur_title = cur_obj['title']
-            try:
-                cur_id = int(cur_obj['id'])
-            except Exception:
-                abort(400, description='Invalid id in cursor')
-
-        if direction == 'next':
-            if sort == 'id':
-                comp = order_col > cur_id if order == 'asc' else order_col < cur_id
-            else:
-                comp = tuple_(order_col, sec_col) > (cur_title, cur_id) if order == 'asc' else tuple_(order_col, sec_col) < (cur_title, cur_id)
-            q = query.filter(comp)
-            q = q.order_by(order_col.asc() if order == 'asc' else order_col.desc())
-            items_raw = q.limit(per_page + 1).all()
-            items_display = items_raw[:per_page]
-        else:  # direction == 'prev'
-            # to fetch previous page, query the opposite side and then reverse
-            if sort == 'id':
-                comp = order_col < cur_id if order == 'asc' else order_col > cur_id
-            else:
-                comp = tuple_(order_col, sec_col) < (cur_title, cur_id) if order == 'asc' else tuple_(order_col, sec_col) > (cur_title, cur_id)
-            # fetch in reverse order
-            q = query.filter(comp)
-            q = q.order_by(order_col.desc() if order == 'asc' else order_col.asc())
-            items_raw = q.limit(per_page + 1).all()
-            items_display = list(reversed(items_raw[:per_page]))
-
-    # compute cursors
-    has_next = False
-    has_prev = False
-    next_cursor = None
-    prev_cursor = None
-    if items_display:
-        # determine prev and next cursor objects
-        first = items_display[0]
-        last = items_display[-1]
-        if sort == 'id':
-            prev_cursor = encode_cursor_obj({'id': getattr(first, 'id')})
-            next_cursor = encode_cursor_obj({'id': getattr(last, 'id')})
-        else:
-            prev_cursor = encode_cursor_obj({'title': getattr(first, 'title'), 'id': getattr(first, 'id')})
-            next_cursor = encode_cursor_obj({'title': getattr(last, 'title'), 'id': getattr(last, 'id')})
-
-    # determine has_next/has_prev from items_raw length and presence of cursor
-    if 'items_raw' in locals():
-        if len(items_raw) > per_page:
-            if direction == 'next' or not cursor:
-                has_next = True
-            else:
-                has_prev = True
-        # When cursor provided and direction==next, there may be previous pages
-        if cursor:
-            # if we fetched with > or < filter, then previous pages exist
-            has_prev = True
+    # facet filters (genre=, author=, language=, players=) narrow the
+    # listing; the cursors work unchanged on the filtered query. Rows come
+    # from the item summaries, sort fields they lack are joined on id
+    filters = parse_filters(request.args)
+    stmt, table = summary_select()
+    query = filter_items(stmt.where(table.c.type == db_type), filters, db_type, table.c.id)
+    try:
+        page = get_keyset(sort, order, (db_type,), table).page(query, per_page, cursor, direction)
+    except ValueError as e:
+        abort(400, description=str(e))
+    items_display = page.rows
+    next_cursor, prev_cursor = page.next_cursor, page.prev_cursor
+    has_next, has_prev = next_cursor is not None, prev_cursor is not None
 
     display_label = db_type.replace('_', ' ').capitalize()
-    # total count for this type (useful for showing totals in UI)
-    total = Item.query.filter_by(type=db_type).count()
-    return render_template('item_list.html', items=items_display, type=display_label, route_param=typ, next_cursor=next_cursor, prev_cursor=prev_cursor, has_next=has_next, has_prev=has_prev, sort=sort, order=order, total=total)
+    facets, matching = facet_counts(db_type, filters, current_app.config.get('FACET_VALUES_LIMIT', 10))
+    if matching is None:
+        # total count for this type, served from the maintained counters
+        total, total_exact = item_count(db_type)
+    else:
+        total, total_exact = matching, True
+
+    def list_url(**changes):
+        args = {k: v for k, v in dict(filters, **changes).items() if v}
+        return url_for('main.items_by_type', typ=typ, sort=sort, order=order, **args)
+
+    # clicking a value selects it, clicking the selected value clears it
+    facet_links = [(FACET_LABELS.get(facet, facet), [
+        {'value': value, 'count': count, 'active': filters.get(facet) == value,
+         'url': list_url(**{facet: None if filters.get(facet) == value else value})}
+        for value, count in values]) for facet, values in facets.items()]
+    active_filters = [(FACET_LABELS.get(facet, facet), value, list_url(**{facet: None})) for facet, value in filters.items()]
+    return render_template('item_list.html', items=items_display, type=display_label, route_param=typ, next_cursor=next_cursor, prev_cursor=prev_cursor, has_next=has_next, has_prev=has_prev, sort=sort, order=order, total=total, total_exact=total_exact,
+                           filters=filters, facet_links=facet_links, active_filters=active_filters, sort_options=SORT_OPTIONS.get(db_type, []))
 
 
 @main_bp.route('/items/new/<typ>', methods=['GET', 'POST'])
@@ -205,22 +162,7 @@ def new_item(typ: str):
     # persist and attach authors/genres
     db.session.add(obj)
     db.session.flush()
-
-    for a in authors:
-        auth = Author.query.filter_by(name=a).first()
-        if not auth:
-            auth = Author(name=a)
-            db.session.add(auth)
-            db.session.flush()
-        obj.authors.append(auth)
-
-    for g in genres:
-        gen = Genre.query.filter_by(name=g).first()
-        if not gen:
-            gen = Genre(name=g)
-            db.session.add(gen)
-            db.session.flush()
-        obj.genres.append(gen)
+    set_item_names(obj, authors, genres)
 
     db.session.commit()
     return redirect(url_for('main.item_detail', item_id=obj.id))
@@ -229,7 +171,7 @@ def new_item(typ: str):
 
 @main_bp.route('/items/<int:item_id>/edit', methods=['GET', 'POST'])
 def edit_item(item_id: int):
-    it = Item.query.get_or_404(item_id)
+    it = item_query().filter(Item.id == item_id).first_or_404()
     if request.method == 'GET':
         # render the same form template but pass item to prefill
         template = f'forms/new_{it.type}.html'
@@ -275,23 +217,7 @@ def edit_item(item_id: int):
         it.max_players = int(maxp) if maxp else it.max_players
 
     # update authors and genres: clear and reattach
-    it.authors.clear()
-    it.genres.clear()
-    for a in authors:
-        auth = Author.query.filter_by(name=a).first()
-        if not auth:
-            auth = Author(name=a)
-            db.session.add(auth)
-            db.session.flush()
-        it.authors.append(auth)
-
-    for g in genres:
-        gen = Genre.query.filter_by(name=g).first()
-        if not gen:
-            gen = Genre(name=g)
-            db.session.add(gen)
-            db.session.flush()
-        it.genres.append(gen)
+    set_item_names(it, authors, genres, replace=True)
 
     db.session.commit()
     return redirect(url_for('main.item_detail', item_id=it.id))
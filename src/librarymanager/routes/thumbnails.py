@@ -0,0 +1,23 @@
+from flask import Blueprint, abort, send_file
+
+from ..images import sniff_type
+from ..thumbnails import IMMUTABLE_MAX_AGE, parse_name, thumbnail_path
+
+thumbnails_bp = Blueprint('thumbnails', __name__, url_prefix='/thumbs')
+
+
+@thumbnails_bp.route('/<name>')
+def thumbnail(name: str):
+    """A thumbnail, rendered on first request; the URL is immutable."""
+    parsed = parse_name(name)
+    if parsed is None:
+        abort(404)
+    path = thumbnail_path(*parsed)
+    if path is None:
+        abort(404)
+    with open(path, 'rb') as f:
+        mimetype = sniff_type(f.read(16)) or 'application/octet-stream'
+    resp = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, conditional=True, etag=name)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
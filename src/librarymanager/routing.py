@@ -0,0 +1,172 @@
+"""Route read-only queries to a replica engine.
+
+``READ_REPLICA_URI`` names the engine reads may use: a second database URL,
+or ``'readonly'`` to open the primary SQLite file a second time with
+``mode=ro``. When it is set, ``GET``/``HEAD`` requests handled by the
+``main`` and ``api`` blueprints run their ``SELECT`` statements on the
+replica; everything else -- flushes, Core ``INSERT``/``UPDATE``/``DELETE``,
+reads issued after the transaction wrote anything -- goes to the primary.
+Only known writes (DML and DDL constructs, or raw SQL text starting with
+one of :data:`WRITE_KEYWORDS`) count as the transaction having written;
+other statements (``PRAGMA``, ``EXPLAIN``, ...) run on the primary without
+moving later reads there. Pass an explicit bind (``bind_arguments``) to run
+raw text elsewhere.
+
+Read-your-writes: once a request commits, its remaining reads use the
+primary (``READ_YOUR_WRITES``). With ``READ_YOUR_WRITES_SECONDS`` a commit
+also pins the client (through the session cookie) to the primary for that
+long, so the page a form redirects to never comes from a lagging replica.
+
+:func:`reads_from` switches the current session explicitly, e.g. for a
+CLI command that may read from the replica.
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+from flask import Flask, current_app, has_app_context, has_request_context, request, session as cookie_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# blueprints whose GET views read from the replica
+ROUTED_BLUEPRINTS = ('main', 'api')
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+# first words of raw SQL text that count as writes
+WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+# session.info keys: where reads go, and whether the open transaction wrote
+_TARGET_KEY = 'read_target'
+_WROTE_KEY = 'read_target_wrote'
+# Flask session key: reads go to the primary until this timestamp
+_PIN_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    """``db.session`` class that sends plain reads to the replica when the
+    session's read target is :data:`REPLICA`."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None:
+            kind = _statement_kind(clause)
+            if kind == 'read':
+                if self.info.get(_TARGET_KEY) == REPLICA and not self.info.get(_WROTE_KEY):
+                    replica = replica_engine()
+                    if replica is not None:
+                        return replica
+            elif kind == 'write':
+                self.info[_WROTE_KEY] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _statement_kind(clause) -> str:
+    """``'read'`` (may use the replica), ``'write'`` (DML/DDL) or ``'other'``."""
+    if isinstance(clause, (sa.Select, sa.CompoundSelect)):
+        return 'read'
+    if isinstance(clause, (sa.sql.dml.UpdateBase, sa.schema.ExecutableDDLElement)):
+        return 'write'
+    if isinstance(clause, sa.TextClause):
+        words = clause.text.split(None, 1)
+        keyword = words[0].upper() if words else ''
+        if keyword == 'SELECT':
+            return 'read'
+        if keyword in WRITE_KEYWORDS:
+            return 'write'
+    return 'other'
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    wrote = session.info.pop(_WROTE_KEY, False)
+    if not wrote or not has_app_context() or replica_engine() is None:
+        return
+    if current_app.config.get('READ_YOUR_WRITES', True):
+        session.info[_TARGET_KEY] = PRIMARY
+    seconds = current_app.config.get('READ_YOUR_WRITES_SECONDS', 0)
+    if seconds and has_request_context():
+        cookie_session[_PIN_KEY] = time.time() + seconds
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+def replica_engine() -> Optional[sa.engine.Engine]:
+    """The current app's replica engine, or ``None`` when not configured."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('read_replica')
+
+
+@contextmanager
+def reads_from(target: str, session=None) -> Iterator[None]:
+    """Send the session's reads to ``target`` (:data:`PRIMARY` or
+    :data:`REPLICA`) inside the block."""
+    if session is None:
+        from .extensions import db
+        session = db.session
+    previous = session.info.get(_TARGET_KEY)
+    session.info[_TARGET_KEY] = target
+    try:
+        yield
+    finally:
+        if previous is None:
+            session.info.pop(_TARGET_KEY, None)
+        else:
+            session.info[_TARGET_KEY] = previous
+
+
+def _replica_url(app: Flask, primary: sa.engine.Engine) -> sa.engine.URL:
+    uri = app.config['READ_REPLICA_URI']
+    if uri != 'readonly':
+        return sa.engine.make_url(uri)
+    if primary.dialect.name != 'sqlite' or not primary.url.database or primary.url.database == ':memory:':
+        raise ValueError("READ_REPLICA_URI='readonly' needs a file-based SQLite primary")
+    path = primary.url.database
+    if path.startswith('file:'):
+        path = path[5:].split('?', 1)[0]
+    return sa.engine.make_url(f'sqlite:///file:{path}?mode=ro&uri=true')
+
+
+def _route_request():
+    from .extensions import db
+    if request.blueprint not in ROUTED_BLUEPRINTS or request.method not in ('GET', 'HEAD'):
+        return
+    if cookie_session.get(_PIN_KEY, 0) > time.time():
+        return
+    db.session.info[_TARGET_KEY] = REPLICA
+
+
+def _reset_route(exc):
+    from .extensions import db
+    db.session.info.pop(_TARGET_KEY, None)
+
+
+def init_app(app: Flask) -> None:
+    """Create the replica engine (if configured) and route GET views to it.
+
+    Must run after ``db.init_app(app)``.
+    """
+    from .extensions import db
+    from . import sqlite_profile
+
+    if not app.config.get('READ_REPLICA_URI'):
+        app.extensions['read_replica'] = None
+        return
+    with app.app_context():
+        primary = db.engine
+    url = _replica_url(app, primary)
+    engine = sa.create_engine(url, **(app.config.get('READ_REPLICA_ENGINE_OPTIONS') or {}))
+    sqlite_profile.attach(app, engine, read_only=url.query.get('mode') == 'ro')
+    app.extensions['read_replica'] = engine
+    app.before_request(_route_request)
+    app.teardown_request(_reset_route)
@@ -0,0 +1,170 @@
+"""Full-text search over items backed by an SQLite FTS5 table.
+
+``item_fts`` holds one row per item (``rowid`` = ``item.id``) with the
+title, description, author names, genre names and CD track list. It is
+maintained by SQLite triggers on ``item``, ``cd``, the association tables
+and ``author``/``genre`` renames, so every write path -- ORM flushes, Core
+bulk inserts and raw SQL -- keeps it current without application code.
+
+The table and triggers are created together with the schema
+(``db.create_all()``) and can be rebuilt with ``flask rebuild-search-index``.
+On other databases search falls back to a ``LIKE`` scan on the title.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import event, text
+
+from .extensions import db
+from .models import Item
+
+FTS_TABLE = 'item_fts'
+
+# bm25 weights for (title, description, authors, genres, tracks)
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 3.0, 1.0)
+
+# every statement that (re)indexes items matching {where} (a condition on
+# item.id); deleting first makes the insert an upsert
+_REINDEX = (
+    f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT item.id FROM item WHERE {{where}});",
+    f"""INSERT INTO {FTS_TABLE}(rowid, title, description, authors, genres, tracks)
+        SELECT item.id, item.title, coalesce(item.description, ''),
+          coalesce((SELECT group_concat(author.name, ' ') FROM item_author
+                    JOIN author ON author.id = item_author.author_id
+                    WHERE item_author.item_id = item.id), ''),
+          coalesce((SELECT group_concat(genre.name, ' ') FROM item_genre
+                    JOIN genre ON genre.id = item_genre.genre_id
+                    WHERE item_genre.item_id = item.id), ''),
+          coalesce((SELECT cd.track_list FROM cd WHERE cd.id = item.id), '')
+        FROM item WHERE {{where}};""",
+)
+
+
+def _reindex_sql(where: str) -> str:
+    return '\n'.join(stmt.format(where=where) for stmt in _REINDEX)
+
+
+def _trigger(name: str, event_sql: str, body: str) -> str:
+    return f'CREATE TRIGGER IF NOT EXISTS {name} {event_sql} BEGIN\n{body}\nEND'
+
+
+_AUTHORS_OF = ("(SELECT coalesce(group_concat(author.name, ' '), '') FROM item_author "
+               "JOIN author ON author.id = item_author.author_id WHERE item_author.item_id = {id})")
+_GENRES_OF = ("(SELECT coalesce(group_concat(genre.name, ' '), '') FROM item_genre "
+              "JOIN genre ON genre.id = item_genre.genre_id WHERE item_genre.item_id = {id})")
+
+
+def _ddl() -> List[str]:
+    """CREATE statements for the FTS table and its sync triggers.
+
+    Inserts and link changes only touch the affected column (a new item has
+    no links or track list yet), which keeps bulk imports cheap; updates of
+    the item row reindex it fully.
+    """
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "title, description, authors, genres, tracks, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        _trigger('item_fts_ai', 'AFTER INSERT ON item',
+                 f"INSERT INTO {FTS_TABLE}(rowid, title, description, authors, genres, tracks) "
+                 "VALUES (NEW.id, NEW.title, coalesce(NEW.description, ''), '', '', '');"),
+        _trigger('item_fts_au', 'AFTER UPDATE OF title, description ON item', _reindex_sql('item.id = NEW.id')),
+        _trigger('item_fts_ad', 'AFTER DELETE ON item', f'DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;'),
+        _trigger('item_fts_cd_ai', 'AFTER INSERT ON cd',
+                 f"UPDATE {FTS_TABLE} SET tracks = coalesce(NEW.track_list, '') WHERE rowid = NEW.id;"),
+        _trigger('item_fts_cd_au', 'AFTER UPDATE OF track_list ON cd',
+                 f"UPDATE {FTS_TABLE} SET tracks = coalesce(NEW.track_list, '') WHERE rowid = NEW.id;"),
+        _trigger('item_fts_ia_ai', 'AFTER INSERT ON item_author',
+                 f"UPDATE {FTS_TABLE} SET authors = {_AUTHORS_OF.format(id='NEW.item_id')} WHERE rowid = NEW.item_id;"),
+        _trigger('item_fts_ia_ad', 'AFTER DELETE ON item_author',
+                 f"UPDATE {FTS_TABLE} SET authors = {_AUTHORS_OF.format(id='OLD.item_id')} WHERE rowid = OLD.item_id;"),
+        _trigger('item_fts_ig_ai', 'AFTER INSERT ON item_genre',
+                 f"UPDATE {FTS_TABLE} SET genres = {_GENRES_OF.format(id='NEW.item_id')} WHERE rowid = NEW.item_id;"),
+        _trigger('item_fts_ig_ad', 'AFTER DELETE ON item_genre',
+                 f"UPDATE {FTS_TABLE} SET genres = {_GENRES_OF.format(id='OLD.item_id')} WHERE rowid = OLD.item_id;"),
+        _trigger('item_fts_author_au', 'AFTER UPDATE OF name ON author',
+                 _reindex_sql('item.id IN (SELECT item_id FROM item_author WHERE author_id = NEW.id)')),
+        _trigger('item_fts_genre_au', 'AFTER UPDATE OF name ON genre',
+                 _reindex_sql('item.id IN (SELECT item_id FROM item_genre WHERE genre_id = NEW.id)')),
+    ]
+
+
+_TRIGGERS = ('item_fts_ai', 'item_fts_au', 'item_fts_ad', 'item_fts_cd_ai', 'item_fts_cd_au',
+             'item_fts_ia_ai', 'item_fts_ia_ad', 'item_fts_ig_ai', 'item_fts_ig_ad',
+             'item_fts_author_au', 'item_fts_genre_au')
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for stmt in _ddl():
+        connection.exec_driver_sql(stmt)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for name in _TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def available(session=None) -> bool:
+    """Whether the FTS index can be used on the current database."""
+    session = session or db.session
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def rebuild(session=None) -> int:
+    """Recreate the FTS table and triggers and reindex every item.
+
+    Returns the number of indexed items. The caller commits.
+    """
+    session = session or db.session
+    conn = session.connection()
+    _drop_search_index(None, conn)
+    _create_search_index(None, conn)
+    for stmt in _REINDEX[1:]:
+        conn.exec_driver_sql(stmt.format(where='1'))
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
+    return conn.exec_driver_sql(f'SELECT count(*) FROM {FTS_TABLE}').scalar()
+
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(q: str) -> str:
+    """Turn free text into an FTS5 query: every word, as a prefix, ANDed.
+
+    Quoting each token neutralises FTS5 operators and column filters in
+    user input; the trailing ``*`` gives search-as-you-type behaviour.
+    """
+    return ' AND '.join(f'"{tok}"*' for tok in _TOKEN_RE.findall(q or ''))
+
+
+def search_items(q: str, limit: int = 20, offset: int = 0, session=None) -> Tuple[List[Dict[str, Any]], bool]:
+    """Return ``(results, has_more)`` for ``q`` ordered by relevance.
+
+    Each result is ``{'id', 'type', 'title', 'score'}``; lower bm25 scores
+    are better matches.
+    """
+    session = session or db.session
+    expr = match_expression(q)
+    if not expr:
+        return [], False
+    if not available(session):
+        rows = session.query(Item.id, Item.type, Item.title).filter(Item.title.ilike(f'%{q}%')) \
+            .order_by(Item.title, Item.id).limit(limit + 1).offset(offset).all()
+        results = [{'id': r.id, 'type': r.type, 'title': r.title, 'score': None} for r in rows]
+    else:
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        sql = text(
+            f'SELECT item.id, item.type, item.title, bm25({FTS_TABLE}, {weights}) AS score '
+            f'FROM {FTS_TABLE} JOIN item ON item.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH :expr ORDER BY score, item.id LIMIT :limit OFFSET :offset'
+        )
+        rows = session.execute(sql, {'expr': expr, 'limit': limit + 1, 'offset': offset})
+        results = [{'id': r.id, 'type': r.type, 'title': r.title, 'score': r.score} for r in rows]
+    return results[:limit], len(results) > limit
@@ -0,0 +1,116 @@
+"""Example and synthetic catalog data.
+
+:func:`seed_examples` adds the one-item-per-type sample used by
+``flask recreate-db --seed``. :func:`generate_records` produces any number
+of realistic item records for :func:`librarymanager.importer.import_records`
+(``flask generate-items``, the benchmarks): the output depends only on
+``count`` and ``seed``, so two runs build identical catalogs.
+"""
+import random
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List
+
+from .extensions import db
+from .models import Author, BoardGame, Book, CD, DVD, Genre
+
+# share of each type in generated catalogs
+TYPE_MIX = (('book', 50), ('cd', 20), ('dvd', 20), ('board_game', 10))
+
+_ADJECTIVES = ('Silent', 'Hidden', 'Broken', 'Golden', 'Last', 'Lost', 'Red', 'Endless', 'Quiet', 'Distant',
+               'Burning', 'Frozen', 'Secret', 'Wild', 'Little', 'Dark', 'Bright', 'Hollow', 'Iron', 'Paper')
+_NOUNS = ('River', 'Kingdom', 'Garden', 'Mirror', 'Voyage', 'Empire', 'Orchard', 'Harbor', 'Winter', 'Machine',
+          'Letter', 'Forest', 'Island', 'Crown', 'Signal', 'Library', 'Shadow', 'Engine', 'Bridge', 'Storm')
+_FIRST = ('Ada', 'Ben', 'Clara', 'Dmitri', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam',
+          'Maya', 'Noor', 'Oskar', 'Priya', 'Quinn', 'Rosa', 'Sven', 'Tara')
+_LAST = ('Abbott', 'Brandt', 'Castillo', 'Dubois', 'Eriksen', 'Fischer', 'Gupta', 'Hale', 'Ito', 'Jansen',
+         'Kowalski', 'Lindqvist', 'Moreau', 'Nakamura', 'Okafor', 'Petrov', 'Quintero', 'Rossi', 'Silva', 'Tanaka')
+_GENRES = ('Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'History', 'Biography', 'Poetry', 'Horror',
+           'Thriller', 'Travel', 'Cooking', 'Jazz', 'Rock', 'Classical', 'Electronic', 'Folk', 'Drama', 'Comedy',
+           'Documentary', 'Animation', 'Strategy', 'Party', 'Cooperative', 'Family', 'Abstract')
+_LANGUAGES = ('en', 'en', 'en', 'de', 'fr', 'es', 'it', 'ja')
+_PUBLISHERS = ('Northwind', 'Bluebird Press', 'Harbor House', 'Meridian', 'Kite & Key', 'Lantern Books')
+
+
+def seed_examples(session=None) -> None:
+    """Add one example item of each type, sharing an author and a genre."""
+    session = session or db.session
+    a1 = Author(name='Sample Author')
+    g1 = Genre(name='Sample Genre')
+    session.add_all([a1, g1])
+    session.flush()
+
+    book = Book(title='Example Book', description='An example', language='en', publisher='ExamplePub', length=123, size='200x130mm')
+    book.authors.append(a1)
+    book.genres.append(g1)
+
+    cd = CD(title='Example CD', description='Sample CD', primary_artist='Sample Artist', publisher='MusicPub', duration_minutes=42, track_list=['Track 1', 'Track 2'])
+    cd.genres.append(g1)
+
+    dvd = DVD(title='Example DVD', description='Sample DVD', director='Jane Doe', main_actors='Actor A, Actor B', genre='Drama', duration_minutes=120)
+    dvd.genres.append(g1)
+
+    bg = BoardGame(title='Example Game', description='Sample board game', author_note='Designer', min_players=2, max_players=4, genre='Family')
+    bg.genres.append(g1)
+
+    session.add_all([book, cd, dvd, bg])
+    session.commit()
+
+
+class _Skewed:
+    """Pick from ``values`` with Zipf-like weights (1/rank): a few names are
+    shared by many items, most by few, as in real catalogs."""
+
+    def __init__(self, values: List[str]):
+        self.values = values
+        self.cum_weights = list(accumulate(1.0 / (i + 1) for i in range(len(values))))
+
+    def pick(self, rng: random.Random, k: int) -> List[str]:
+        total = self.cum_weights[-1]
+        picked = (self.values[bisect(self.cum_weights, rng.random() * total)] for _ in range(k))
+        return list(dict.fromkeys(picked))
+
+
+def _people(count: int) -> List[str]:
+    names = [f'{f} {l}' for l in _LAST for f in _FIRST]
+    return [names[i % len(names)] + (f' {i // len(names) + 1}' if i >= len(names) else '') for i in range(count)]
+
+
+def generate_records(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` deterministic item records of mixed types.
+
+    About one author per five items (at least 400) is drawn with a skewed
+    distribution; items get 1-3 authors and 1-2 genres.
+    """
+    rng = random.Random(seed)
+    people = _Skewed(_people(max(400, count // 5)))
+    genres = _Skewed(list(_GENRES))
+    types = [t for t, _ in TYPE_MIX]
+    type_weights = [w for _, w in TYPE_MIX]
+    for i in range(count):
+        typ = rng.choices(types, type_weights)[0]
+        title = f'{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}'
+        if rng.random() < 0.5:
+            title += f' {rng.randint(1, 999)}'
+        record: Dict[str, Any] = {
+            'type': typ,
+            'title': title,
+            'description': f'{title}: a {typ.replace("_", " ")} from the generated catalog (#{i}).',
+            'genres': genres.pick(rng, rng.randint(1, 2)),
+        }
+        if typ == 'book':
+            record.update(authors=people.pick(rng, rng.randint(1, 3)), language=rng.choice(_LANGUAGES),
+                          publisher=rng.choice(_PUBLISHERS), length=rng.randint(60, 1200))
+        elif typ == 'cd':
+            artist = people.pick(rng, 1)[0]
+            record.update(authors=[artist], primary_artist=artist, publisher=rng.choice(_PUBLISHERS),
+                          duration_minutes=rng.randint(25, 80),
+                          track_list=[f'{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}' for _ in range(rng.randint(8, 14))])
+        elif typ == 'dvd':
+            record.update(director=people.pick(rng, 1)[0], main_actors=', '.join(people.pick(rng, 3)),
+                          genre=record['genres'][0], duration_minutes=rng.randint(80, 180))
+        else:
+            min_players = rng.randint(1, 4)
+            record.update(authors=people.pick(rng, rng.randint(1, 2)), min_players=min_players,
+                          max_players=min_players + rng.randint(0, 6), genre=record['genres'][0])
+        yield record
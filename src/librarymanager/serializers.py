@@ -0,0 +1,186 @@
+"""Schema-driven JSON serialization of items.
+
+A :class:`RowSerializer` is generated once per requested field set from the
+mapper column lists: the ``item`` columns plus, per polymorphic type, the
+columns of its subtype table. It builds one Core ``SELECT`` over ``item``
+outer-joined with the subtype tables it needs, and turns the raw result
+tuples straight into dicts through a per-type list of ``(key, index,
+converter)`` -- no ORM instances, no attribute access, no ``isinstance``
+chain. Author and genre names are fetched with one query each for a whole
+batch of rows, and only when requested.
+
+Sparse fieldsets (``?fields=id,title,authors``) shrink both the output and
+the query: subtype tables without a requested column are not joined.
+
+:func:`dumps` uses ``orjson`` when it is installed (``JSON_BACKEND`` =
+``'auto'``, the default, or ``'orjson'``) and the standard library
+otherwise (``'json'``).
+"""
+import json
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Response, current_app, has_app_context
+from sqlalchemy import select
+
+from .extensions import db
+from .models import Author, Genre, Item, item_author, item_genre
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+item_table = Item.__table__
+
+# polymorphic identity -> subtype table
+SUBTYPE_TABLES = {m.polymorphic_identity: m.local_table for m in Item.__mapper__.self_and_descendants
+                  if m is not Item.__mapper__}
+
+# many-to-many name lists: field -> (association table, fk column, name model)
+NAME_FIELDS = {
+    'authors': (item_author, item_author.c.author_id, Author),
+    'genres': (item_genre, item_genre.c.genre_id, Genre),
+}
+
+# always selected: needed for dispatch (type), keyset cursors (id, title)
+# and ETags (version)
+_KEY_COLUMNS = ('id', 'type', 'title', 'version')
+
+Plan = List[Tuple[str, int, Optional[Callable[[Any], Any]]]]
+
+
+def _converter(column) -> Optional[Callable[[Any], Any]]:
+    if isinstance(column.type, db.Date):
+        return lambda v: v.isoformat() if isinstance(v, date) else v
+    return None
+
+
+def all_fields() -> List[str]:
+    """Every field name an item of some type can have, in output order."""
+    fields = [c.key for c in item_table.columns]
+    for table in SUBTYPE_TABLES.values():
+        fields.extend(c.key for c in table.columns if c.key not in fields)
+    return fields + list(NAME_FIELDS)
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Parse a ``fields`` query argument; ``None`` means all fields.
+
+    Raises ``ValueError`` for unknown field names.
+    """
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in all_fields()]
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+class RowSerializer:
+    """Serializer for one field set (``None`` = every field)."""
+
+    def __init__(self, fields: Optional[Sequence[str]] = None):
+        wanted = set(fields) if fields is not None else None
+
+        def keep(key: str) -> bool:
+            return wanted is None or key in wanted
+
+        self.columns = [c for c in item_table.columns if c.key in _KEY_COLUMNS or keep(c.key)]
+        base_plan: Plan = [(c.key, i, _converter(c)) for i, c in enumerate(self.columns) if keep(c.key)]
+        joined = item_table
+        self.plans: Dict[str, Plan] = {}
+        for identity, table in SUBTYPE_TABLES.items():
+            sub_columns = [c for c in table.columns if c.key != 'id' and keep(c.key)]
+            plan = list(base_plan)
+            if sub_columns:
+                joined = joined.outerjoin(table, table.c.id == item_table.c.id)
+                for c in sub_columns:
+                    plan.append((c.key, len(self.columns), _converter(c)))
+                    self.columns.append(c)
+            self.plans[identity] = plan
+        self.base_plan = base_plan
+        self.from_clause = joined
+        self.name_fields = [f for f in NAME_FIELDS if keep(f)]
+        index = {c.key: i for i, c in enumerate(self.columns) if c.table is item_table}
+        self.id_index, self.type_index = index['id'], index['type']
+        self.title_index, self.version_index = index['title'], index['version']
+
+    def select(self):
+        """``SELECT`` of the needed columns; add filters and ordering on
+        ``Item.__table__`` columns."""
+        return select(*self.columns).select_from(self.from_clause)
+
+    def names(self, ids: Sequence[int], session=None) -> Dict[str, Dict[int, List[str]]]:
+        """``{field: {item id: [names]}}`` for the requested name fields."""
+        session = session or db.session
+        result: Dict[str, Dict[int, List[str]]] = {}
+        for field in self.name_fields:
+            table, fk, model = NAME_FIELDS[field]
+            by_item: Dict[int, List[str]] = {}
+            if ids:
+                rows = session.execute(select(table.c.item_id, model.name).join(model, model.id == fk)
+                                       .where(table.c.item_id.in_(ids)))
+                for item_id, name in rows:
+                    by_item.setdefault(item_id, []).append(name)
+            result[field] = by_item
+        return result
+
+    def serialize_rows(self, rows: Sequence[Sequence[Any]], session=None) -> List[Dict[str, Any]]:
+        """Turn raw rows of :meth:`select` into dicts."""
+        names = self.names([row[self.id_index] for row in rows], session) if self.name_fields else {}
+        out = []
+        for row in rows:
+            plan = self.plans.get(row[self.type_index], self.base_plan)
+            data = {key: (conv(row[i]) if conv else row[i]) for key, i, conv in plan}
+            for field, by_item in names.items():
+                data[field] = by_item.get(row[self.id_index], [])
+            out.append(data)
+        return out
+
+    def serialize_object(self, obj: Item) -> Dict[str, Any]:
+        """Serialize a loaded ORM item with the same plan as raw rows."""
+        data = {}
+        for key, i, conv in self.plans.get(obj.type, self.base_plan):
+            value = getattr(obj, self.columns[i].key)
+            data[key] = conv(value) if conv else value
+        for field in self.name_fields:
+            data[field] = [n.name for n in getattr(obj, field)]
+        return data
+
+
+@lru_cache(maxsize=128)
+def _serializer(fields: Optional[Tuple[str, ...]]) -> RowSerializer:
+    return RowSerializer(fields)
+
+
+def get_serializer(fields: Optional[Iterable[str]] = None) -> RowSerializer:
+    """The cached serializer for ``fields`` (``None`` = all)."""
+    return _serializer(tuple(sorted(fields)) if fields is not None else None)
+
+
+def serialize_item(obj: Item, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    return get_serializer(fields).serialize_object(obj)
+
+
+def _backend() -> str:
+    backend = current_app.config.get('JSON_BACKEND', 'auto') if has_app_context() else 'auto'
+    if backend == 'auto':
+        return 'orjson' if orjson is not None else 'json'
+    if backend == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_BACKEND='orjson' but orjson is not installed")
+    return backend
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode ``obj`` as compact JSON bytes with the configured backend."""
+    if _backend() == 'orjson':
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    """Like ``jsonify`` but encoded with :func:`dumps`."""
+    return Response(dumps(obj), status=status, mimetype='application/json')
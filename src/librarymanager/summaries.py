@@ -0,0 +1,99 @@
+"""Denormalized item summaries for the home page and the listings.
+
+Both pages show a line per item: title, type, the first author (by name),
+a CD's artist, a DVD's director and a board game's player range. Computed
+live that is ``item`` outer-joined to three subtype tables plus a
+correlated lookup through ``item_author``; the ``item_summary`` table holds
+exactly those columns, one row per item, so the pages read one narrow table
+through its ``(type, id)`` and ``(type, title, id)`` indexes. Sorting by a
+field the table lacks (``length``, ``publication_date``) joins its table on
+``id`` (see :class:`librarymanager.pagination.Keyset`).
+
+Like :mod:`librarymanager.facets`, the rows of the items a transaction
+touched (as tracked by :mod:`librarymanager.changes`) are recomputed just
+before it commits, inside the committing transaction: deleted and replaced
+with ``INSERT ... SELECT`` from the live query. ``flask rebuild-summaries``
+recomputes the whole table.
+
+While the table does not exist :func:`summary_select` falls back to the
+live query. A database migrated from before it existed gets it empty: run
+``flask rebuild-summaries`` after ``flask db upgrade``.
+"""
+from typing import Iterable, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, event, func, inspect, select
+
+from .changes import pending_changes
+from .extensions import db
+from .models import Author, BoardGame, CD, DVD, Item, ItemSummary, item_author
+
+summary_table = ItemSummary.__table__
+
+SUMMARY_FIELDS = tuple(c.key for c in summary_table.columns)
+
+# item ids per statement when recomputing summaries
+_BATCH = 500
+
+
+def live_select():
+    """``SELECT`` computing the summary columns from the catalog tables."""
+    item, cd, dvd, game = Item.__table__, CD.__table__, DVD.__table__, BoardGame.__table__
+    author = Author.__table__
+    first_author = (select(func.min(author.c.name))
+                    .join(item_author, item_author.c.author_id == author.c.id)
+                    .where(item_author.c.item_id == item.c.id)
+                    .scalar_subquery())
+    return (select(item.c.id, item.c.type, item.c.title, first_author.label('author'),
+                   cd.c.primary_artist.label('artist'), dvd.c.director, game.c.min_players, game.c.max_players)
+            .select_from(item.outerjoin(cd, cd.c.id == item.c.id)
+                         .outerjoin(dvd, dvd.c.id == item.c.id)
+                         .outerjoin(game, game.c.id == item.c.id)))
+
+
+def update_summaries(connection, ids: Iterable[int]) -> None:
+    """Recompute the rows of ``ids`` (inserted, changed or deleted items)."""
+    ids = sorted(set(ids))
+    item = Item.__table__
+    for start in range(0, len(ids), _BATCH):
+        batch = ids[start:start + _BATCH]
+        connection.execute(delete(summary_table).where(summary_table.c.id.in_(batch)))
+        connection.execute(summary_table.insert().from_select(SUMMARY_FIELDS, live_select().where(item.c.id.in_(batch))))
+
+
+def rebuild_summaries(connection) -> int:
+    """Recompute the whole table; returns the number of rows."""
+    connection.execute(delete(summary_table))
+    connection.execute(summary_table.insert().from_select(SUMMARY_FIELDS, live_select()))
+    return connection.execute(select(func.count()).select_from(summary_table)).scalar()
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def _seed_summaries(target, connection, tables=(), **kw):
+    if summary_table.name in {t.name for t in tables}:
+        rebuild_summaries(connection)
+
+
+def _table_ready(session) -> bool:
+    # cache a positive answer only: the table may be created later on
+    state = current_app.extensions.setdefault('summaries', {})
+    if not state.get('ready'):
+        state['ready'] = inspect(session.connection()).has_table(summary_table.name)
+    return state['ready']
+
+
+@event.listens_for(db.session, 'before_commit')
+def _update_on_commit(session):
+    session.flush()
+    changes = pending_changes(session)
+    if changes and _table_ready(session):
+        update_summaries(session.connection(), changes)
+
+
+def summary_select(session=None) -> Tuple[object, object]:
+    """``(stmt, table)``: a ``SELECT`` of the summary columns and the table
+    whose ``id``/``type`` to filter, order and page it by (``item_summary``,
+    or ``item`` for the live query while the table does not exist)."""
+    if _table_ready(session or db.session):
+        return select(*summary_table.c), summary_table
+    return live_select(), Item.__table__
@@ -0,0 +1,63 @@
+"""Jinja bytecode cache shared by every worker.
+
+Jinja compiles a template to Python source and then to a code object the
+first time a process loads it; the in-memory template cache only helps that
+one process. With ``TEMPLATE_BYTECODE_CACHE`` on (the default) the app's
+environment gets a :class:`jinja2.FileSystemBytecodeCache` in
+``TEMPLATE_CACHE_DIR``: the first load of a template writes its marshalled
+code object there and every later process loads it instead of compiling.
+Without ``TEMPLATE_CACHE_DIR`` it is Jinja's per-user directory under the
+system temp dir (created private to the user), never the source tree or
+the instance folder next to it. Entries carry a checksum of the template
+source, so an edited template is recompiled and its entry replaced; the
+Python version is part of the format, so entries of another interpreter are
+ignored.
+
+``flask precompile-templates`` (see :func:`precompile`) loads every template
+once, which fills the cache at deploy time, before the first request of the
+new release reaches a worker, and fails on template syntax errors.
+"""
+import os
+from typing import Dict, List, Optional
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+
+def cache_dir(app: Flask) -> Optional[str]:
+    """Directory of the app's bytecode cache (``None`` when it is off)."""
+    cache = app.jinja_options.get('bytecode_cache')
+    return cache.directory if cache is not None else None
+
+
+def init_app(app: Flask) -> None:
+    """Give the app's Jinja environment the bytecode cache, if enabled.
+
+    Must run before anything touches ``app.jinja_env`` (template globals and
+    filters create it), since the options are read when it is created.
+    """
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        return
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # directory=None: Jinja's private per-user temp directory
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directory)}
+
+
+def precompile(app: Flask) -> Dict[str, List]:
+    """Load every template of the app and its blueprints once.
+
+    Returns ``{'compiled': [names], 'errors': [(name, message)]}``; loading
+    writes each template to the bytecode cache when it is enabled.
+    """
+    env = app.jinja_env
+    compiled, errors = [], []
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+        except TemplateSyntaxError as e:
+            errors.append((name, f'line {e.lineno}: {e.message}'))
+        else:
+            compiled.append(name)
+    return {'compiled': compiled, 'errors': errors}
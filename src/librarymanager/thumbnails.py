@@ -0,0 +1,188 @@
+"""Fixed-size, content-addressed thumbnails of the locally stored images.
+
+Originals live in the image store of ``librarymanager.images`` under their
+SHA-256 (``item.image_digest``); they come from the ``fetch_image`` job, an
+upload to ``POST /api/items/<id>/image`` or ``flask attach-image``. A
+thumbnail URL names the original's digest, the size and the renderer::
+
+    /thumbs/<digest>-<size>-v<PIPELINE_VERSION>.jpg    rendered by Pillow
+    /thumbs/<digest>-<size>-orig                       the original (no Pillow)
+
+so its content can never change and it is served with ``Cache-Control:
+public, max-age=31536000, immutable``. A new image gets a new digest and
+therefore a new URL; installing Pillow (or bumping the version) changes the
+renderer part, and only names of the current renderer are served.
+
+Thumbnails are rendered lazily on the first request (Pillow, an optional
+dependency) and kept in ``THUMBNAIL_DIR`` (default ``instance/thumbnails``). The directory
+is bounded by ``THUMBNAIL_CACHE_BYTES``: every hit refreshes the file's
+mtime, and a write that pushes the total over budget deletes the least
+recently used files down to 90% of it. Evicted thumbnails are simply
+rendered again when requested.
+"""
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, current_app, url_for
+
+from .images import image_path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: serve originals instead
+    Image = None
+
+# bump when the rendering changes so cached derivatives get new URLs
+PIPELINE_VERSION = 1
+
+# URL name: <sha256>-<size>-v<version>.jpg, or <sha256>-<size>-orig
+NAME_RE = re.compile(r'^([0-9a-f]{64})-([a-z0-9]+)-(?:v(\d+)\.jpg|orig)$')
+
+# seconds browsers and proxies may keep a thumbnail
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def thumbnail_name(digest: str, size: str) -> str:
+    if Image is None:
+        return f'{digest}-{size}-orig'
+    return f'{digest}-{size}-v{PIPELINE_VERSION}.jpg'
+
+
+def parse_name(name: str) -> Optional[Tuple[str, str]]:
+    """``(digest, size)`` of a name of the current renderer, else ``None``."""
+    m = NAME_RE.match(name)
+    if m is None or name != thumbnail_name(m.group(1), m.group(2)):
+        return None
+    return m.group(1), m.group(2)
+
+
+def thumbnail_url(digest: Optional[str], size: str = 'medium') -> Optional[str]:
+    """URL of the ``size`` thumbnail of image ``digest`` (template global)."""
+    if not digest:
+        return None
+    return url_for('thumbnails.thumbnail', name=thumbnail_name(digest, size))
+
+
+def render(data: bytes, box: int) -> bytes:
+    """Scale the image ``data`` to fit a ``box`` x ``box`` square, as JPEG."""
+    with Image.open(io.BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((box, box), Image.Resampling.LANCZOS)
+        if im.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', im.size, 'white')
+            background.paste(im, mask=im.convert('RGBA').getchannel('A'))
+            im = background
+        out = io.BytesIO()
+        im.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+class ThumbnailCache:
+    """Directory of rendered thumbnails with a size budget and LRU
+    eviction by mtime."""
+
+    def __init__(self, directory: str, budget: int):
+        self.directory = directory
+        self.budget = budget
+        self._size: Optional[int] = None  # computed on first write
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of a cached thumbnail, marking it as recently used."""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            existed = os.path.exists(path)
+            os.replace(tmp, path)
+            if self._size is None:
+                self._size = self._scan_size()
+            elif not existed:
+                self._size += len(data)
+            if self._size > self.budget:
+                self._evict(keep=name)
+        return path
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.tmp-'):
+                    yield entry
+
+    def _scan_size(self) -> int:
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path, e.name) for e in self._entries()))
+        total = sum(size for _, size, _, _ in entries)
+        target = int(self.budget * 0.9)
+        for _, size, path, name in entries:
+            if total <= target:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+def get_cache() -> ThumbnailCache:
+    return current_app.extensions['thumbnails']
+
+
+def thumbnail_path(digest: str, size: str) -> Optional[str]:
+    """Path of the ``size`` thumbnail of ``digest``, rendering it if needed.
+
+    ``None`` when the size is unknown, the original is not stored or it
+    cannot be decoded. Without Pillow the original's path is returned.
+    """
+    sizes: Dict[str, int] = current_app.config.get('THUMBNAIL_SIZES') or {}
+    if size not in sizes:
+        return None
+    original = image_path(digest)
+    if not os.path.exists(original):
+        return None
+    if Image is None:
+        return original
+    cache = get_cache()
+    name = thumbnail_name(digest, size)
+    path = cache.get(name)
+    if path is None:
+        started = time.perf_counter()
+        try:
+            with open(original, 'rb') as f:
+                data = render(f.read(), sizes[size])
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            # stored before images were checked, or a format Pillow cannot render
+            current_app.logger.warning('cannot render thumbnail %s: %s', name, e)
+            return None
+        path = cache.put(name, data)
+        current_app.logger.debug('rendered thumbnail %s in %.1f ms', name, (time.perf_counter() - started) * 1000)
+    return path
+
+
+def init_app(app: Flask) -> None:
+    directory = app.config.get('THUMBNAIL_DIR') or os.path.join(app.instance_path, 'thumbnails')
+    app.extensions['thumbnails'] = ThumbnailCache(directory, app.config.get('THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))
+    app.add_template_global(thumbnail_url)
@@ -0,0 +1,135 @@
+"""Monotonic catalog version used for cheap change detection.
+
+``catalog_version`` holds a single counter. Just before a transaction that
+touched items commits (as tracked by :mod:`librarymanager.changes`), the
+counter is incremented and every inserted or updated item is stamped with
+the new value in ``item.version``; deleted items get a row in
+``item_tombstone`` instead. All of these writes happen inside the committing
+transaction, so readers never see a version without its changes.
+
+The counter gives API clients an ``ETag`` that can be validated with one
+primary-key read of a one-row table instead of querying the item tables,
+and ``(version, id)`` orders the change feed (:func:`changes_since`).
+
+SQLite serialises writers, so versions become visible in increasing order
+and a feed reader never skips a version that commits later.
+"""
+import hashlib
+import heapq
+from itertools import islice
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, insert, select, tuple_, update
+
+from .changes import pending_changes
+from .extensions import db
+from .loading import item_query
+from .models import CatalogVersion, Item, ItemTombstone
+
+version_table = CatalogVersion.__table__
+
+_ROW_ID = 1
+
+
+@event.listens_for(version_table, 'after_create')
+def _seed_version(target, connection, **kw):
+    connection.execute(version_table.insert().values(id=_ROW_ID, version=0))
+
+
+@event.listens_for(db.session, 'before_commit')
+def _bump_version(session):
+    # flush first so ORM changes are part of the change set
+    session.flush()
+    changes = pending_changes(session)
+    if not changes:
+        return
+    version = session.execute(
+        update(version_table).where(version_table.c.id == _ROW_ID)
+        .values(version=version_table.c.version + 1).returning(version_table.c.version)
+    ).scalar()
+    if version is None:
+        # table created without its seed row (e.g. by hand): start counting
+        version = 1
+        session.execute(version_table.insert().values(id=_ROW_ID, version=version))
+    live = [item_id for item_id, (_, op) in changes.items() if op != 'delete']
+    dead = [(item_id, typ) for item_id, (typ, op) in changes.items() if op == 'delete']
+    tombstones = ItemTombstone.__table__
+    if live:
+        item_table = Item.__table__
+        session.execute(update(item_table).where(item_table.c.id.in_(live)).values(version=version))
+        # SQLite may hand the id of a deleted item to a new one
+        session.execute(delete(tombstones).where(tombstones.c.id.in_(live)))
+    if dead:
+        session.execute(delete(tombstones).where(tombstones.c.id.in_([item_id for item_id, _ in dead])))
+        session.execute(insert(tombstones), [{'id': item_id, 'type': typ, 'version': version} for item_id, typ in dead])
+    session.info['catalog_version'] = version
+
+
+def current_version(session=None) -> int:
+    """Return the committed catalog version (0 for a fresh catalog)."""
+    session = session or db.session
+    return session.execute(select(version_table.c.version).where(version_table.c.id == _ROW_ID)).scalar() or 0
+
+
+def catalog_etag(version: int, variant: str = '') -> str:
+    """ETag value for a catalog-wide representation.
+
+    ``variant`` distinguishes representations of the same version (query
+    string, negotiated format) so they never share a validator.
+    """
+    digest = hashlib.md5(variant.encode()).hexdigest()[:8]
+    return f'catalog-{version}-{digest}'
+
+
+def item_etag(item_id: int, version: int, fields: Optional[Iterable[str]] = None) -> str:
+    """ETag value for a single item at ``version``.
+
+    A ``fields`` subset (``?fields=``) is a different representation, so its
+    ETag carries a digest of the (order-independent) field set.
+    """
+    return f'item-{item_id}-{version}{_fields_suffix(fields)}'
+
+
+def _fields_suffix(fields: Optional[Iterable[str]]) -> str:
+    if fields is None:
+        return ''
+    return '-' + hashlib.md5(','.join(sorted(fields)).encode()).hexdigest()[:8]
+
+
+def parse_item_etag(value: str, item_id: int, fields: Optional[Iterable[str]] = None) -> Optional[int]:
+    """Return the version encoded in an :func:`item_etag` for ``item_id``
+    and ``fields``; ``None`` for ETags of other items or field sets."""
+    prefix, suffix = f'item-{item_id}-', _fields_suffix(fields)
+    if not value.startswith(prefix) or not value.endswith(suffix):
+        return None
+    try:
+        return int(value[len(prefix):len(value) - len(suffix)])
+    except ValueError:
+        return None
+
+
+# a position in the change feed: everything up to and including it was seen
+FeedPosition = Tuple[int, int]
+
+
+def changes_since(since: FeedPosition, limit: int, session=None) -> Tuple[List[Tuple[str, int, int, Any]], bool]:
+    """Return ``(changes, has_more)``: up to ``limit`` changes after ``since``.
+
+    Each change is ``(op, id, version, obj)`` with ``op`` ``'upsert'`` (``obj``
+    is the item, relations loaded) or ``'delete'`` (``obj`` the tombstone),
+    ordered by ``(version, id)``. Items and tombstones are read with one
+    keyset query each on their ``(version, id)`` index and merged.
+    """
+    session = session or db.session
+    item_key = tuple_(Item.version, Item.id)
+    items = item_query().filter(item_key > since).order_by(Item.version, Item.id).limit(limit + 1).all()
+    tomb_key = tuple_(ItemTombstone.version, ItemTombstone.id)
+    tombs = session.query(ItemTombstone).filter(tomb_key > since) \
+        .order_by(ItemTombstone.version, ItemTombstone.id).limit(limit + 1).all()
+    merged = heapq.merge(
+        (('upsert', it.id, it.version, it) for it in items),
+        (('delete', t.id, t.version, t) for t in tombs),
+        key=lambda change: (change[2], change[1]),
+    )
+    changes = list(islice(merged, limit + 1))
+    return changes[:limit], len(changes) > limit
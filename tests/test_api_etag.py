@@ -0,0 +1,133 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.importer import import_records
+from librarymanager.models import Book, Item
+from librarymanager.versioning import current_version
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def _statements(app):
+    seen = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    return seen, before_cursor_execute
+
+
+def test_version_bumps_only_on_committed_item_changes(app):
+    assert current_version() == 0
+    book = Book(title='One', language='en')
+    db.session.add(book)
+    db.session.commit()
+    assert current_version() == 1
+    assert book.version == 1
+
+    # a commit without item changes leaves the version alone
+    db.session.commit()
+    assert current_version() == 1
+
+    book.title = 'Two'
+    db.session.flush()
+    db.session.rollback()
+    assert current_version() == 1
+
+    import_records([{'type': 'book', 'title': 'Bulk', 'language': 'en', 'authors': ['A']}])
+    assert current_version() == 2
+    assert db.session.query(Item.version).filter(Item.title == 'Bulk').scalar() == 2
+    assert db.session.get(Book, book.id).version == 1
+
+    db.session.delete(db.session.get(Book, book.id))
+    db.session.commit()
+    assert current_version() == 3
+
+
+def test_list_304_does_not_touch_item_tables(app):
+    client = app.test_client()
+    client.post('/api/items', json={'type': 'book', 'title': 'A', 'language': 'en'})
+    resp = client.get('/api/items?limit=10')
+    etag = resp.headers['ETag']
+    assert resp.status_code == 200 and etag
+
+    # other representations get other validators
+    assert client.get('/api/items?limit=5').headers['ETag'] != etag
+    assert client.get('/api/items?limit=10&format=ndjson').headers['ETag'] != etag
+
+    seen, listener = _statements(app)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        resp = client.get('/api/items?limit=10', headers={'If-None-Match': etag})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+    assert seen and not any(' item' in s.lower().split('from', 1)[-1] for s in seen)
+
+    client.post('/api/items', json={'type': 'book', 'title': 'B', 'language': 'en'})
+    resp = client.get('/api/items?limit=10', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert len(resp.get_json()['items']) == 2
+
+
+def test_item_etag_survives_unrelated_changes(app):
+    client = app.test_client()
+    item_id = client.post('/api/items', json={'type': 'book', 'title': 'A', 'language': 'en'}).get_json()['id']
+    resp = client.get(f'/api/items/{item_id}')
+    etag = resp.headers['ETag']
+    assert resp.get_json()['title'] == 'A'
+    assert client.get(f'/api/items/{item_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # another item changing bumps the catalog but not this item's ETag
+    client.post('/api/items', json={'type': 'book', 'title': 'B', 'language': 'en'})
+    assert client.get(f'/api/items/{item_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    book = db.session.get(Book, item_id)
+    book.title = 'A2'
+    db.session.commit()
+    resp = client.get(f'/api/items/{item_id}', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.get_json()['title'] == 'A2'
+    assert resp.headers['ETag'] != etag
+
+    assert client.get('/api/items/999999').status_code == 404
+
+
+def test_item_etag_depends_on_the_field_set(app):
+    client = app.test_client()
+    item_id = client.post('/api/items', json={'type': 'book', 'title': 'A', 'language': 'en'}).get_json()['id']
+    partial = client.get(f'/api/items/{item_id}?fields=id')
+    assert partial.get_json() == {'id': item_id}
+    full = client.get(f'/api/items/{item_id}', headers={'If-None-Match': partial.headers['ETag']})
+    assert full.status_code == 200 and full.get_json()['title'] == 'A'
+    assert full.headers['ETag'] != partial.headers['ETag']
+    # the same field set in another order is the same representation
+    resp = client.get(f'/api/items/{item_id}?fields=title,id')
+    again = client.get(f'/api/items/{item_id}?fields=id,title', headers={'If-None-Match': resp.headers['ETag']})
+    assert again.status_code == 304
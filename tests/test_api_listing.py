@@ -0,0 +1,96 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Author, Book, Genre
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        author = Author(name='Shared Author')
+        genre = Genre(name='Shared Genre')
+        for i in range(25):
+            b = Book(title=f'Book {i:02d}', language='en')
+            b.authors.append(author)
+            b.genres.append(genre)
+            db.session.add(b)
+        db.session.commit()
+        yield app
+
+
+def _count_queries(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_keyset_pages_cover_catalog(app):
+    client = app.test_client()
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 10, 'sort': 'title', 'order': 'desc'}
+        if cursor:
+            params['cursor'] = cursor
+        r = client.get('/api/items', query_string=params)
+        assert r.status_code == 200
+        data = r.get_json()
+        seen.extend(it['title'] for it in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert seen == [f'Book {i:02d}' for i in reversed(range(25))]
+
+
+def test_invalid_cursor_is_rejected(app):
+    r = app.test_client().get('/api/items?cursor=not-a-cursor')
+    assert r.status_code == 400
+    assert 'error' in r.get_json()
+
+
+def test_ndjson_stream(app):
+    r = app.test_client().get('/api/items?format=ndjson')
+    assert r.status_code == 200
+    assert r.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert len(rows) == 25
+    assert rows[0]['authors'] == ['Shared Author']
+
+
+def test_relations_loaded_in_bulk(app):
+    client = app.test_client()
+    statements, stop = _count_queries(app)
+    try:
+        r = client.get('/api/items?limit=25')
+    finally:
+        stop()
+    assert len(r.get_json()['items']) == 25
+    # one page query plus one batch per relation, independent of page size
+    assert sum('author' in s and 'item_author' in s for s in statements) == 1
+    assert sum('genre' in s and 'item_genre' in s for s in statements) == 1
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+pytest.importorskip('aiosqlite')
+
+from librarymanager import create_app, create_asgi_app
+from librarymanager.changes import items_committed
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book, Item
+
+
+@pytest.fixture
+def config():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        API_STREAM_BATCH_SIZE = 3
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        for i in range(7):
+            db.session.add(Book(title=f'Book {i}', language='en'))
+        db.session.commit()
+    return TestConfig
+
+
+def call(app, method, path, query='', body=None, headers=()):
+    """Run one request through the ASGI app; return (status, headers, body)."""
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(k.lower().encode(), v.encode()) for k, v in headers]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    return (start['status'], {k.decode(): v.decode() for k, v in start['headers']},
+            b''.join(m.get('body', b'') for m in messages[1:]))
+
+
+def test_pages_and_stream_match_the_wsgi_api(config):
+    app = create_asgi_app(config)
+    client = create_app(config).test_client()
+
+    status, headers, body = call(app, 'GET', '/api/items', 'limit=4&sort=title')
+    assert status == 200
+    page = json.loads(body)
+    assert page == client.get('/api/items?limit=4&sort=title').get_json()
+
+    # streamed in batches of 3 but one valid document
+    status, headers, body = call(app, 'GET', '/api/items')
+    assert [it['title'] for it in json.loads(body)] == [f'Book {i}' for i in range(7)]
+    status, headers, body = call(app, 'GET', '/api/items', 'format=ndjson')
+    assert headers['content-type'] == 'application/x-ndjson'
+    assert len(body.decode().splitlines()) == 7
+
+    assert call(app, 'GET', '/api/items', 'sort=bogus')[0] == 400
+    assert call(app, 'GET', '/api/items', 'cursor=bad')[0] == 400
+    assert call(app, 'GET', '/nope')[0] == 404
+
+
+def test_etags_and_item_resource(config):
+    app = create_asgi_app(config)
+    status, headers, body = call(app, 'GET', '/api/items', 'limit=2')
+    etag = headers['etag']
+    assert call(app, 'GET', '/api/items', 'limit=2', headers=[('If-None-Match', etag)])[0] == 304
+
+    item_id = json.loads(body)['items'][0]['id']
+    status, headers, body = call(app, 'GET', f'/api/items/{item_id}')
+    assert status == 200 and json.loads(body)['title'] == 'Book 0'
+    assert call(app, 'GET', f'/api/items/{item_id}', headers=[('If-None-Match', headers['etag'])])[0] == 304
+    # a fields= subset has its own ETag
+    status, partial, body = call(app, 'GET', f'/api/items/{item_id}', 'fields=id')
+    assert json.loads(body) == {'id': item_id} and partial['etag'] != headers['etag']
+    assert call(app, 'GET', f'/api/items/{item_id}', headers=[('If-None-Match', partial['etag'])])[0] == 200
+    assert call(app, 'GET', '/api/items/99999')[0] == 404
+
+
+def test_create_runs_the_shared_write_hooks(config):
+    app = create_asgi_app(config)
+    received = []
+
+    def on_commit(sender, changes, **kw):
+        received.append(changes)
+
+    items_committed.connect(on_commit)
+    try:
+        status, headers, body = call(app, 'POST', '/api/items', body={'type': 'cd', 'title': 'Async CD', 'primary_artist': 'A', 'authors': ['X'], 'genres': ['Jazz']})
+    finally:
+        items_committed.disconnect(on_commit)
+    assert status == 201
+    created = json.loads(body)
+    assert created['authors'] == ['X']
+    assert received == [{created['id']: ('cd', 'insert')}]
+
+    with create_app(config).app_context():
+        cd = db.session.get(Item, created['id'])
+        assert cd.version > 0
+        assert [a.name for a in cd.authors] == ['X']
+
+    assert call(app, 'POST', '/api/items', body={'type': 'cd', 'title': 'No artist'})[0] == 400
+    # both APIs validate through the same function
+    client = create_app(config).test_client()
+    for bad in ([1, 2], {'type': 'book', 'title': 'T', 'language': 'en', 'authors': 5}):
+        status, headers, body = call(app, 'POST', '/api/items', body=bad)
+        resp = client.post('/api/items', json=bad)
+        assert status == resp.status_code == 400 and json.loads(body) == resp.get_json()
+
+
+def test_type_and_facet_filters_match_the_wsgi_api(config):
+    app = create_asgi_app(config)
+    client = create_app(config).test_client()
+    call(app, 'POST', '/api/items', body={'type': 'cd', 'title': 'Jazz CD', 'primary_artist': 'A', 'genres': ['Jazz']})
+    call(app, 'POST', '/api/items', body={'type': 'book', 'title': 'Jazz book', 'language': 'fr', 'genres': ['Jazz']})
+
+    for query in ('type=cd&limit=10', 'genre=Jazz&limit=10', 'type=book&genre=Jazz&limit=10', 'language=fr&limit=10'):
+        status, headers, body = call(app, 'GET', '/api/items', query)
+        assert status == 200
+        assert json.loads(body) == client.get(f'/api/items?{query}').get_json()
+    status, headers, body = call(app, 'GET', '/api/items', 'genre=Jazz')
+    assert sorted(it['title'] for it in json.loads(body)) == ['Jazz CD', 'Jazz book']
+    status, headers, body = call(app, 'GET', '/api/items', 'type=cd&limit=10')
+    assert [it['title'] for it in json.loads(body)['items']] == ['Jazz CD']
+    assert call(app, 'GET', '/api/items', 'type=bogus')[0] == 400
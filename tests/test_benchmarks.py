@@ -0,0 +1,45 @@
+import json
+import sys
+from pathlib import Path
+
+# make src and the benchmarks package importable
+ROOT = Path(__file__).resolve().parents[1]
+for path in (str(ROOT / 'src'), str(ROOT)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks import run
+from librarymanager.seed import generate_records
+
+
+def test_generator_is_deterministic():
+    first = list(generate_records(200, seed=7))
+    assert first == list(generate_records(200, seed=7))
+    assert first != list(generate_records(200, seed=8))
+    assert {r['type'] for r in first} == {'book', 'cd', 'dvd', 'board_game'}
+    assert all(r['authors'] for r in first if r['type'] == 'book')
+    # skewed fan-out: the most common author appears on many items
+    counts = {}
+    for r in first:
+        for a in r.get('authors', []):
+            counts[a] = counts.get(a, 0) + 1
+    assert max(counts.values()) >= 10
+
+
+def test_run_and_compare(tmp_path):
+    out = tmp_path / 'bench.json'
+    args = ['--size', '300', '--repeat', '2', '--warmup', '0', '--quiet', '--data-dir', str(tmp_path / 'data')]
+    assert run.main(args + ['--output', str(out)]) == 0
+    report = json.loads(out.read_text())
+    results = report['results']
+    assert report['meta']['size'] == 300
+    for name in ('items_by_type/title/desc', 'list_items/id', 'item_detail', 'create_item', 'edit_item'):
+        assert results[name]['median_ms'] > 0
+
+    # an impossibly fast baseline with fewer queries is reported as a regression
+    fast = {'meta': report['meta'], 'results': {k: dict(v, median_ms=v['median_ms'] / 100, queries=v['queries'] - 1)
+                                                for k, v in results.items()}}
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(fast))
+    assert run.main(args + ['--output', str(tmp_path / 'again.json'), '--baseline', str(baseline), '--only', 'item_detail']) == 1
+    assert run.compare(results, results, 0.25) == []
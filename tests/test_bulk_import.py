@@ -0,0 +1,83 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Author, Book, BoardGame, CD, Item
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_bulk_endpoint_json(app):
+    payload = [
+        {'type': 'book', 'title': f'Book {i}', 'language': 'en', 'authors': ['A', 'B'], 'genres': ['Fiction']}
+        for i in range(25)
+    ]
+    payload.append({'type': 'cd', 'title': 'Album', 'artist': 'Artist', 'track_list': ['x', 'y'], 'authors': ['A']})
+    # invalid rows are skipped and reported
+    payload.append({'type': 'spaceship', 'title': 'Nope'})
+    payload.append({'type': 'book', 'title': 'No language'})
+
+    r = app.test_client().post('/api/items/bulk?chunk_size=10', json=payload)
+    assert r.status_code == 201
+    stats = r.get_json()
+    assert stats['imported'] == 26
+    assert len(stats['errors']) == 2
+    assert 'items_per_second' in stats
+
+    assert Book.query.count() == 25
+    assert Author.query.count() == 2
+    cd = CD.query.one()
+    assert cd.primary_artist == 'Artist'
+    assert cd.track_list == ['x', 'y']
+    assert [a.name for a in cd.authors] == ['A']
+    assert sorted(a.name for a in Book.query.first().authors) == ['A', 'B']
+
+
+def test_bulk_endpoint_ndjson_and_csv(app):
+    client = app.test_client()
+    lines = '\n'.join(json.dumps({'type': 'dvd', 'title': f'Movie {i}', 'director': 'D'}) for i in range(5))
+    r = client.post('/api/items/bulk', data=lines, content_type='application/x-ndjson')
+    assert r.status_code == 201
+    assert r.get_json()['imported'] == 5
+
+    csv_body = 'type,title,min_players,max_players,author,genres\nboardgame,Game,2,4,Designer,Strategy;Family\n'
+    r = client.post('/api/items/bulk', data=csv_body, content_type='text/csv')
+    assert r.status_code == 201
+    game = BoardGame.query.one()
+    assert (game.min_players, game.max_players, game.author_note) == (2, 4, 'Designer')
+    assert sorted(g.name for g in game.genres) == ['Family', 'Strategy']
+    assert Item.query.count() == 6
+
+
+def test_import_items_cli(app, tmp_path):
+    path = tmp_path / 'items.jsonl'
+    path.write_text('\n'.join(json.dumps({'type': 'book', 'title': f'B{i}', 'language': 'en'}) for i in range(7)))
+    result = app.test_cli_runner().invoke(args=['import-items', str(path), '--chunk-size', '3'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 7 items' in result.output
+    assert 'items/s' in result.output
+    assert Book.query.count() == 7
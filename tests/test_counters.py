@@ -0,0 +1,85 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.counters import item_count
+from librarymanager.extensions import db
+from librarymanager.models import Book, CD, ItemTypeCount
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        ITEM_COUNT_APPROX_LIMIT = 3
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_counts_follow_orm_and_bulk_writes(app):
+    assert item_count('book') == (0, True)
+    db.session.add_all([Book(title=f'B{i}', language='en') for i in range(4)] + [CD(title='C', primary_artist='A')])
+    db.session.commit()
+    assert item_count('book') == (4, True)
+    assert item_count('cd') == (1, True)
+
+    db.session.delete(Book.query.first())
+    db.session.commit()
+    assert item_count('book') == (3, True)
+
+    # rolled back inserts are not counted
+    db.session.add(Book(title='Gone', language='en'))
+    db.session.flush()
+    db.session.rollback()
+    assert item_count('book') == (3, True)
+
+    app.test_client().post('/api/items/bulk', json=[{'type': 'cd', 'title': f'C{i}', 'artist': 'A'} for i in range(5)])
+    assert item_count('cd') == (6, True)
+
+
+def test_listing_reads_counter_not_item_table(app):
+    db.session.add_all([Book(title=f'B{i}', language='en') for i in range(2)])
+    db.session.commit()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        body = app.test_client().get('/items/type/book').get_data(as_text=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert 'of 2 total' in body
+    assert not any('count(' in s.lower() for s in statements)
+
+
+def test_fallback_and_rebuild(app):
+    db.session.add_all([Book(title=f'B{i}', language='en') for i in range(5)])
+    db.session.commit()
+    ItemTypeCount.query.delete()
+    db.session.commit()
+    # no counter row: bounded approximate count
+    assert item_count('book') == (3, False)
+    assert 'of 3+ total' in app.test_client().get('/items/type/book').get_data(as_text=True)
+
+    result = app.test_cli_runner().invoke(args=['rebuild-counts'])
+    assert 'book: 5' in result.output
+    assert item_count('book') == (5, True)
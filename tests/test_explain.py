@@ -0,0 +1,61 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.explain import explain_hot_queries, is_full_scan
+from librarymanager.extensions import db
+from librarymanager.models import Book
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        ITEMS_PER_PAGE = 2
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Book(title=f'Book {i}', language='en') for i in range(5)])
+        db.session.commit()
+        yield app
+
+
+def test_is_full_scan():
+    assert is_full_scan('SCAN item', 'SELECT * FROM item WHERE item.type = ?')
+    assert is_full_scan('SCAN item', 'SELECT * FROM item')
+    # bounded rowid-order scan stops after LIMIT rows
+    assert not is_full_scan('SCAN item', 'SELECT * FROM item ORDER BY item.id DESC LIMIT ?')
+    assert is_full_scan('SCAN item', 'SELECT * FROM item ORDER BY title LIMIT ?', ['SCAN item', 'USE TEMP B-TREE FOR ORDER BY'])
+    assert not is_full_scan('SCAN item USING INDEX ix_item_title_id', 'SELECT * FROM item WHERE 1')
+    assert not is_full_scan('SEARCH item USING INDEX ix_item_type_id (type=?)', 'SELECT * FROM item WHERE type = ?')
+    # the rows of a LIMITed subquery
+    assert not is_full_scan('SCAN anon_1', 'SELECT * FROM (SELECT * FROM facet_count WHERE type = ? LIMIT ?) AS anon_1',
+                            ['CO-ROUTINE anon_1', 'SEARCH facet_count USING COVERING INDEX ix_facet_count_rank (type=?)', 'SCAN anon_1'])
+
+
+def test_hot_queries_use_indexes(app):
+    report = explain_hot_queries(app)
+    pages = {r['page'] for r in report}
+    assert {'list books by title', 'api page by title', 'item detail'} <= pages
+    assert [r for r in report if r['full_scans']] == []
+
+
+def test_explain_queries_cli(app):
+    result = app.test_cli_runner().invoke(args=['explain-queries', '-v'])
+    assert result.exit_code == 0, result.output
+    assert 'ix_item_summary_type_title_id' in result.output
+    assert '0 with full table scans' in result.output
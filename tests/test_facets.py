@@ -0,0 +1,151 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, select
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.facets import facet_counts, rebuild_facets
+from librarymanager.importer import import_records
+from librarymanager.models import BoardGame, Book, FacetCount, ItemFacet
+from librarymanager.resolver import set_item_names
+from librarymanager.seed import generate_records
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        ITEMS_PER_PAGE = 3
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def _snapshot():
+    facets = sorted(db.session.execute(select(ItemFacet.item_id, ItemFacet.facet, ItemFacet.value, ItemFacet.type)).all())
+    counts = sorted(db.session.execute(select(FacetCount.type, FacetCount.facet, FacetCount.value, FacetCount.count)).all())
+    return facets, counts
+
+
+def _assert_matches_rebuild():
+    maintained = _snapshot()
+    rebuild_facets(db.session.connection())
+    assert _snapshot() == maintained
+    db.session.rollback()
+
+
+def test_counts_follow_writes(app):
+    client = app.test_client()
+    client.post('/api/items', json={'type': 'book', 'title': 'A', 'language': 'en', 'authors': ['Ann'], 'genres': ['Poetry']})
+    client.post('/api/items', json={'type': 'book', 'title': 'B', 'language': 'de', 'authors': ['Ann', 'Bob'], 'genres': ['Poetry']})
+    db.session.add(BoardGame(title='G', min_players=2, max_players=4))
+    db.session.commit()
+    facets, matching = facet_counts('book')
+    assert matching is None
+    assert facets['author'] == [('Ann', 2), ('Bob', 1)]
+    assert facets['language'] == [('de', 1), ('en', 1)]
+    assert facet_counts('board_game')[0] == {'players': [('2', 1), ('3', 1), ('4', 1)]}
+    assert dict(facet_counts()[0]['type']) == {'book': 2, 'board_game': 1}
+    _assert_matches_rebuild()
+
+    # replaced names, deletes and rolled back writes
+    book = Book.query.filter_by(title='B').one()
+    set_item_names(book, ['Cat'], [], replace=True)
+    db.session.commit()
+    db.session.delete(Book.query.filter_by(title='A').one())
+    db.session.commit()
+    db.session.add(Book(title='Gone', language='fr'))
+    db.session.flush()
+    db.session.rollback()
+    facets = facet_counts('book')[0]
+    assert facets == {'author': [('Cat', 1)], 'language': [('de', 1)]}
+    _assert_matches_rebuild()
+
+    import_records(generate_records(60, seed=2), chunk_size=25)
+    _assert_matches_rebuild()
+
+
+def test_api_filters_compose_with_keyset_pages(app):
+    import_records(generate_records(200, seed=4))
+    client = app.test_client()
+    data = client.get('/api/items/facets?type=book').get_json()
+    genre = data['facets']['genre'][0]['value']
+    language = data['facets']['language'][0]['value']
+
+    filtered = client.get(f'/api/items/facets?type=book&genre={genre}&language={language}').get_json()
+    expected = sorted(it['id'] for it in client.get('/api/items').get_json()
+                      if it['type'] == 'book' and genre in it['genres'] and it['language'] == language)
+    assert filtered['matching'] == len(expected) > 0
+    assert dict(v.values() for v in filtered['facets']['language']) == {language: len(expected)}
+
+    for sort in ('id', 'title'):
+        seen, cursor = [], None
+        while True:
+            url = f'/api/items?type=book&genre={genre}&language={language}&limit=4&sort={sort}'
+            page = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+            seen += [it['id'] for it in page['items']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert sorted(seen) == expected and len(seen) == len(set(seen))
+
+    assert client.get('/api/items/facets?type=spaceship').status_code == 400
+
+
+def test_unfiltered_counts_read_the_aggregate(app):
+    import_records(generate_records(50, seed=1))
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert app.test_client().get('/items/type/book').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert any('facet_count' in s for s in statements)
+    assert not any('GROUP BY' in s for s in statements)
+
+
+def test_listing_page_links_keep_filters(app):
+    for i in range(7):
+        db.session.add(Book(title=f'Book {i}', language='en' if i % 2 == 0 else 'de'))
+    db.session.commit()
+    client = app.test_client()
+    html = client.get('/items/type/book').get_data(as_text=True)
+    assert 'language=en' in html and '(4)' in html
+
+    html = client.get('/items/type/book?language=en&sort=title').get_data(as_text=True)
+    assert 'Filtered by' in html and 'Book 1' not in html
+    assert 'of 4 total' in html
+    # the next page link carries the filter and the following page shows the rest
+    assert 'rel="next"' in html
+    next_url = html.split('rel="next"')[0].rsplit('href="', 1)[1].split('"')[0].replace('&amp;', '&')
+    assert 'language=en' in next_url
+    assert 'Book 6' in client.get(next_url).get_data(as_text=True)
+
+
+def test_rebuild_command(app):
+    import_records(generate_records(30, seed=5))
+    db.session.execute(ItemFacet.__table__.delete())
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['rebuild-facets'])
+    assert result.exit_code == 0, result.output
+    assert 'of 30 items' in result.output
+    _assert_matches_rebuild()
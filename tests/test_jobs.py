@@ -0,0 +1,258 @@
+import hashlib
+import socket
+import sys
+import tempfile
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager import images
+from librarymanager.images import RefusedURL, download, image_path
+from librarymanager.importer import import_records
+from librarymanager.jobs import TASKS, Worker, enqueue, job_stats, render_job_metrics, task
+from librarymanager.models import Book, Job
+
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _png(grey: int) -> bytes:
+    """A valid 1x1 grey PNG (downloads are decoded when Pillow is installed)."""
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0))
+            + _chunk(b'IDAT', zlib.compress(bytes([0, grey]))) + _chunk(b'IEND', b''))
+
+
+PNG = _png(0x80)
+
+CALLS = []
+SERVED = []
+
+
+@task('test_flaky', max_attempts=2)
+def flaky(fail: bool = True):
+    CALLS.append(fail)
+    if fail:
+        raise RuntimeError('boom')
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+    image_dir = tempfile.mkdtemp()
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        IMAGE_DIR = image_dir
+        IMAGE_FETCH_ALLOW_PRIVATE = True  # image_server listens on loopback
+        METRICS_ENABLED = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+    CALLS.clear()
+    SERVED.clear()
+
+
+@pytest.fixture
+def image_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            SERVED.append(self.path)
+            if self.path == '/redirect.png':
+                self.send_response(302)
+                self.send_header('Location', f'http://127.0.0.2:{self.server.server_port}/cover.png')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.path.endswith('.png'):
+                body, ctype = PNG, 'image/png'
+            else:
+                body, ctype = b'<html></html>', 'text/html'
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def _jobs():
+    db.session.expire_all()
+    return Job.query.order_by(Job.id).all()
+
+
+def test_create_queues_image_fetch_and_worker_stores_it(app, image_server):
+    resp = app.test_client().post('/api/items', json={'type': 'book', 'title': 'Pic', 'language': 'en',
+                                                      'image_url': f'{image_server}/cover.png'})
+    assert resp.status_code == 201
+    item_id = resp.get_json()['id']
+    [job] = _jobs()
+    assert (job.task, job.status, job.payload) == ('fetch_image', 'queued', {'item_id': item_id, 'url': f'{image_server}/cover.png'})
+    assert db.session.get(Book, item_id).image_digest is None
+
+    assert Worker(app).run(burst=True) == 1
+    [job] = _jobs()
+    assert job.status == 'done' and job.attempts == 1 and job.finished_at >= job.started_at
+    digest = db.session.get(Book, item_id).image_digest
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    assert Path(image_path(digest)).read_bytes() == PNG
+
+
+def test_only_url_changes_queue_fetches(app, image_server):
+    book = Book(title='B', language='en', image_url=f'{image_server}/a.png')
+    db.session.add(book)
+    db.session.commit()
+    Worker(app).run(burst=True)
+    assert book.image_digest is not None
+
+    book.title = 'Renamed'
+    book.image_url = f'{image_server}/a.png'
+    db.session.commit()
+    assert len(_jobs()) == 1
+
+    book.image_url = f'{image_server}/b.png'
+    db.session.commit()
+    assert book.image_digest is None
+    assert [j.status for j in _jobs()] == ['done', 'queued']
+
+    import_records([{'type': 'book', 'title': 'Imported', 'language': 'en', 'image_url': f'{image_server}/c.png'},
+                    {'type': 'book', 'title': 'No image', 'language': 'en'}])
+    assert [j.payload['url'] for j in _jobs()][-1].endswith('/c.png')
+    assert len(_jobs()) == 3
+
+
+def test_upload_wins_over_a_pending_fetch(app, image_server):
+    book = Book(title='B', language='en', image_url=f'{image_server}/a.png')
+    db.session.add(book)
+    db.session.commit()
+    uploaded = _png(0x10)
+    assert app.test_client().post(f'/api/items/{book.id}/image', data=uploaded).status_code == 201
+    assert Worker(app).run(burst=True) == 1
+    db.session.expire_all()
+    assert db.session.get(Book, book.id).image_digest == hashlib.sha256(uploaded).hexdigest()
+    assert SERVED == []
+
+
+def test_failures_retry_with_backoff_then_fail(app):
+    enqueue('test_flaky')
+    db.session.commit()
+    before = time.time()
+    assert Worker(app).run(burst=True) == 1
+    [job] = _jobs()
+    assert job.status == 'queued' and job.attempts == 1 and 'boom' in job.last_error
+    # JOBS_BACKOFF_SECONDS (5) * 2 ** 0, +/-20%
+    assert before + 3.9 <= job.run_at <= time.time() + 6.1
+    assert Worker(app).run(burst=True) == 0  # not due yet
+
+    job.run_at = time.time()
+    db.session.commit()
+    assert Worker(app).run(burst=True) == 1
+    [job] = _jobs()
+    assert job.status == 'failed' and job.attempts == 2
+    assert CALLS == [True, True]
+
+
+def test_non_image_responses_fail_the_job(app, image_server):
+    db.session.add(Book(title='B', language='en', image_url=f'{image_server}/page.html'))
+    db.session.commit()
+    Worker(app).run(burst=True)
+    [job] = _jobs()
+    assert job.status == 'queued' and 'not an image' in job.last_error
+
+
+def test_non_public_image_urls_are_refused(app, image_server):
+    app.config['IMAGE_FETCH_ALLOW_PRIVATE'] = False
+    db.session.add(Book(title='B', language='en', image_url=f'{image_server}/cover.png'))
+    db.session.commit()
+    Worker(app).run(burst=True)
+    [job] = _jobs()
+    # refused for good, not retried
+    assert job.status == 'failed' and job.attempts == 1 and 'not a public address' in job.last_error
+    assert SERVED == []  # never connected
+
+    with app.test_request_context():
+        for url in ('http://169.254.169.254/latest/meta-data/', 'http://10.0.0.1/a.png',
+                    'http://[::1]/a.png', 'http://0.0.0.0/a.png', 'ftp://example.com/a.png'):
+            with pytest.raises(RefusedURL):
+                download(url)
+
+
+def test_the_checked_address_is_the_one_connected_to(app, image_server, monkeypatch):
+    app.config['IMAGE_FETCH_ALLOW_PRIVATE'] = False
+    port = int(image_server.rsplit(':', 1)[1])
+    # pretend 127.0.0.1 is public; every other address stays private
+    real_is_public = images._is_public
+    monkeypatch.setattr(images, '_is_public', lambda a: a == '127.0.0.1' or real_is_public(a))
+    with app.test_request_context():
+        assert download(f'{image_server}/cover.png') == PNG
+        # a name resolving to a private address is refused without connecting
+        monkeypatch.setattr(images.socket, 'getaddrinfo',
+                            lambda *a, **kw: [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.2', port))])
+        with pytest.raises(RefusedURL):
+            download(f'http://images.example:{port}/cover.png')
+        monkeypatch.undo()
+        monkeypatch.setattr(images, '_is_public', lambda a: a == '127.0.0.1' or real_is_public(a))
+        # and so is a redirect to one
+        with pytest.raises(RefusedURL):
+            download(f'{image_server}/redirect.png')
+    assert SERVED == ['/cover.png', '/redirect.png']
+
+
+def test_jobs_of_dead_workers_are_reclaimed_after_the_lease(app):
+    job = enqueue('test_flaky', {'fail': False})
+    db.session.commit()
+    worker = Worker(app, name='dead')
+    assert worker.claim().id == job.id
+    assert worker.claim() is None  # running and within its lease
+    job.started_at = time.time() - app.config['JOBS_LEASE_SECONDS'] - 1
+    db.session.commit()
+    assert Worker(app).run(burst=True) == 1
+    [job] = _jobs()
+    assert job.status == 'done' and job.attempts == 2
+
+
+def test_job_stats_and_metrics(app):
+    enqueue('test_flaky', {'fail': False})
+    enqueue('test_flaky', {'fail': False})
+    db.session.commit()
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['worker', '--burst'])
+    assert 'stopped after 2 jobs' in result.output
+    assert 'test_flaky done: 2 jobs, 2 attempts' in runner.invoke(args=['jobs']).output
+    [stats] = job_stats()
+    assert (stats['task'], stats['status'], stats['count'], stats['attempts']) == ('test_flaky', 'done', 2, 2)
+    assert 'librarymanager_jobs{task="test_flaky",status="done"} 2' in render_job_metrics()
+    body = app.test_client().get('/debug/metrics').get_data(as_text=True)
+    assert 'librarymanager_job_run_seconds' in body
+    assert 'fetch_image' in TASKS
+
+
+def test_unknown_tasks_are_rejected(app):
+    with pytest.raises(ValueError):
+        enqueue('no_such_task')
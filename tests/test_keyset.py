@@ -0,0 +1,138 @@
+import re
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, select
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book, DVD, Item
+from librarymanager.pagination import Keyset
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        ITEMS_PER_PAGE = 4
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        for i in range(23):
+            # repeated titles and lengths, some lengths and dates missing
+            db.session.add(Book(title=f'Book {i % 7}', language='en', length=None if i % 5 == 0 else 100 + i % 4,
+                                publication_date=None if i % 3 == 0 else date(2000 + i % 6, 1, 1)))
+        db.session.add_all([DVD(title=f'Film {i}', duration_minutes=90 + i) for i in range(3)])
+        db.session.commit()
+        yield app
+
+
+def _books():
+    return [(b.id, b.title, b.length, b.publication_date) for b in Book.query.all()]
+
+
+def _walk(client, url):
+    seen, cursor = [], None
+    while True:
+        data = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen += [it['id'] for it in data['items']]
+        cursor = data['next_cursor']
+        if not cursor:
+            return seen
+
+
+def _nulls_first(value):
+    return (value is not None, value)
+
+
+@pytest.mark.parametrize('sort,order,key,reverse', [
+    ('length,title', 'asc', lambda b: (_nulls_first(b[2]), b[1], b[0]), False),
+    ('length,title', 'desc', lambda b: (_nulls_first(b[2]), b[1], b[0]), True),
+    ('publication_date', 'asc', lambda b: (_nulls_first(b[3]), b[0]), False),
+    ('title', 'desc', lambda b: (b[1], b[0]), True),
+])
+def test_api_pages_follow_the_sort(app, sort, order, key, reverse):
+    expected = [b[0] for b in sorted(_books(), key=key, reverse=reverse)]
+    assert _walk(app.test_client(), f'/api/items?type=book&limit=4&sort={sort}&order={order}') == expected
+
+
+def test_mixed_directions(app):
+    # length descending (NULLs last), then title and id ascending
+    books = _books()
+    expected = [b[0] for b in sorted(books, key=lambda b: (b[2] is None, -(b[2] or 0), b[1], b[0]))]
+    assert _walk(app.test_client(), '/api/items?type=book&limit=5&sort=-length,title') == expected
+
+
+def test_prev_pages_mirror_next_pages(app):
+    keyset = Keyset('length,title', 'asc', ('book',))
+    stmt = select(Item.id).where(Item.type == 'book')
+    pages, cursor = [], None
+    while True:
+        page = keyset.page(stmt, 4, cursor)
+        pages.append([r[0] for r in page.rows])
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+    assert page.prev_cursor and keyset.page(stmt, 4, cursor).next_cursor is None
+    # walk back from the last page
+    back = keyset.page(stmt, 4, page.prev_cursor, 'prev')
+    assert [r[0] for r in back.rows] == pages[-2]
+    first = pages[0]
+    while back.prev_cursor:
+        back = keyset.page(stmt, 4, back.prev_cursor, 'prev')
+    assert [r[0] for r in back.rows] == first and back.next_cursor
+
+
+def test_tokens_are_deterministic_and_signed(app):
+    client = app.test_client()
+    first = client.get('/api/items?limit=3&sort=title').get_json()['next_cursor']
+    assert first == client.get('/api/items?limit=3&sort=title').get_json()['next_cursor']
+    assert re.fullmatch(r'[A-Za-z0-9_-]+', first)
+    # issued for another ordering, or tampered with
+    assert client.get(f'/api/items?limit=3&sort=id&cursor={first}').status_code == 400
+    tampered = first[:-2] + ('AA' if first[-2:] != 'AA' else 'BB')
+    assert client.get(f'/api/items?limit=3&sort=title&cursor={tampered}').status_code == 400
+    assert client.get('/api/items?limit=3&sort=track_list').status_code == 400
+    assert client.get('/api/items?limit=3&sort=nope').status_code == 400
+
+
+def test_one_query_per_page(app):
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        if 'FROM item' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        data = app.test_client().get('/api/items?limit=5&sort=length,title&fields=id,title,length').get_json()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(data['items']) == 5
+    assert len(statements) == 1
+    assert 'LIMIT' in statements[0] and 'count(' not in statements[0].lower()
+
+
+def test_listing_sorts_by_subtype_column(app):
+    client = app.test_client()
+    html = client.get('/items/type/dvd?sort=-duration_minutes,title').get_data(as_text=True)
+    assert html.index('Film 2') < html.index('Film 1') < html.index('Film 0')
+    html = client.get('/items/type/book?sort=length,title').get_data(as_text=True)
+    next_url = re.search(r'href="([^"]*direction=next[^"]*)"', html).group(1).replace('&amp;', '&')
+    assert 'sort=length' in next_url
+    assert client.get(next_url).status_code == 200
+    assert client.get('/items/type/book?sort=title&cursor=garbage').status_code == 400
@@ -0,0 +1,121 @@
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.metrics import get_metrics
+from librarymanager.models import Author, Book
+
+
+def make_app(**settings):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    for key, value in settings.items():
+        setattr(TestConfig, key, value)
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        author = Author(name='Author')
+        for i in range(20):
+            db.session.add(Book(title=f'Book {i}', language='en', authors=[author]))
+        db.session.commit()
+    return app
+
+
+def test_histograms_per_endpoint():
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    assert client.get('/api/items?limit=20').status_code == 200
+    assert client.get('/api/items?limit=5').status_code == 200
+    assert client.get('/').status_code == 200
+
+    with app.app_context():
+        metrics = get_metrics()
+        latency = metrics.histogram('librarymanager_request_duration_seconds', 'api.list_items')
+        assert latency.count == 2
+        sql = metrics.histogram('librarymanager_request_sql_statements', 'api.list_items')
+        # items + selectin loads per page, independent of the page size
+        assert 2 <= sql.sum <= 2 * 6
+        assert metrics.histogram('librarymanager_request_render_duration_seconds', 'main.index').sum > 0
+        assert metrics.histogram('librarymanager_request_render_duration_seconds', 'api.list_items').sum == 0
+
+    text = client.get('/debug/metrics').get_data(as_text=True)
+    assert '# TYPE librarymanager_request_sql_statements histogram' in text
+    assert 'librarymanager_request_duration_seconds_count{endpoint="api.list_items"} 2' in text
+    assert 'librarymanager_request_sql_statements_bucket{endpoint="api.list_items",le="+Inf"} 2' in text
+
+
+def test_failed_statements_are_timed_and_counted():
+    app = make_app(METRICS_ENABLED=True)
+
+    @app.route('/failing-sql')
+    def failing_sql():
+        try:
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        except OperationalError:
+            db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        return 'ok'
+
+    client = app.test_client()
+    assert client.get('/failing-sql').status_code == 200
+    assert client.get('/failing-sql').status_code == 200
+    with app.app_context():
+        sql = get_metrics().histogram('librarymanager_request_sql_statements', 'failing_sql')
+        assert (sql.count, sql.sum) == (2, 4)
+
+
+def test_render_time_per_template():
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    client.get('/')
+    client.get('/')
+    client.get('/items/type/book')
+    with app.app_context():
+        metrics = get_metrics()
+        assert metrics.template_histogram('index.html').count == 2
+        assert metrics.template_histogram('item_list.html').count == 1
+        # base.html is rendered as part of the templates extending it
+        assert metrics.template_histogram('base.html') is None
+    text = client.get('/debug/metrics').get_data(as_text=True)
+    assert '# TYPE librarymanager_template_render_duration_seconds histogram' in text
+    assert 'librarymanager_template_render_duration_seconds_count{template="index.html"} 2' in text
+
+
+def test_streamed_response_is_measured_to_the_end():
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    resp = client.get('/api/items')
+    assert len(resp.get_json()) == 20
+    with app.app_context():
+        assert get_metrics().histogram('librarymanager_request_sql_statements', 'api.list_items').sum >= 1
+
+
+def test_metrics_endpoint_is_opt_in():
+    app = make_app()
+    assert app.test_client().get('/debug/metrics').status_code == 404
+    with app.app_context():
+        assert get_metrics() is None
+
+
+def test_slow_requests_are_logged(caplog):
+    app = make_app(SLOW_REQUEST_MS=1e-6)
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get('/')
+    assert any('slow request GET / (main.index)' in r.getMessage() for r in caplog.records)
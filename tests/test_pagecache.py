@@ -0,0 +1,91 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book
+
+
+@pytest.fixture(params=['memory', 'filesystem'])
+def app(request, tmp_path):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        PAGE_CACHE_TYPE = request.param
+        PAGE_CACHE_DIR = str(tmp_path / 'page_cache')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Book(title='First', language='en'), Book(title='Second', language='en')])
+        db.session.commit()
+        yield app
+
+
+def get_counting_queries(client, url, **kw):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        resp = client.get(url, **kw)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return resp, len(statements)
+
+
+def test_hit_and_conditional_get(app):
+    client = app.test_client()
+    first, queries = get_counting_queries(client, '/items/1')
+    assert first.status_code == 200 and queries > 0
+    assert first.headers['ETag'] and first.headers['Last-Modified']
+
+    again, queries = get_counting_queries(client, '/items/1')
+    assert queries == 0
+    assert again.get_data() == first.get_data()
+
+    r = client.get('/items/1', headers={'If-None-Match': first.headers['ETag']})
+    assert r.status_code == 304
+
+
+def test_writes_invalidate_only_affected_pages(app):
+    client = app.test_client()
+    for url in ('/', '/items/1', '/items/2', '/items/type/book'):
+        client.get(url)
+
+    client.post('/items/1/edit', data={'title': 'First Edited', 'language': 'en'})
+    assert 'First Edited' in client.get('/items/1').get_data(as_text=True)
+    assert 'First Edited' in client.get('/').get_data(as_text=True)
+    assert 'First Edited' in client.get('/items/type/book').get_data(as_text=True)
+    # unrelated detail page is still served from the cache
+    _, queries = get_counting_queries(client, '/items/2')
+    assert queries == 0
+
+    client.post('/api/items', json={'type': 'book', 'title': 'Third', 'language': 'en'})
+    assert 'Third' in client.get('/').get_data(as_text=True)
+
+    client.post('/items/2/delete')
+    assert client.get('/items/2').status_code == 404
+    assert 'Second' not in client.get('/items/type/book').get_data(as_text=True)
+
+
+def test_author_only_edit_invalidates_detail(app):
+    client = app.test_client()
+    client.get('/items/1')
+    client.post('/items/1/edit', data={'title': 'First', 'language': 'en', 'authors': 'New Author'})
+    assert 'New Author' in client.get('/items/1').get_data(as_text=True)
@@ -0,0 +1,91 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Author, Book, BoardGame, CD, DVD, Genre
+
+
+def make_app(mode: str):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        POLYMORPHIC_LOADING_DEFAULT = mode
+        POLYMORPHIC_LOADING = {}
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        author = Author(name='Author')
+        genre = Genre(name='Genre')
+        items = []
+        # 1,000 items spread evenly over the four subtypes
+        for i in range(250):
+            items.append(Book(title=f'Book {i}', language='en', length=i))
+            items.append(CD(title=f'CD {i}', primary_artist='Artist', track_list=['a', 'b']))
+            items.append(DVD(title=f'DVD {i}', director='Director'))
+            items.append(BoardGame(title=f'Game {i}', min_players=2, max_players=4))
+        for it in items:
+            it.authors.append(author)
+            it.genres.append(genre)
+        db.session.add_all(items)
+        db.session.commit()
+    return app
+
+
+def count_queries(app, url: str):
+    """Return (response, number of SQL statements issued while serving url)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        # the ETag's catalog version lookup is not part of item loading
+        if 'catalog_version' not in statement:
+            statements.append(statement)
+
+    client = app.test_client()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            resp = client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return resp, len(statements)
+
+
+# selectin IN-lists are chunked by 500 ids, so a 1,000 row page needs at most
+# two round trips per subtype / relation; lazy loading would need 3,000+.
+@pytest.mark.parametrize('mode, max_queries', [('joined', 1 + 2 * 2), ('selectin', 1 + 4 * 2 + 2 * 2)])
+def test_mixed_page_of_1000_items_loads_in_fixed_queries(mode, max_queries):
+    app = make_app(mode)
+    resp, queries = count_queries(app, '/api/items?limit=1000')
+    assert resp.status_code == 200
+    items = resp.get_json()['items']
+    assert len(items) == 1000
+    assert {it['type'] for it in items} == {'book', 'cd', 'dvd', 'board_game'}
+    assert all(it['track_list'] == ['a', 'b'] for it in items if it['type'] == 'cd')
+    assert queries <= max_queries
+
+
+def test_item_detail_uses_endpoint_mode():
+    app = make_app('lazy')
+    app.config['POLYMORPHIC_LOADING'] = {'main.item_detail': 'joined'}
+    with app.app_context():
+        cd_id = CD.query.first().id
+    resp, queries = count_queries(app, f'/items/{cd_id}')
+    assert resp.status_code == 200
+    assert 'Artist' in resp.get_data(as_text=True)
+    # joined item row + authors + genres
+    assert queries <= 3
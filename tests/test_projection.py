@@ -0,0 +1,89 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, select
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.loading import field_column
+from librarymanager.models import BoardGame, Book, CD, DVD, Item
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Book(title='Long Book', language='en', description='x' * 10000),
+            CD(title='Record', primary_artist='Artist', genre='jazz'),
+            DVD(title='Film', director='Director', genre='drama'),
+            BoardGame(title='Game', min_players=2, max_players=4),
+        ])
+        db.session.commit()
+        yield app
+
+
+def _select_statements(app, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT') and 'catalog_version' not in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            resp = app.test_client().get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return resp, statements
+
+
+def test_index_loads_only_rendered_columns(app):
+    resp, statements = _select_statements(app, '/')
+    html = resp.get_data(as_text=True)
+    assert 'directed by Director' in html and '2–4 players' in html and 'Long Book' in html
+    assert len(statements) == 1
+    assert 'description' not in statements[0]
+    # the denormalized summaries hold every rendered column
+    assert 'FROM item_summary' in statements[0] and 'JOIN' not in statements[0]
+
+
+def test_type_listing_reads_only_the_summary_table(app):
+    resp, statements = _select_statements(app, '/items/type/book')
+    assert resp.status_code == 200
+    assert 'Long Book' in resp.get_data(as_text=True)
+    # the total comes from the item_type_count counters, facets from facet_count
+    item_reads = [s for s in statements if 'item_type_count' not in s and 'facet_count' not in s]
+    assert len(item_reads) == 1
+    assert 'FROM item_summary' in item_reads[0]
+    assert 'description' not in item_reads[0] and 'JOIN' not in item_reads[0]
+
+
+def test_field_column_coalesces_shared_subtype_columns(app):
+    with app.app_context():
+        genre, tables = field_column('genre')
+        base = Item.__table__
+        from_clause = base
+        for table in tables:
+            from_clause = from_clause.outerjoin(table, table.c.id == base.c.id)
+        rows = db.session.execute(select(base.c.title, genre).select_from(from_clause).order_by(base.c.id)).all()
+        assert [tuple(r) for r in rows] == [('Long Book', None), ('Record', 'jazz'), ('Film', 'drama'), ('Game', None)]
+        with pytest.raises(ValueError):
+            field_column('nope')
@@ -0,0 +1,106 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Author, Book, Genre
+from librarymanager.resolver import get_resolver, resolve_names
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        NAME_CACHE_SIZE = 3
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def count_statements(fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def test_create_item_queries_do_not_grow_with_names(app):
+    client = app.test_client()
+
+    def create(n):
+        payload = {'type': 'book', 'title': 'B', 'language': 'en',
+                   'authors': [f'Author {n}-{i}' for i in range(n)], 'genres': [f'Genre {n}-{i}' for i in range(n)]}
+        return lambda: client.post('/api/items', json=payload)
+
+    # the first commit also checks that the facet tables exist
+    count_statements(create(0))
+    few = count_statements(create(1))
+    many = count_statements(create(20))
+    assert len(many) == len(few)
+    assert Author.query.count() == 21
+    book = Book.query.order_by(Book.id.desc()).first()
+    assert len(book.authors) == 20 and len(book.genres) == 20
+
+
+def test_cache_hits_skip_lookup_and_lru_is_bounded(app):
+    ids = resolve_names(Author, ['A', 'B'])
+    db.session.commit()
+    statements = count_statements(lambda: resolve_names(Author, ['A', 'B']))
+    assert statements == []
+    assert resolve_names(Author, ['A', 'B']) == ids
+
+    resolve_names(Author, ['C', 'D'])
+    db.session.commit()
+    assert len(get_resolver(Author)) == 3
+
+
+def test_rollback_invalidates_cache(app):
+    resolve_names(Genre, ['Kept'])
+    db.session.commit()
+    resolver = get_resolver(Genre)
+    assert resolver.cached('Kept') is not None
+
+    resolve_names(Genre, ['Discarded'])
+    db.session.rollback()
+    assert resolver.cached('Discarded') is None
+    assert len(resolver) == 0
+    assert Genre.query.filter_by(name='Discarded').first() is None
+    # resolving again after the rollback creates a fresh row
+    new_id = resolve_names(Genre, ['Discarded'])['Discarded']
+    db.session.commit()
+    assert db.session.get(Genre, new_id).name == 'Discarded'
+
+
+def test_edit_form_replaces_names(app):
+    client = app.test_client()
+    client.post('/items/new/book', data={'title': 'Form', 'language': 'en', 'authors': 'ann, bob', 'genres': 'x'})
+    book = Book.query.one()
+    assert sorted(a.name for a in book.authors) == ['Ann', 'Bob']
+    client.post(f'/items/{book.id}/edit', data={'title': 'Form', 'language': 'en', 'authors': 'bob, cy', 'genres': ''})
+    db.session.expire_all()
+    book = db.session.get(Book, book.id)
+    assert sorted(a.name for a in book.authors) == ['Bob', 'Cy']
+    assert book.genres == []
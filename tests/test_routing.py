@@ -0,0 +1,110 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book, Item
+from librarymanager.routing import REPLICA, reads_from, replica_engine
+
+
+def make_app(db_path, **settings):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    for key, value in settings.items():
+        setattr(TestConfig, key, value)
+    return create_app(TestConfig)
+
+
+def _database(title):
+    """A fresh database file holding one book called ``title``."""
+    db_fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Book(title=title, language='en'))
+        db.session.commit()
+        db.engine.dispose()
+    return path
+
+
+def _titles(client, url='/api/items?limit=10'):
+    return [it['title'] for it in client.get(url).get_json()['items']]
+
+
+def test_get_views_read_from_the_replica():
+    replica = _database('Replica Book')
+    app = make_app(_database('Primary Book'), READ_REPLICA_URI='sqlite:///' + replica, READ_YOUR_WRITES_SECONDS=0)
+    client = app.test_client()
+    assert _titles(client) == ['Replica Book']
+    assert 'Replica Book' in client.get('/').get_data(as_text=True)
+
+    # writes go to the primary; without pinning the next GET reads the replica
+    assert client.post('/api/items', json={'type': 'book', 'title': 'New', 'language': 'en'}).status_code == 201
+    assert _titles(client) == ['Replica Book']
+    with app.app_context():
+        assert sorted(t for (t,) in db.session.query(Item.title)) == ['New', 'Primary Book']
+        with reads_from(REPLICA):
+            assert [t for (t,) in db.session.query(Item.title)] == ['Replica Book']
+
+
+def test_commit_pins_the_client_to_the_primary():
+    replica = _database('Replica Book')
+    app = make_app(_database('Primary Book'), READ_REPLICA_URI='sqlite:///' + replica, READ_YOUR_WRITES_SECONDS=60)
+    client = app.test_client()
+    assert _titles(client) == ['Replica Book']
+    client.post('/api/items', json={'type': 'book', 'title': 'New', 'language': 'en'})
+    assert _titles(client) == ['Primary Book', 'New']
+    # other clients keep using the replica
+    assert _titles(app.test_client()) == ['Replica Book']
+
+
+def test_reads_after_a_commit_in_the_same_request_use_the_primary():
+    replica = _database('Replica Book')
+    app = make_app(_database('Primary Book'), READ_REPLICA_URI='sqlite:///' + replica, READ_YOUR_WRITES_SECONDS=0)
+    with app.test_request_context('/api/items'):
+        app.preprocess_request()
+        assert [t for (t,) in db.session.query(Item.title)] == ['Replica Book']
+        db.session.add(Book(title='Written', language='en'))
+        # a pending write makes the transaction read from the primary
+        assert sorted(t for (t,) in db.session.query(Item.title)) == ['Primary Book', 'Written']
+        db.session.commit()
+        assert sorted(t for (t,) in db.session.query(Item.title)) == ['Primary Book', 'Written']
+
+
+def test_only_known_writes_move_reads_to_the_primary():
+    replica = _database('Replica Book')
+    app = make_app(_database('Primary Book'), READ_REPLICA_URI='sqlite:///' + replica, READ_YOUR_WRITES_SECONDS=0)
+    with app.test_request_context('/api/items'):
+        app.preprocess_request()
+        # read-only raw text runs on the primary but does not count as a write
+        db.session.execute(text('PRAGMA user_version'))
+        assert [t for (t,) in db.session.execute(text('SELECT title FROM item'))] == ['Replica Book']
+        db.session.execute(text("UPDATE item SET title = 'Renamed'"))
+        assert [t for (t,) in db.session.execute(text('SELECT title FROM item'))] == ['Renamed']
+        db.session.rollback()
+
+
+def test_readonly_replica_of_the_primary_file():
+    app = make_app(_database('Primary Book'), READ_REPLICA_URI='readonly', SQLITE_PROFILE='production')
+    client = app.test_client()
+    assert _titles(client) == ['Primary Book']
+    with app.app_context():
+        engine = replica_engine()
+        assert engine.url.query['mode'] == 'ro'
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("INSERT INTO item (type, title) VALUES ('book', 'x')")
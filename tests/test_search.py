@@ -0,0 +1,90 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book
+from librarymanager.search import match_expression
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        client.post('/api/items', json={'type': 'book', 'title': 'The Hobbit', 'language': 'en',
+                                         'description': 'A journey there and back again',
+                                         'authors': ['J. R. R. Tolkien'], 'genres': ['Fantasy']})
+        client.post('/api/items', json={'type': 'cd', 'title': 'Abbey Road', 'artist': 'The Beatles',
+                                         'track_list': ['Come Together', 'Something']})
+        client.post('/api/items', json={'type': 'dvd', 'title': 'Hobbies of the World'})
+        client.post('/api/items', json={'type': 'boardgame', 'title': 'Fantasy Realms'})
+        yield app
+
+
+def titles(resp):
+    return [it['title'] for it in resp.get_json()['items']]
+
+
+def test_match_expression_quotes_tokens():
+    assert match_expression('hob tolk') == '"hob"* AND "tolk"*'
+    assert match_expression('title:"x" OR') == '"title"* AND "x"* AND "OR"*'
+    assert match_expression('  ') == ''
+
+
+def test_prefix_and_ranking(app):
+    client = app.test_client()
+    assert sorted(titles(client.get('/api/search?q=hob'))) == ['Hobbies of the World', 'The Hobbit']
+    assert titles(client.get('/api/search?q=tolkien')) == ['The Hobbit']
+    assert titles(client.get('/api/search?q=hob journey')) == ['The Hobbit']
+    # title matches outrank genre matches
+    assert titles(client.get('/api/search?q=fantas')) == ['Fantasy Realms', 'The Hobbit']
+    assert titles(client.get('/api/search?q=together')) == ['Abbey Road']
+    assert titles(client.get('/api/search?q=')) == []
+
+
+def test_pagination(app):
+    client = app.test_client()
+    first = client.get('/api/search?q=hob&limit=1').get_json()
+    second = client.get('/api/search?q=hob&limit=1&page=2').get_json()
+    assert first['has_more'] and not second['has_more']
+    assert sorted(it['title'] for it in first['items'] + second['items']) == ['Hobbies of the World', 'The Hobbit']
+
+
+def test_index_follows_edits_and_deletes(app):
+    client = app.test_client()
+    book = Book.query.one()
+    client.post(f'/items/{book.id}/edit', data={'title': 'There and Back', 'language': 'en', 'authors': 'Bilbo', 'genres': ''})
+    assert titles(client.get('/api/search?q=tolkien')) == []
+    assert titles(client.get('/api/search?q=bilbo')) == ['There and Back']
+    client.post(f'/items/{book.id}/delete')
+    assert titles(client.get('/api/search?q=bilbo')) == []
+
+
+def test_search_page_and_rebuild(app):
+    client = app.test_client()
+    r = client.get('/search?q=abbey')
+    assert r.status_code == 200
+    assert 'Abbey Road' in r.get_data(as_text=True)
+    assert 'name="q"' in client.get('/').get_data(as_text=True)
+
+    result = app.test_cli_runner().invoke(args=['rebuild-search-index'])
+    assert 'Indexed 4 items' in result.output
+    assert titles(client.get('/api/search?q=abbey')) == ['Abbey Road']
@@ -0,0 +1,125 @@
+import json
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app, serializers
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Author, BoardGame, Book, CD, DVD, Genre
+from librarymanager.serializers import get_serializer, parse_fields, serialize_item
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        author, genre = Author(name='Ann'), Genre(name='Prose')
+        items = [
+            Book(title='Book', language='en', length=10, publication_date=date(2020, 5, 1)),
+            CD(title='CD', primary_artist='Artist', track_list=['a', 'b'], genre='jazz'),
+            DVD(title='DVD', director='Director', duration_minutes=90),
+            BoardGame(title='Game', min_players=2, max_players=4),
+        ]
+        items[0].authors.append(author)
+        items[0].genres.append(genre)
+        db.session.add_all(items)
+        db.session.commit()
+        yield app
+
+
+def test_rows_serialize_like_orm_objects(app):
+    resp = app.test_client().get('/api/items?limit=10')
+    assert resp.status_code == 200
+    listed = resp.get_json()['items']
+    with app.app_context():
+        expected = [serialize_item(it) for it in db.session.query(Book).all() + CD.query.all() + DVD.query.all() + BoardGame.query.all()]
+    assert sorted(listed, key=lambda it: it['id']) == sorted(expected, key=lambda it: it['id'])
+    book = next(it for it in listed if it['type'] == 'book')
+    assert book['publication_date'] == '2020-05-01'
+    assert book['authors'] == ['Ann'] and book['genres'] == ['Prose']
+    assert book['language'] == 'en' and 'primary_artist' not in book
+    cd = next(it for it in listed if it['type'] == 'cd')
+    assert cd['track_list'] == ['a', 'b'] and cd['genre'] == 'jazz' and 'language' not in cd
+
+
+def test_sparse_fieldsets_narrow_output_and_query(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client = app.test_client()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            resp = client.get('/api/items?limit=10&fields=id,title')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert [set(it) for it in resp.get_json()['items']] == [{'id', 'title'}] * 4
+    item_selects = [s for s in statements if 'FROM item' in s]
+    # no subtype joins and no author/genre lookups
+    assert len(item_selects) == 1 and 'JOIN' not in item_selects[0]
+    assert not any('item_author' in s or 'item_genre' in s for s in statements)
+
+    data = client.get('/api/items?limit=10&fields=title,language').get_json()['items']
+    assert {it['title']: it.get('language') for it in data} == {'Book': 'en', 'CD': None, 'DVD': None, 'Game': None}
+    assert client.get('/api/items/1?fields=authors').get_json() == {'authors': ['Ann']}
+
+
+def test_sparse_fieldsets_work_with_cursors_and_streams(app):
+    client = app.test_client()
+    first = client.get('/api/items?limit=2&sort=title&fields=id').get_json()
+    rest = client.get(f"/api/items?limit=2&sort=title&fields=id&cursor={first['next_cursor']}").get_json()
+    assert [it['id'] for it in first['items'] + rest['items']] == [1, 2, 3, 4]
+    assert rest['next_cursor'] is None
+    lines = client.get('/api/items?format=ndjson&fields=type').get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [{'type': 'book'}, {'type': 'cd'}, {'type': 'dvd'}, {'type': 'board_game'}]
+
+
+def test_unknown_fields_are_rejected(app):
+    client = app.test_client()
+    resp = client.get('/api/items?fields=id,password')
+    assert resp.status_code == 400
+    assert 'password' in resp.get_json()['error']
+    assert client.get('/api/items/1?fields=nope').status_code == 400
+    with pytest.raises(ValueError):
+        parse_fields('id,,nope')
+    assert parse_fields('') is None
+    assert parse_fields('title, id,title') == ('title', 'id')
+
+
+def test_serializers_are_cached_per_field_set():
+    assert get_serializer(['title', 'id']) is get_serializer(('id', 'title'))
+    assert get_serializer() is get_serializer(None)
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_json_backends_produce_the_same_document(app, backend):
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    app.config['JSON_BACKEND'] = backend
+    client = app.test_client()
+    data = client.get('/api/items?limit=10').get_json()
+    app.config['JSON_BACKEND'] = 'json'
+    assert data == client.get('/api/items?limit=10').get_json()
+    with app.app_context():
+        app.config['JSON_BACKEND'] = backend
+        assert json.loads(serializers.dumps({'a': 'é', 'b': [1, None]})) == {'a': 'é', 'b': [1, None]}
@@ -0,0 +1,62 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+
+
+def make_app(**settings):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    for key, value in settings.items():
+        setattr(TestConfig, key, value)
+    return create_app(TestConfig)
+
+
+def _pragma(name):
+    return db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+
+
+def test_production_profile_applies_pragmas_and_pool():
+    app = make_app(SQLITE_PROFILE='production', SQLITE_PRAGMAS={'cache_size': -1000})
+    with app.app_context():
+        db.create_all()
+        assert _pragma('journal_mode') == 'wal'
+        assert _pragma('synchronous') == 1  # NORMAL
+        assert _pragma('temp_store') == 2  # MEMORY
+        assert _pragma('busy_timeout') == 5000
+        assert _pragma('mmap_size') == 256 * 1024 * 1024
+        assert _pragma('cache_size') == -1000
+        assert db.engine.pool.size() == 10
+
+
+def test_default_profile_leaves_sqlite_defaults():
+    app = make_app()
+    with app.app_context():
+        assert _pragma('journal_mode') == 'delete'
+        assert _pragma('synchronous') == 2  # FULL
+
+
+def test_pool_options_from_config_win():
+    app = make_app(SQLITE_PROFILE='production', SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3})
+    with app.app_context():
+        assert db.engine.pool.size() == 3
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        make_app(SQLITE_PROFILE='turbo')
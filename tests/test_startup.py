@@ -0,0 +1,85 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# make src and the benchmarks package importable
+ROOT = Path(__file__).resolve().parents[1]
+for path in (str(ROOT / 'src'), str(ROOT)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks import importtime
+from librarymanager import create_api_app, create_app, create_cli_app, create_html_app, register_components
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.models import Book
+
+
+def make_app(factory=create_app):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    app = factory(TestConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_components_register_only_their_views():
+    api = make_app(create_api_app)
+    client = api.test_client()
+    assert client.get('/api/items').status_code == 200
+    assert client.get('/').status_code == 404
+    assert 'recreate-db' not in api.cli.commands
+
+    html = make_app(create_html_app)
+    assert html.test_client().get('/').status_code == 200
+    assert html.test_client().get('/api/items').status_code == 404
+
+    with pytest.raises(ValueError):
+        create_app(components=('api', 'gui'))
+
+
+def test_writes_keep_derived_tables_current_in_every_mode():
+    app = make_app(create_cli_app)
+    with app.app_context():
+        db.session.add(Book(title='Written from a command', language='en'))
+        db.session.commit()
+    # later registration, as `flask explain-queries` does
+    register_components(app, ('api',))
+    data = app.test_client().get('/api/items/facets?type=book').get_json()
+    assert data['facets']['language'] == [{'value': 'en', 'count': 1}]
+    assert len(app.test_client().get('/api/search?q=command').get_json()['items']) == 1
+
+
+def test_migrate_is_imported_by_flask_db_only():
+    app = make_app(create_cli_app)
+    assert 'migrate' not in app.extensions
+    result = app.test_cli_runner().invoke(args=['db', '--help'])
+    assert result.exit_code == 0, result.output
+    assert 'upgrade' in result.output and 'migrate' in app.extensions
+
+
+@pytest.mark.parametrize('factory', ['api', 'html'])
+def test_web_processes_do_not_import_alembic(factory):
+    result = importtime.measure(importtime.FACTORIES[factory], importtime=True)
+    assert not [m for m in result['modules'] if m.split('.')[0] in ('alembic', 'flask_migrate', 'mako')]
+    assert 'sqlalchemy' in result['packages'] and result['import_ms'] > 0
+
+
+def test_report_and_compare(tmp_path):
+    out = tmp_path / 'startup.json'
+    assert importtime.main(['--factory', 'cli', '--repeat', '1', '--quiet', '--output', str(out)]) == 0
+    results = json.loads(out.read_text())['results']
+    assert results['cli']['startup_ms'] > 0 and results['cli']['modules'] > 100
+
+    # a baseline importing fewer modules is reported as a regression
+    leaner = {'cli': dict(results['cli'], startup_ms=results['cli']['startup_ms'] * 10, modules=results['cli']['modules'] - 1)}
+    assert importtime.compare(results, leaner, 0.25) == [f"cli: {results['cli']['modules'] - 1} -> {results['cli']['modules']} modules imported"]
+    assert importtime.compare(results, results, 0.25) == []
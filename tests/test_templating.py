@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.templating import precompile
+
+
+def make_app(cache_dir, **settings):
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        TEMPLATE_CACHE_DIR = str(cache_dir)
+
+    for key, value in settings.items():
+        setattr(TestConfig, key, value)
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _count_compiles(app, monkeypatch):
+    compiled = []
+    env = app.jinja_env
+    original = env.compile
+
+    def compile(source, name=None, filename=None, raw=False, defer_init=False):
+        compiled.append(name)
+        return original(source, name, filename, raw, defer_init)
+
+    monkeypatch.setattr(env, 'compile', compile)
+    return compiled
+
+
+def test_new_processes_load_compiled_templates(tmp_path, monkeypatch):
+    first = make_app(tmp_path)
+    result = precompile(first)
+    assert not result['errors']
+    assert {'base.html', 'index.html', 'item_detail.html', 'forms/new_book.html'} <= set(result['compiled'])
+    assert len(os.listdir(tmp_path)) == len(result['compiled'])
+
+    # a fresh app (as in a new worker) renders without compiling anything
+    second = make_app(tmp_path)
+    compiled = _count_compiles(second, monkeypatch)
+    client = second.test_client()
+    for path in ('/', '/items/type/book', '/items/new/book'):
+        assert client.get(path).status_code == 200
+    assert compiled == []
+
+
+def test_edited_templates_are_recompiled(tmp_path, monkeypatch):
+    app = make_app(tmp_path)
+    precompile(app)
+    app = make_app(tmp_path)
+    compiled = _count_compiles(app, monkeypatch)
+    # a template whose source differs from the cached one
+    app.jinja_env.loader.get_source = lambda env, name: ('edited {{ 1 + 1 }}', None, lambda: True)
+    with app.app_context():
+        assert app.jinja_env.get_template('index.html').render() == 'edited 2'
+    assert compiled == ['index.html']
+
+
+def test_cli(tmp_path):
+    app = make_app(tmp_path)
+    result = app.test_cli_runner().invoke(args=['precompile-templates'])
+    assert result.exit_code == 0, result.output
+    assert 'Compiled' in result.output and str(tmp_path) in result.output
+    assert os.listdir(tmp_path)
+
+
+def test_default_cache_is_outside_the_source_tree(tmp_path):
+    app = make_app(tmp_path, TEMPLATE_CACHE_DIR=None)
+    directory = os.path.realpath(app.jinja_env.bytecode_cache.directory)
+    assert directory.startswith(os.path.realpath(tempfile.gettempdir()))
+    assert not directory.startswith(str(ROOT))
+
+
+def test_cache_can_be_disabled(tmp_path):
+    app = make_app(tmp_path / 'cache', TEMPLATE_BYTECODE_CACHE=False)
+    assert app.jinja_env.bytecode_cache is None
+    result = app.test_cli_runner().invoke(args=['precompile-templates'])
+    assert result.exit_code == 0, result.output
+    assert 'nothing stored' in result.output
+    assert not (tmp_path / 'cache').exists()
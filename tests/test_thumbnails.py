@@ -0,0 +1,149 @@
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+# make src importable
+ROOT = Path(__file__).resolve().parents[1]
+SRC = str(ROOT / 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from librarymanager import create_app
+from librarymanager.config import Config
+from librarymanager.extensions import db
+from librarymanager.images import store_image
+from librarymanager.models import Book
+from librarymanager import thumbnails
+from librarymanager.thumbnails import ThumbnailCache, parse_name, thumbnail_name
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _png(width: int, height: int, color=(200, 30, 30, 255)) -> bytes:
+    out = io.BytesIO()
+    Image.new('RGBA', (width, height), color).save(out, 'PNG')
+    return out.getvalue()
+
+
+def _write(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(suffix='.png')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+    work = tempfile.mkdtemp()
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        IMAGE_DIR = os.path.join(work, 'images')
+        THUMBNAIL_DIR = os.path.join(work, 'thumbs')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Book(id=1, title='Cover', language='en', image_url='https://example.com/cover.png'))
+        db.session.commit()
+        yield app
+
+
+def test_upload_and_serve_immutable_thumbnail(app):
+    client = app.test_client()
+    resp = client.post('/api/items/1/image', data=_png(1200, 800), content_type='image/png')
+    assert resp.status_code == 201
+    data = resp.get_json()
+    assert set(data['thumbnails']) == {'small', 'medium'}
+
+    thumb = client.get(data['thumbnails']['medium'])
+    assert thumb.status_code == 200
+    assert thumb.mimetype == 'image/jpeg'
+    assert 'immutable' in thumb.headers['Cache-Control'] and 'max-age=31536000' in thumb.headers['Cache-Control']
+    assert Image.open(io.BytesIO(thumb.data)).size == (320, 213)
+    # revalidation by ETag, and the detail page uses the local thumbnail
+    assert client.get(data['thumbnails']['medium'], headers={'If-None-Match': thumb.headers['ETag']}).status_code == 304
+    page = client.get('/items/1').get_data(as_text=True)
+    assert data['thumbnails']['medium'] in page and 'example.com/cover.png' not in page
+
+
+def test_multipart_upload_and_rejections(app):
+    client = app.test_client()
+    resp = client.post('/api/items/1/image', data={'image': (io.BytesIO(_png(10, 10)), 'a.png')})
+    assert resp.status_code == 201
+    assert client.post('/api/items/1/image', data=b'not an image').status_code == 400
+    assert client.post('/api/items/99/image', data=_png(10, 10)).status_code == 404
+    app.config['IMAGE_MAX_BYTES'] = 10
+    assert client.post('/api/items/1/image', data=_png(10, 10)).status_code == 413
+    # a declared length over the limit is refused without reading the body
+    body = io.BytesIO(b'x' * (64 * 1024))
+    resp = client.post('/api/items/1/image', input_stream=body, content_type='image/png',
+                       headers={'Content-Length': str(64 * 1024)})
+    assert resp.status_code == 413 and body.tell() == 0
+    # without a declared length at most limit + 1 bytes are read
+    body = io.BytesIO(b'x' * (64 * 1024))
+    resp = client.post('/api/items/1/image', input_stream=body, content_type='image/png',
+                       environ_overrides={'CONTENT_LENGTH': '', 'wsgi.input_terminated': True})
+    assert resp.status_code == 413 and body.tell() == 11
+
+
+def test_corrupt_images_are_rejected_and_never_500(app):
+    client = app.test_client()
+    corrupt = b'\x89PNG\r\n\x1a\n' + b'garbage' * 10
+    resp = client.post('/api/items/1/image', data=corrupt, content_type='image/png')
+    assert resp.status_code == 400 and 'corrupt image' in resp.get_json()['error']
+    assert db.session.get(Book, 1).image_digest is None
+    result = app.test_cli_runner().invoke(args=['attach-image', '1', _write(corrupt)])
+    assert result.exit_code != 0 and 'corrupt image' in result.output
+    # an original stored without the check is a 404, not a 500
+    with app.app_context():
+        digest = store_image(corrupt)
+    assert client.get(f'/thumbs/{thumbnail_name(digest, "medium")}').status_code == 404
+
+
+def test_unknown_sizes_versions_and_originals_are_404(app):
+    client = app.test_client()
+    with app.app_context():
+        digest = store_image(_png(50, 50))
+    assert client.get(f'/thumbs/{thumbnail_name(digest, "small")}').status_code == 200
+    assert client.get(f'/thumbs/{thumbnail_name(digest, "huge")}').status_code == 404
+    assert client.get(f'/thumbs/{digest}-small-v0.jpg').status_code == 404
+    assert client.get(f'/thumbs/{thumbnail_name("0" * 64, "small")}').status_code == 404
+    assert parse_name('../../etc/passwd') is None
+
+
+def test_originals_without_pillow_have_their_own_urls(app, monkeypatch):
+    client = app.test_client()
+    original = _png(50, 50)
+    with app.app_context():
+        digest = store_image(original)
+    rendered = thumbnail_name(digest, 'small')
+    monkeypatch.setattr(thumbnails, 'Image', None)
+    name = thumbnail_name(digest, 'small')
+    assert name == f'{digest}-small-orig'
+    resp = client.get(f'/thumbs/{name}')
+    assert resp.status_code == 200 and resp.mimetype == 'image/png' and resp.data == original
+    assert client.get(f'/thumbs/{rendered}').status_code == 404
+    # once Pillow is there the original's URL is no longer served
+    monkeypatch.undo()
+    assert client.get(f'/thumbs/{name}').status_code == 404
+
+
+def test_cache_evicts_least_recently_used_over_budget(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget=2500)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, b'x' * 1000)
+        if name == 'b':
+            # 'a' was used more recently than 'b'
+            past = time.time() - 100
+            os.utime(tmp_path / 'b', (past, past))
+            os.utime(tmp_path / 'a', (past + 50, past + 50))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a', 'c']
+    assert cache.get('b') is None and cache.get('a') is not None